@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Extractor benchmark: runtime and palette stability per algorithm
+Stability is the OKLab distance (x100, ~1 = just noticeable) between the
+palette of an image and the palette of a lightly perturbed copy (resize,
+re-encode, crop, noise). Lower is more stable.
+
+Usage: algorithms.py [IMAGE_DIR] [--algorithms greedy,kmeans] [--repeat 5]
+"""
+
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from common import list_images, load_extractor, synthetic_corpus
+
+
+def perturbations(img, rng):
+    """Small edits that should not change a wallpaper's palette"""
+    w, h = img.size
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=75)
+    noisy = np.asarray(img, dtype=np.int16) + rng.integers(-6, 7, (h, w, 3))
+    return {
+        'resize90': img.resize((int(w * 0.9), int(h * 0.9)), Image.Resampling.BILINEAR),
+        'jpeg75': Image.open(io.BytesIO(buf.getvalue())).convert('RGB'),
+        'crop95': img.crop((int(w * 0.025), int(h * 0.025), int(w * 0.975), int(h * 0.975))),
+        'noise': Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)),
+    }
+
+
+def palette_distance(ec, a, b):
+    """Symmetric mean nearest-neighbour OKLab distance between two palettes (x100)"""
+    if not a or not b:
+        return float('nan')
+    la, lb = ec.srgb_to_oklab(a), ec.srgb_to_oklab(b)
+    d = np.sqrt(((la[:, None, :] - lb[None, :, :]) ** 2).sum(axis=2))
+    return 50.0 * (d.min(axis=1).mean() + d.min(axis=0).mean())
+
+
+def histogram(ec, img):
+    img = img.copy()
+    img.thumbnail((ec.SAMPLE_SIZE, ec.SAMPLE_SIZE))
+    return ec.compute_histogram(img.convert('RGB'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark accent extractors')
+    parser.add_argument('images', nargs='?', help='Image directory (default: fixed synthetic corpus)')
+    parser.add_argument('--algorithms', default=None, help='Comma-separated (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (min is reported)')
+    parser.add_argument('--num-colors', type=int, default=5)
+    args = parser.parse_args()
+
+    ec = load_extractor()
+    names = args.algorithms.split(',') if args.algorithms else sorted(ec.EXTRACTORS)
+    rng = np.random.default_rng(1)
+
+    if args.images:
+        corpus = [(p.name, Image.open(p).convert('RGB')) for p in list_images(args.images)]
+    else:
+        corpus = synthetic_corpus()
+
+    totals = {name: {'ms': [], 'drift': []} for name in names}
+    print(f"{'image':<20} {'algorithm':<10} {'ms':>8} {'drift':>8}  palette")
+    for image_name, img in corpus:
+        base_hist = histogram(ec, img)
+        variants = [histogram(ec, v) for v in perturbations(img, rng).values()]
+        for name in names:
+            extractor = ec.EXTRACTORS[name]
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                palette = extractor(base_hist, args.num_colors)
+                best = min(best, time.perf_counter() - start)
+            drift = np.nanmean([palette_distance(ec, palette, extractor(h, args.num_colors))
+                                for h in variants])
+            totals[name]['ms'].append(best * 1000)
+            totals[name]['drift'].append(drift)
+            swatch = ' '.join(ec.rgb_to_hex(c) for c in palette)
+            print(f"{image_name[:20]:<20} {name:<10} {best * 1000:>8.2f} {drift:>8.2f}  {swatch}")
+
+    print(f"\n{'algorithm':<10} {'mean ms':>8} {'mean drift':>11}")
+    for name in names:
+        print(f"{name:<10} {np.mean(totals[name]['ms']):>8.2f} {np.nanmean(totals[name]['drift']):>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Shared helpers for Themix benchmarks
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+
+def load_extractor():
+    """Import scripts/extract-colors.py as module 'extract_colors'"""
+    if 'extract_colors' in sys.modules:
+        return sys.modules['extract_colors']
+    if str(SCRIPTS_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPTS_DIR))
+    spec = importlib.util.spec_from_file_location('extract_colors', SCRIPTS_DIR / 'extract-colors.py')
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['extract_colors'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def list_images(directory):
+    """Sorted image files in a directory"""
+    return sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def synthetic_image(kind, size, rng):
+    """Deterministic test image (PIL) of the given kind:
+    gradient - two-axis color ramp; noise - uniform RGB noise;
+    blobs - soft colored regions (photo-like); shapes - flat blocks on a dark field
+    """
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    w, h = size
+    if kind == 'gradient':
+        c0, c1, c2 = rng.integers(0, 256, (3, 3))
+        x = np.linspace(0, 1, w)[None, :, None]
+        y = np.linspace(0, 1, h)[:, None, None]
+        arr = c0 * (1 - x) * (1 - y) + c1 * x + c2 * y * (1 - x)
+        return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    if kind == 'noise':
+        return Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+    if kind == 'blobs':
+        small = rng.integers(0, 256, (9, 16, 3), dtype=np.uint8)
+        return Image.fromarray(small).resize((w, h), Image.Resampling.BICUBIC)
+    if kind == 'shapes':
+        arr = np.zeros((h, w, 3), np.uint8) + rng.integers(0, 60, 3, dtype=np.uint8)
+        for _ in range(12):
+            cx, cy = rng.integers(0, w), rng.integers(0, h)
+            r = int(rng.integers(h // 20, h // 4))
+            arr[max(0, cy - r):cy + r, max(0, cx - r):cx + r] = rng.integers(0, 256, 3)
+        return Image.fromarray(arr).filter(ImageFilter.GaussianBlur(2))
+    raise ValueError(f"unknown image kind: {kind}")
+
+
+def synthetic_corpus(size=(1920, 1080), per_kind=2, kinds=('gradient', 'noise', 'blobs', 'shapes'),
+                     seed=0):
+    """Fixed in-memory corpus: list of (name, PIL image)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    return [(f'{kind}-{i}', synthetic_image(kind, size, rng))
+            for kind in kinds for i in range(per_kind)]
+
+
+def make_synthetic_jpegs(directory, sizes=((3840, 2160), (7680, 4320)), seed=0):
+    """Write smooth multi-blob test JPEGs (photo-like, compress realistically)"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, (w, h) in enumerate(sizes):
+        # Low-res random field upscaled -> soft colored regions
+        small = rng.integers(0, 256, (9, 16, 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((w, h), Image.Resampling.BICUBIC)
+        path = directory / f'synthetic-{i}-{w}x{h}.jpg'
+        img.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+CORPUS_SIZES = {'1080p': (1920, 1080), '4k': (3840, 2160), '8k': (7680, 4320)}
+CORPUS_FORMATS = {'jpg': {'quality': 90}, 'png': {'compress_level': 1}, 'webp': {'quality': 90}}
+CORPUS_KINDS = ('gradient', 'noise', 'blobs')
+
+
+def write_corpus(directory, sizes=tuple(CORPUS_SIZES), formats=tuple(CORPUS_FORMATS),
+                 kinds=CORPUS_KINDS, seed=0):
+    """Write (or reuse) a deterministic on-disk corpus: one image per kind x size x format.
+    Each image is generated from its own seed, so subsets reproduce the same pixels.
+    Returns sorted list of paths named <kind>-<size>.<format>.
+    """
+    import numpy as np
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for kind in kinds:
+        for size in sizes:
+            img = None
+            for fmt in formats:
+                path = directory / f'{kind}-{size}.{fmt}'
+                if not path.exists():
+                    if img is None:
+                        rng = np.random.default_rng(
+                            [seed, CORPUS_KINDS.index(kind), list(CORPUS_SIZES).index(size)])
+                        img = synthetic_image(kind, CORPUS_SIZES[size], rng)
+                    tmp = path.with_name(f'.{path.name}.tmp')
+                    img.save(tmp, format={'jpg': 'JPEG'}.get(fmt, fmt.upper()),
+                             **CORPUS_FORMATS[fmt])
+                    tmp.replace(path)
+                paths.append(path)
+    return sorted(paths)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Contrast solver benchmark: scalar loop vs NumPy batch by batch size
+Pairs are what the extractor checks: generated text colors plus random
+accents against generated surfaces (dark and light). Each size is timed
+through ensure_contrast_batch with the NumPy path forced on and off
+(best of --repeat runs); the crossover is where CONTRAST_BATCH_MIN belongs.
+Results must match ensure_contrast exactly (exit 1 if any differs).
+
+Usage: contrast.py [--sizes 4,8,16,32,64,128,256,1024] [--repeat 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from common import load_extractor
+
+
+def sample_pairs(ec, n, rng):
+    """n (foreground, background, min ratio) triples like one theme's checks"""
+    fgs, bgs, ratios = [], [], []
+    while len(fgs) < n:
+        accent = tuple(rng.randrange(256) for _ in range(3))
+        mode = rng.choice(['dark', 'light'])
+        surfaces = ec.generate_surfaces(accent, mode)
+        texts = ec.generate_text_colors(surfaces['primary'], mode)
+        for group, key, min_ratio in ec.CONTRAST_RULES:
+            if group == 'text':
+                fgs.append(texts[key])
+                bgs.append(surfaces['primary'])
+                ratios.append(min_ratio or 1.0)
+        for _ in range(4):
+            fgs.append(tuple(rng.randrange(256) for _ in range(3)))
+            bgs.append(surfaces['primary'])
+            ratios.append(4.5)
+    return fgs[:n], bgs[:n], ratios[:n]
+
+
+def best_time(fn, repeat):
+    """Best per-call time over repeat rounds of ~50 ms each"""
+    best = float('inf')
+    for _ in range(repeat):
+        calls, start = 0, time.perf_counter()
+        while time.perf_counter() - start < 0.05:
+            fn()
+            calls += 1
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the contrast solver')
+    parser.add_argument('--sizes', default='4,8,16,32,64,128,256,1024')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    ec = load_extractor()
+    if ec.np is None:
+        print("NumPy is required for the batch path", file=sys.stderr)
+        sys.exit(1)
+    rng = random.Random(0)
+    configured = ec.CONTRAST_BATCH_MIN
+
+    print(f"CONTRAST_BATCH_MIN = {configured}; one theme checks "
+          f"{len(ec.CONTRAST_RULES)} text/terminal pairs and 4 accents")
+    print(f"{'pairs':>6} {'scalar us':>10} {'numpy us':>9} {'faster':>7} {'same':>5}")
+    mismatches = 0
+    for n in (int(v) for v in args.sizes.split(',')):
+        fgs, bgs, ratios = sample_pairs(ec, n, rng)
+        expected = [ec.ensure_contrast(f, b, r) for f, b, r in zip(fgs, bgs, ratios)]
+        times = {}
+        for path, minimum in (('scalar', float('inf')), ('numpy', 0)):
+            ec.CONTRAST_BATCH_MIN = minimum
+            same = ec.ensure_contrast_batch(fgs, bgs, ratios) == expected
+            mismatches += not same
+            times[path] = best_time(lambda: ec.ensure_contrast_batch(fgs, bgs, ratios),
+                                    args.repeat)
+        ec.CONTRAST_BATCH_MIN = configured
+        print(f"{n:>6} {times['scalar'] * 1e6:>10.0f} {times['numpy'] * 1e6:>9.0f} "
+              f"{min(times, key=times.get):>7} {'yes' if same else 'NO':>5}")
+
+    if mismatches:
+        print(f"\nFAIL: {mismatches} batch results differ from ensure_contrast", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Decode benchmark: full decode vs draft/reduced decode
+Reports decode time and palette drift (vs the default full-decode path)
+for each image and sample size.
+
+Usage: decode.py [IMAGE_DIR] [--sizes 300,200,150] [--repeat 3]
+"""
+
+import argparse
+import math
+import tempfile
+import time
+
+from common import list_images, load_extractor, make_synthetic_jpegs
+
+
+def best_time(fn, repeat):
+    """Minimum wall time over repeat runs; returns (seconds, last result)"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def palette_drift(reference, candidate):
+    """(changed slots, mean RGB distance) comparing palettes slot by slot"""
+    changed = sum(1 for a, b in zip(reference, candidate) if a != b)
+    dist = [math.dist(a, b) for a, b in zip(reference, candidate)]
+    return changed, sum(dist) / len(dist) if dist else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fast-decode vs full decode')
+    parser.add_argument('images', nargs='?', help='Image directory (default: synthetic 4K/8K JPEGs)')
+    parser.add_argument('--sizes', default='300,200,150', help='Sample sizes to test')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (min is reported)')
+    parser.add_argument('--num-colors', type=int, default=5)
+    args = parser.parse_args()
+
+    ec = load_extractor()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = list_images(args.images) if args.images else make_synthetic_jpegs(tmp)
+
+        def palette(img):
+            return ec.select_diverse(ec.score_histogram(ec.compute_histogram(img)), args.num_colors)
+
+        print(f"{'image':<32} {'mode':<12} {'decode ms':>10} {'speedup':>8} {'changed':>8} {'drift':>7}")
+        for path in images:
+            base_t, base_img = best_time(lambda: ec.load_image(path), args.repeat)
+            reference = palette(base_img)
+            print(f"{path.name[:32]:<32} {'full/' + str(ec.SAMPLE_SIZE):<12} {base_t * 1000:>10.1f} "
+                  f"{'1.00x':>8} {0:>8} {0.0:>7.1f}")
+
+            for size in sizes:
+                t, img = best_time(lambda: ec.load_image(path, size, fast_decode=True), args.repeat)
+                changed, drift = palette_drift(reference, palette(img))
+                print(f"{'':<32} {'fast/' + str(size):<12} {t * 1000:>10.1f} "
+                      f"{base_t / t:>7.2f}x {changed:>8} {drift:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmark: per-stage and end-to-end timing against a saved baseline
+Runs every extraction stage (decode, histogram, extract, contrast, terminal,
+schema) and full generate_theme over a deterministic synthetic corpus
+(gradient/noise/blobs at 1080p/4K/8K as JPEG/PNG/WebP, written once and
+reused). Stage times are the minimum over --repeat runs, summed per stage.
+
+Fails (exit 1) if a stage is slower than the baseline by more than
+--threshold, or if any palette differs between repeats or from the baseline.
+--save writes the current run as the new baseline.
+
+Usage: pipeline.py [--sizes 1080p,4k,8k] [--formats jpg,png,webp] [--repeat 5]
+                   [--baseline FILE] [--threshold 0.15] [--save]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import CORPUS_FORMATS, CORPUS_KINDS, CORPUS_SIZES, load_extractor, write_corpus
+
+BENCH_DIR = Path(os.environ.get('XDG_CACHE_HOME', '~/.cache')).expanduser() / 'themix' / 'bench'
+BASELINE_VERSION = 1
+STAGES = ('decode', 'histogram', 'extract', 'contrast', 'terminal', 'schema', 'end_to_end')
+
+
+def run_stages(ec, path, algorithm, num_colors):
+    """One pass of the generate_theme pipeline, timed stage by stage.
+    Returns ({stage: seconds}, palette fingerprint).
+    """
+    times = {}
+
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        times[stage] = time.perf_counter() - start
+        return result
+
+    img = timed('decode', ec.load_image, path)
+    hist = timed('histogram', ec.compute_histogram, img)
+    accents = timed('extract', ec.EXTRACTORS[algorithm], hist, num_colors)
+
+    def contrast():
+        mode = ec.determine_theme_mode(accents)
+        surfaces = ec.generate_surfaces(accents[0], mode)
+        texts = ec.generate_text_colors(surfaces['primary'], mode)
+        fixed = ec.ensure_contrast_batch(accents, [surfaces['primary']] * len(accents),
+                                         [4.5] * len(accents))
+        return mode, surfaces, texts, fixed
+
+    mode, surfaces, texts, fixed = timed('contrast', contrast)
+    terminal = timed('terminal', ec.generate_terminal_colors, fixed, surfaces, texts, mode)
+
+    def schema():
+        t, term, _ = ec.validate_contrast(fixed, surfaces, texts, terminal)
+        return ec.build_colors_yaml('bench', path, fixed, surfaces, t, term, mode)
+
+    colors = timed('schema', schema)
+    colors.pop('metadata')
+    fingerprint = hashlib.sha256(json.dumps(colors, sort_keys=True).encode()).hexdigest()[:16]
+    return times, fingerprint
+
+
+def end_to_end(ec, path, algorithm, num_colors, output_dir):
+    start = time.perf_counter()
+    ec.generate_theme(path, 'bench', output_dir, num_colors=num_colors, quiet=True,
+                      algorithm=algorithm, update_index=False)
+    return time.perf_counter() - start
+
+
+def benchmark(ec, images, repeat, algorithm, num_colors):
+    """Returns (per-image {stage: min seconds}, per-image fingerprint, unstable names).
+    Images the pipeline rejects get an 'error: ...' fingerprint and no timings.
+    """
+    results, palettes, unstable = {}, {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in images:
+            try:
+                run_stages(ec, path, algorithm, num_colors)  # warm-up, also surfaces errors
+            except Exception as e:
+                palettes[path.name] = f"error: {type(e).__name__}"
+                continue
+            best, prints = {}, set()
+            for _ in range(repeat):
+                times, fingerprint = run_stages(ec, path, algorithm, num_colors)
+                times['end_to_end'] = end_to_end(ec, path, algorithm, num_colors, tmp)
+                prints.add(fingerprint)
+                for stage, seconds in times.items():
+                    best[stage] = min(best.get(stage, seconds), seconds)
+            results[path.name] = best
+            palettes[path.name] = sorted(prints)[0]
+            if len(prints) > 1:
+                unstable.append(path.name)
+    return results, palettes, unstable
+
+
+def totals(results, names=None):
+    """Per-stage sums over all images (or only those in names)"""
+    rows = [r for name, r in results.items() if names is None or name in names]
+    return {stage: sum(r[stage] for r in rows) for stage in STAGES}
+
+
+def environment(ec):
+    from PIL import __version__ as pillow
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'pillow': pillow, 'numpy': ec.np.__version__ if ec.np is not None else None,
+            'generator': ec.GENERATOR}
+
+
+def compare(current, baseline, threshold, min_delta):
+    """Stages slower than baseline by more than threshold (and min_delta seconds)"""
+    regressions = []
+    for stage in STAGES:
+        base, now = baseline.get(stage), current[stage]
+        if base and now > base * (1 + threshold) and now - base > min_delta:
+            regressions.append((stage, base, now))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark extraction stages against a baseline')
+    parser.add_argument('--corpus-dir', default=None,
+                        help=f'Synthetic corpus location (default: {BENCH_DIR}/corpus-s<seed>)')
+    parser.add_argument('--sizes', default=','.join(CORPUS_SIZES), help='Corpus sizes')
+    parser.add_argument('--formats', default=','.join(CORPUS_FORMATS), help='Corpus formats')
+    parser.add_argument('--kinds', default=','.join(CORPUS_KINDS), help='Corpus image kinds')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus seed')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (min is kept)')
+    parser.add_argument('--algorithm', default='greedy')
+    parser.add_argument('--num-colors', type=int, default=5)
+    parser.add_argument('--baseline', default=str(BENCH_DIR / 'baseline.json'),
+                        help='Baseline JSON file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Allowed slowdown per stage as a fraction (default: 0.15)')
+    parser.add_argument('--min-delta', type=float, default=0.002,
+                        help='Ignore slowdowns smaller than this many seconds (default: 0.002)')
+    parser.add_argument('--save', action='store_true', help='Write this run as the baseline')
+    parser.add_argument('--json', action='store_true', help='Print the run as JSON')
+    args = parser.parse_args()
+
+    ec = load_extractor()
+    if ec.np is None:
+        parser.error('the synthetic corpus needs NumPy')
+    if args.algorithm not in ec.EXTRACTORS:
+        parser.error(f'unknown algorithm: {args.algorithm}')
+
+    corpus_dir = Path(args.corpus_dir or BENCH_DIR / f'corpus-s{args.seed}').expanduser()
+    start = time.perf_counter()
+    images = write_corpus(corpus_dir, args.sizes.split(','), args.formats.split(','),
+                          args.kinds.split(','), args.seed)
+    if not args.json:
+        print(f"Corpus: {len(images)} images in {corpus_dir} "
+              f"(ready in {time.perf_counter() - start:.1f}s)")
+
+    results, palettes, unstable = benchmark(ec, images, args.repeat, args.algorithm,
+                                            args.num_colors)
+    run = {
+        'version': BASELINE_VERSION,
+        'recorded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(ec),
+        'params': {'algorithm': args.algorithm, 'num_colors': args.num_colors,
+                   'seed': args.seed},
+        'repeat': args.repeat,
+        'stages': totals(results),
+        'images': results,
+        'palettes': palettes,
+    }
+
+    baseline_path = Path(args.baseline).expanduser()
+    try:
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('version') != BASELINE_VERSION or baseline.get('params') != run['params']:
+            print(f"Baseline {baseline_path} has different parameters; not comparing",
+                  file=sys.stderr)
+            baseline = None
+    except (OSError, ValueError):
+        baseline = None
+
+    failures = [f"palette differs between repeats: {name}" for name in unstable]
+    regressions, compared = [], None
+    if baseline:
+        base_palettes = baseline.get('palettes', {})
+        failures += [f"palette differs from baseline: {name}" for name, fp in palettes.items()
+                     if name in base_palettes and base_palettes[name] != fp]
+        # Only images present in both runs are compared, so a subset run
+        # (e.g. --sizes 1080p) can be checked against a full baseline
+        common = set(results) & set(baseline.get('images', {}))
+        compared = totals(results, common), totals(baseline['images'], common)
+        regressions = compare(*compared, args.threshold, args.min_delta)
+        if not common:
+            print("Baseline has none of these images; timings not compared", file=sys.stderr)
+        failures += [f"{stage} regressed: {base * 1000:.1f}ms -> {now * 1000:.1f}ms "
+                     f"(+{(now / base - 1) * 100:.0f}%)" for stage, base, now in regressions]
+
+    rejected = sorted(name for name, fp in palettes.items() if fp.startswith('error:'))
+    if args.json:
+        print(json.dumps(dict(run, failures=failures), indent=1))
+    else:
+        print(f"\n{'stage':<12} {'total ms':>10} {'baseline':>10} {'change':>8}")
+        for stage in STAGES:
+            now = run['stages'][stage]
+            base = None
+            if compared and compared[1][stage]:
+                now, base = compared[0][stage], compared[1][stage]
+            change = f"{(now / base - 1) * 100:+7.1f}%" if base else ''
+            base_text = f"{base * 1000:.1f}" if base else '-'
+            print(f"{stage:<12} {now * 1000:>10.1f} {base_text:>10} {change:>8}")
+        for name in rejected:
+            print(f"skipped {name}: {palettes[name]}")
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if not failures:
+            print(f"\nOK: {len(palettes) - len(rejected)} palettes stable"
+                  f"{', no stage regressed' if compared else ''}")
+
+    if args.save:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(run, indent=1) + '\n')
+        if not args.json:
+            print(f"Baseline saved: {baseline_path}")
+        return
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Similarity benchmark: palette index vs brute-force scan
+Builds a palette index over N synthetic themes and times top-k queries by
+color (k-d tree), by held-out palette and by existing theme (BLAS ranking),
+each against a brute-force NumPy scan of every palette. Results must agree
+(exit 1 if any query differs). Also reports build, save/load and
+incremental-update cost.
+
+Synthetic palettes mimic a wallpaper library: primary hues cluster around a
+few styles, the other accents sit at hue offsets from the primary, and the
+surfaces come from the extractor's own generate_surfaces.
+
+Usage: similarity.py [--themes 10000] [--queries 500] [-k 10] [--seed 0]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import load_extractor
+
+STYLES = 12
+
+
+def synthetic_palettes(ec, count, rng):
+    """{name: (hash, [hex per palette role])} for count themes"""
+    centers = rng.random(STYLES)
+    palettes = {}
+    for i in range(count):
+        hue = (centers[rng.integers(STYLES)] + rng.normal(0, 0.04)) % 1.0
+        offsets = np.concatenate([[0.0], rng.uniform(0.08, 0.5, 3) * rng.choice([-1, 1], 3)])
+        accents = [ec.Color.from_hsl((hue + off) % 1.0, rng.uniform(0.35, 0.95),
+                                     rng.uniform(0.3, 0.75)) for off in offsets]
+        mode = 'light' if rng.random() < 0.25 else 'dark'
+        surfaces = ec.generate_surfaces(accents[0], mode)
+        colors = [c.hex for c in accents] + [surfaces['primary'].hex, surfaces['secondary'].hex]
+        palettes[f'theme-{i:05d}'] = (f'{i:064x}', colors)
+    return palettes
+
+
+def timed(fn, args):
+    """Per-call seconds and results for fn(*a) over args"""
+    times, results = [], []
+    for a in args:
+        start = time.perf_counter()
+        results.append(fn(*a))
+        times.append(time.perf_counter() - start)
+    return np.array(times), results
+
+
+def same(a, b):
+    """Two result lists agree: same names, or equal distances where ties reorder"""
+    return [n for n, _ in a] == [n for n, _ in b] or \
+        np.allclose([d for _, d in a], [d for _, d in b], atol=1e-3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark palette similarity queries')
+    parser.add_argument('--themes', type=int, default=10000, help='Indexed themes')
+    parser.add_argument('--queries', type=int, default=500, help='Queries per kind')
+    parser.add_argument('-k', type=int, default=10, help='Results per query')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ec = load_extractor()
+    import palette_index
+
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    palettes = synthetic_palettes(ec, args.themes + args.queries, rng)
+    held_out = dict(list(palettes.items())[args.themes:])
+    palettes = dict(list(palettes.items())[:args.themes])
+    print(f"Corpus: {len(palettes)} themes + {len(held_out)} held-out palettes "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    index = palette_index.PaletteIndex()
+    start = time.perf_counter()
+    index.add(palettes)
+    index.rebuild()
+    build = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        start = time.perf_counter()
+        index.save(tmp)
+        save = time.perf_counter() - start
+        size = (tmp / palette_index.INDEX_FILE).stat().st_size
+        start = time.perf_counter()
+        index = palette_index.PaletteIndex.load(tmp)
+        load = time.perf_counter() - start
+
+        # One new theme: append unindexed, save (what every theme write costs)
+        name, palette = next(iter(held_out.items()))
+        start = time.perf_counter()
+        index.add({name: palette})
+        index.maybe_rebuild()
+        index.save(tmp)
+        update = time.perf_counter() - start
+        index.remove([name])
+        index.rebuild()
+
+    print(f"Index: build {build * 1000:.0f} ms, save {save * 1000:.1f} ms, "
+          f"load {load * 1000:.1f} ms, {size / 1024:.0f} KiB, "
+          f"add one theme + save {update * 1000:.1f} ms")
+
+    colors = [(lab, args.k) for lab in
+              palette_index.hex_to_oklab(['#%06x' % c for c in
+                                          rng.integers(0, 1 << 24, args.queries)])]
+    unseen = [(lab, args.k) for lab in
+              palette_index.hex_to_oklab([h for _, p in held_out.values() for h in p])
+              .reshape(-1, palette_index.ROLES, 3)]
+    names = rng.choice(list(palettes), args.queries, replace=False)
+    existing = [(index.palette_of(n), args.k, [n]) for n in names]
+
+    print(f"\n{args.themes} themes, k={args.k}, {args.queries} queries each "
+          f"(per-query microseconds)")
+    print(f"{'query':<10} {'method':<8} {'mean':>8} {'p50':>8} {'p99':>8} {'speedup':>8}")
+    mismatches = 0
+    for kind, index_fn, scan_fn, queries in (
+            ('color', index.nearest_color, index.scan_color, colors),
+            ('palette', index.nearest_palette, index.scan_palette, unseen),
+            ('theme', index.nearest_palette, index.scan_palette, existing)):
+        index_t, index_r = timed(index_fn, queries)
+        scan_t, scan_r = timed(scan_fn, queries)
+        mismatches += sum(1 for a, b in zip(index_r, scan_r) if not same(a, b))
+        for method, t in (('scan', scan_t), ('index', index_t)):
+            print(f"{kind:<10} {method:<8} {t.mean() * 1e6:>8.0f} {np.median(t) * 1e6:>8.0f} "
+                  f"{np.percentile(t, 99) * 1e6:>8.0f} {scan_t.mean() / t.mean():>7.1f}x")
+
+    if mismatches:
+        print(f"\nFAIL: {mismatches} queries differ from the brute-force scan", file=sys.stderr)
+        sys.exit(1)
+    print("\nAll index results match the brute-force scan")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tiled extraction benchmark: full decode vs banded reads under a memory ceiling
+Writes a synthetic panorama in each band-readable format and extracts its
+histogram once without a limit and once per --max-memory value, each in a
+fresh process so peak RSS belongs to that run alone. Histograms must be
+identical to the unlimited run (exit 1 if any differs).
+
+Usage: tiled.py [--size 24000x6000] [--formats ppm,bmp,tif,png] [--limits 32,128]
+                [--dir DIR]
+"""
+
+import argparse
+import hashlib
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_extractor, synthetic_image
+
+
+def peak_rss_kb():
+    """Peak RSS of this process. VmHWM starts fresh at exec; ru_maxrss (the
+    fallback off Linux) keeps the parent's peak across it."""
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(image, limit):
+    """Run in a fresh process: print wall time, peak RSS and a histogram digest"""
+    ec = load_extractor()
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    hist = ec.image_histogram(Path(image), max_memory=limit and limit * 1024 * 1024)
+    print(json.dumps({
+        'wall': time.perf_counter() - start,
+        'rss': peak_rss_kb(),
+        'baseline': baseline,
+        'digest': hashlib.sha1(ec.histogram_to_bytes(hist)).hexdigest(),
+    }))
+
+
+def measure(image, limit):
+    out = subprocess.run([sys.executable, __file__, '--child', str(image), str(limit or 0)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tiled extraction')
+    parser.add_argument('--size', default='24000x6000', help='Panorama WIDTHxHEIGHT')
+    parser.add_argument('--formats', default='ppm,bmp,tif,png')
+    parser.add_argument('--limits', default='32,128', help='--max-memory values in MB')
+    parser.add_argument('--dir', help='Keep (and reuse) the panoramas here')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    import numpy as np
+
+    size = tuple(int(v) for v in args.size.split('x'))
+    limits = [None] + [int(v) for v in args.limits.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(args.dir or tmp)
+        directory.mkdir(parents=True, exist_ok=True)
+        img = None
+        paths = []
+        for fmt in args.formats.split(','):
+            path = directory / f'panorama-{args.size}.{fmt}'
+            if not path.exists():
+                if img is None:
+                    img = synthetic_image('blobs', size, np.random.default_rng(0))
+                img.save(path, **({'compress_level': 1} if fmt == 'png' else {}))
+            paths.append(path)
+        del img
+
+        print(f"Panorama {size[0]}x{size[1]} ({size[0] * size[1] * 4 / 1048576:.0f} MiB decoded)")
+        print(f"{'format':<8} {'limit':>8} {'wall s':>8} {'peak MiB':>9} {'image MiB':>10} {'same':>5}")
+        mismatches = 0
+        for path in paths:
+            reference = None
+            for limit in limits:
+                r = measure(path, limit)
+                reference = reference or r['digest']
+                same = r['digest'] == reference
+                mismatches += not same
+                print(f"{path.suffix[1:]:<8} {limit or '-':>8} {r['wall']:>8.2f} "
+                      f"{r['rss'] / 1024:>9.0f} {(r['rss'] - r['baseline']) / 1024:>10.0f} "
+                      f"{'yes' if same else 'NO':>5}")
+
+    if mismatches:
+        print(f"\nFAIL: {mismatches} banded runs differ from the full decode", file=sys.stderr)
+        sys.exit(1)
+    print("\nAll banded histograms match the full decode")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Themix Apply Engine
+Installs a rendered theme in a single process. Each target is compared with
+what is currently installed and only changed targets are touched; the content
+hash each target was applied with is kept in .apply-state.json, so only the
+reload hooks whose config actually changed are run (even when a symlinked
+file was re-rendered in place), and independent hooks run concurrently.
+Requires: python3
+"""
+
+import sys
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+THEMES_DIR = Path(os.environ.get('THEMES_DIR', '~/.config/themes')).expanduser()
+HOME = Path.home()
+CONFIG = HOME / '.config'
+STATE_FILE = '.apply-state.json'
+
+# Colors for output
+GREEN = '\033[0;32m'
+YELLOW = '\033[1;33m'
+BLUE = '\033[0;34m'
+NC = '\033[0m'
+
+
+def log_info(msg):
+    print(f"{BLUE}{NC} {msg}")
+
+
+def log_success(msg):
+    print(f"{GREEN}{NC} {msg}")
+
+
+def log_warn(msg):
+    print(f"{YELLOW}{NC} {msg}")
+
+
+# =============================================================================
+# Targets
+# =============================================================================
+#
+# (theme file, destination, method, reload hook). Methods: 'link' symlinks the
+# file, 'copy' copies it (apps that don't follow symlinks). The hook runs only
+# if the destination's content changed.
+
+TARGETS = [
+    # Core
+    ('hyprland.conf', CONFIG / 'hypr/theme.conf', 'link', None),
+    ('waybar.css', CONFIG / 'waybar/theme.css', 'link', 'waybar'),
+    ('waybar-themix.css', CONFIG / 'waybar/themix.css', 'link', 'waybar'),
+    ('kitty.conf', CONFIG / 'kitty/theme.conf', 'link', None),
+    ('btop.theme', CONFIG / 'btop/themes/current.theme', 'link', None),
+    ('hyprlock.conf', CONFIG / 'hypr/hyprlock-theme.conf', 'link', None),
+    ('niri.kdl', CONFIG / 'niri/theme.kdl', 'link', 'niri'),
+    # Copies
+    ('wofi.css', CONFIG / 'wofi/style.css', 'copy', None),
+    ('wlogout.css', CONFIG / 'wlogout/style.css', 'copy', None),
+    ('mako.ini', CONFIG / 'mako/config', 'copy', None),
+    ('rofi.rasi', CONFIG / 'rofi/theme.rasi', 'copy', None),
+    # GTK user CSS
+    ('gtk4-overrides.css', CONFIG / 'gtk-4.0/gtk.css', 'link', None),
+    ('gtk3-overrides.css', CONFIG / 'gtk-3.0/gtk.css', 'link', None),
+    # Optional apps
+    ('starship.toml', CONFIG / 'starship.toml', 'link', None),
+    ('lazygit.yml', CONFIG / 'lazygit/config.yml', 'link', None),
+    ('zellij.kdl', CONFIG / 'zellij/themes/themix.kdl', 'link', None),
+    ('bottom.toml', CONFIG / 'bottom/bottom.toml', 'link', None),
+    ('fastfetch.jsonc', CONFIG / 'fastfetch/config.jsonc', 'link', None),
+    ('cava.config', CONFIG / 'cava/config', 'link', None),
+    ('swaync-style.css', CONFIG / 'swaync/style.css', 'link', None),
+    ('yazi.toml', CONFIG / 'yazi/theme.toml', 'copy', None),
+]
+
+
+def file_digest(path):
+    """SHA-256 of a file's content (following symlinks), or None if unreadable"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def replace_with(dest, make):
+    """Remove whatever is at dest (file, link or dir) and recreate it via make()"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.is_symlink() or dest.is_file():
+        dest.unlink()
+    elif dest.is_dir():
+        shutil.rmtree(dest)
+    make()
+
+
+def install(src, dest, method, applied=None, force=False):
+    """Install src at dest. `applied` is the digest recorded the last time dest
+    was applied; a link that already points at src still counts as changed
+    when src was re-rendered since. Returns (touched, content_changed, digest)."""
+    new = file_digest(src)
+    old = file_digest(dest)
+    changed = force or new != applied or new != old
+
+    if method == 'link':
+        if dest.is_symlink() and os.readlink(dest) == str(src) and not force:
+            return False, changed, new
+        replace_with(dest, lambda: dest.symlink_to(src))
+    else:
+        if old == new and not dest.is_symlink() and not force:
+            return False, changed, new
+        replace_with(dest, lambda: shutil.copyfile(src, dest))
+    return True, changed, new
+
+
+def install_dir_link(src, dest):
+    """Point dest at directory src; returns True if it changed"""
+    if dest.is_symlink() and os.readlink(dest) == str(src):
+        return False
+    replace_with(dest, lambda: dest.symlink_to(src))
+    return True
+
+
+def write_if_changed(path, content):
+    """Write text unless the file already holds it; returns True if written"""
+    try:
+        if path.read_text() == content:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return True
+
+
+def update_setting(path, prefix, replacement):
+    """Replace the line starting with prefix (or append); returns True if changed"""
+    lines = path.read_text().splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith(prefix):
+            if line == replacement:
+                return False
+            lines[i] = replacement
+            break
+    else:
+        lines.append(replacement)
+    path.write_text('\n'.join(lines) + '\n')
+    return True
+
+
+# =============================================================================
+# Apply Steps
+# =============================================================================
+
+def apply_targets(theme_dir, applied, force=False):
+    """Install all file targets; returns set of hooks to run. `applied` maps
+    each destination to the digest it was last applied with and is updated."""
+    hooks = set()
+    for name, dest, method, hook in TARGETS:
+        src = theme_dir / name
+        if not src.is_file():
+            continue
+        touched, changed, digest = install(src, dest, method, applied.get(str(dest)), force)
+        applied[str(dest)] = digest
+        if changed:
+            log_success(f"{name} -> {str(dest).replace(str(HOME), '~', 1)}")
+            if hook:
+                hooks.add(hook)
+        elif touched:
+            log_info(f"{name} relinked (content unchanged)")
+    return hooks
+
+
+def apply_dirs(theme_dir, theme_name):
+    """Brave theme and Kvantum directory links"""
+    brave = theme_dir / 'brave-theme'
+    if brave.is_dir() and install_dir_link(brave, CONFIG / 'brave-theme-current'):
+        log_success("brave-theme -> ~/.config/brave-theme-current (restart Brave to apply)")
+
+    kvantum_dir = theme_dir / 'kvantum' / theme_name
+    if kvantum_dir.is_dir():
+        linked = install_dir_link(kvantum_dir, CONFIG / 'Kvantum' / theme_name)
+        written = write_if_changed(CONFIG / 'Kvantum/kvantum.kvconfig',
+                                   f"[General]\ntheme={theme_name}\n")
+        if linked or written:
+            log_success(f"Kvantum theme set to: {theme_name}")
+
+
+def apply_gtk_settings(theme_name, force=False):
+    """settings.ini, gsettings and Hyprland GTK_THEME; skipped if already set"""
+    gtk3_settings = CONFIG / 'gtk-3.0/settings.ini'
+    if gtk3_settings.is_file():
+        changed = update_setting(gtk3_settings, 'gtk-theme-name=', f'gtk-theme-name={theme_name}')
+    else:
+        changed = write_if_changed(gtk3_settings, f"[Settings]\ngtk-theme-name={theme_name}\n")
+    if not changed and not force:
+        return
+    log_success("Updated GTK3 settings.ini")
+
+    if shutil.which('gsettings'):
+        if run(['gsettings', 'set', 'org.gnome.desktop.interface', 'gtk-theme', theme_name]):
+            log_success("Updated gsettings gtk-theme")
+
+    hypr_env = CONFIG / 'hypr/config/environment.conf'
+    if hypr_env.is_file():
+        update_setting(hypr_env, 'envd = GTK_THEME,', f'envd = GTK_THEME,{theme_name}')
+        log_success("Updated Hyprland GTK_THEME environment")
+
+    if shutil.which('hyprctl'):
+        run(['hyprctl', 'keyword', 'envd', f'GTK_THEME,{theme_name}'])
+
+
+def apply_nvim_colorscheme(theme_dir, theme_name):
+    """Install nvim.lua as the only colorscheme; skipped if already installed"""
+    nvim_theme = theme_dir / 'nvim.lua'
+    if not nvim_theme.is_file():
+        return
+    nvim_config = CONFIG / 'nvim'
+    colors_dir = nvim_config / 'colors'
+    lua_file = nvim_config / 'lua' / theme_name / 'init.lua'
+    wrapper = colors_dir / f'{theme_name}.vim'
+
+    if wrapper.is_file() and file_digest(lua_file) == file_digest(nvim_theme):
+        return
+
+    # Clean old colorschemes (only one active at a time)
+    for old_vim in colors_dir.glob('*.vim'):
+        if old_vim.stem != theme_name:
+            old_vim.unlink()
+            shutil.rmtree(nvim_config / 'lua' / old_vim.stem, ignore_errors=True)
+
+    lua_file.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(nvim_theme, lua_file)
+    write_if_changed(wrapper, f"\" {theme_name} colorscheme wrapper\n"
+                              f"lua require('{theme_name}').setup()\n")
+    log_success(f"nvim colorscheme '{theme_name}' installed")
+
+
+def update_current_link(theme_dir, themes_dir):
+    if install_dir_link(theme_dir, themes_dir / 'current'):
+        log_success("Updated 'current' symlink")
+
+
+def find_wallpaper(theme_dir):
+    for ext in ('jpg', 'jpeg', 'png'):
+        candidate = theme_dir / f'wallpaper.{ext}'
+        if candidate.is_file():
+            return candidate
+    backgrounds = theme_dir / 'backgrounds'
+    if backgrounds.is_dir():
+        for candidate in sorted(backgrounds.rglob('*')):
+            if candidate.suffix in ('.jpg', '.png') and candidate.is_file():
+                return candidate
+    return None
+
+
+# =============================================================================
+# Reload Hooks
+# =============================================================================
+
+def run(cmd, **kwargs):
+    """Run a command quietly; returns True on success"""
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              **kwargs).returncode == 0
+    except OSError:
+        return False
+
+
+def running(process_name):
+    return run(['pgrep', '-x', process_name])
+
+
+def spawn(command):
+    """Launch a detached shell command through the running compositor"""
+    if shutil.which('hyprctl') and running('Hyprland'):
+        run(['hyprctl', 'dispatch', 'exec', command])
+    elif shutil.which('niri') and running('niri'):
+        if not run(['niri', 'msg', 'action', 'spawn', '--', 'sh', '-c', command]):
+            subprocess.Popen(['sh', '-c', command], start_new_session=True)
+    else:
+        subprocess.Popen(['sh', '-c', command], start_new_session=True)
+
+
+def restart_waybar():
+    run(['killall', '-q', 'waybar'])
+    time.sleep(0.5)
+    spawn("waybar > /tmp/waybar.log 2>&1")
+    return "Waybar restarted"
+
+
+def reload_niri():
+    if shutil.which('niri') and running('niri'):
+        if run(['niri', 'msg', 'action', 'load-config-file']):
+            return "Niri reloaded"
+    return None
+
+
+def set_wallpaper(wallpaper):
+    """Start the new swaybg before killing the old one (no black frame)"""
+    try:
+        old = subprocess.run(['pgrep', '-x', 'swaybg'], capture_output=True,
+                             text=True).stdout.split()
+    except OSError:
+        old = []
+    spawn(f"swaybg -o '*' -i '{wallpaper}' -m fill")
+    if old:
+        time.sleep(0.3)
+        run(['kill', *old])
+    return f"Wallpaper set: {wallpaper.name}"
+
+
+def run_hooks(hooks):
+    """Run independent reload hooks concurrently"""
+    if not hooks:
+        log_info("No services need reloading")
+        return
+    print("")
+    log_info("Reloading: " + ", ".join(name for name, _ in hooks))
+    with ThreadPoolExecutor(max_workers=len(hooks)) as pool:
+        for message in pool.map(lambda hook: hook[1](), hooks):
+            if message:
+                log_success(message)
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def load_state(themes_dir):
+    try:
+        return json.loads((themes_dir / STATE_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def apply_theme(theme_name, themes_dir=THEMES_DIR, force=False):
+    """Apply theme_name; returns list of hooks that were run"""
+    theme_dir = themes_dir / theme_name
+    state = load_state(themes_dir)
+
+    hooks = apply_targets(theme_dir, state.setdefault('targets', {}), force)
+    apply_dirs(theme_dir, theme_name)
+    if (theme_dir / 'colors-oomox').is_file():
+        apply_gtk_settings(theme_name, force)
+    else:
+        # No GTK theme is built without it (e.g. schedules): keep the current one
+        log_info("No colors-oomox: GTK theme left unchanged")
+    apply_nvim_colorscheme(theme_dir, theme_name)
+    update_current_link(theme_dir, themes_dir)
+
+    pending = []
+    if 'waybar' in hooks:
+        pending.append(('waybar', restart_waybar))
+    if 'niri' in hooks:
+        pending.append(('niri', reload_niri))
+
+    wallpaper = find_wallpaper(theme_dir)
+    if wallpaper:
+        resolved = str(wallpaper.resolve())
+        if force or state.get('wallpaper') != resolved or not running('swaybg'):
+            pending.append(('wallpaper', lambda: set_wallpaper(wallpaper)))
+        state['wallpaper'] = resolved
+
+    run_hooks(pending)
+
+    state['theme'] = theme_name
+    (themes_dir / STATE_FILE).write_text(json.dumps(state, indent=1) + '\n')
+    return [name for name, _ in pending]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Apply a rendered theme, touching only changed files and services'
+    )
+    parser.add_argument('theme_name', help='Theme directory name')
+    parser.add_argument('--themes-dir', default=str(THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    parser.add_argument('--force', '-f', action='store_true',
+                        help='Reinstall every target and run every reload hook')
+    args = parser.parse_args()
+
+    themes_dir = Path(args.themes_dir).expanduser()
+    if not (themes_dir / args.theme_name).is_dir():
+        print(f"Theme not found: {themes_dir / args.theme_name}", file=sys.stderr)
+        sys.exit(1)
+
+    apply_theme(args.theme_name, themes_dir, args.force)
+
+
+if __name__ == '__main__':
+    main()
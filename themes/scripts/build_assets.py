@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Themix Asset Builder
+Builds the assets that come after template rendering: the Brave theme images
+(solid PNGs written with Pillow), the GTK3 theme (oomox-cli) and its GTK4
+stylesheet (the oomox base16 plugin). Each step is a job; independent jobs
+run concurrently under a small scheduler with a per-job timeout, and one
+scheduler run can take the jobs of many themes while capping how many run at
+once across all of them.
+Jobs keep the content-hash stamps in <theme>/.build/<step>.sha256, so steps
+whose inputs are unchanged are not scheduled at all.
+With $THEMIX_TIMINGS set, per-job timings are appended there (see timings.py).
+Requires: python3, Pillow (Brave images), oomox-cli (GTK; skipped if missing)
+"""
+
+import sys
+import argparse
+import hashlib
+import io
+import os
+import shutil
+import signal
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import theme_colors
+import timings
+
+
+THEMES_DIR = Path(os.environ.get('THEMES_DIR', '~/.config/themes')).expanduser()
+GTK_THEMES_DIR = Path.home() / '.themes'
+BASE16_CLI = Path('/opt/oomox/plugins/base16/cli.py')
+GTK4_TEMPLATE = (BASE16_CLI.parent / 'templates/gtk4-oodwaita/templates/'
+                 'gtk4-libadwaita1.7.2.mustache')
+
+# Seconds before a job's external tool is killed (oomox-cli renders every
+# asset of a GTK theme, so it gets the most room). In-process jobs write a
+# few small files and have none.
+TIMEOUTS = {'gtk3': 300, 'gtk4-css': 60}
+
+# Brave images: (file, source color, height); all 1 px wide and stretched by Brave
+BRAVE_IMAGES = [
+    ('theme_frame.png', 'surface.primary', 128),
+    ('theme_toolbar.png', 'surface.secondary', 128),
+    ('theme_tab_background.png', 'surface.tertiary', 80),
+]
+
+# Colors for output
+GREEN = '\033[0;32m'
+YELLOW = '\033[1;33m'
+NC = '\033[0m'
+
+
+def log_success(msg):
+    print(f"{GREEN}{NC} {msg}")
+
+
+def log_warn(msg):
+    print(f"{YELLOW}{NC} {msg}")
+
+
+# =============================================================================
+# Build Stamps
+# =============================================================================
+#
+# A step's stamp is the sha256 of its input files concatenated (missing files
+# contribute nothing), one hex line in <theme>/.build/<step>.sha256.
+
+def inputs_hash(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+
+def step_current(theme_dir, step, digest):
+    try:
+        return (theme_dir / '.build' / f'{step}.sha256').read_text().strip() == digest
+    except OSError:
+        return False
+
+
+def mark_step(theme_dir, step, digest):
+    (theme_dir / '.build').mkdir(parents=True, exist_ok=True)
+    (theme_dir / '.build' / f'{step}.sha256').write_text(digest + '\n')
+
+
+def clear_step(theme_dir, step):
+    (theme_dir / '.build' / f'{step}.sha256').unlink(missing_ok=True)
+
+
+# =============================================================================
+# Scheduler
+# =============================================================================
+
+class Job:
+    """One build step of one theme. fn(timeout) does the work and returns a
+    message for the log (or None); it starts once every job in `after` has
+    succeeded and is skipped if any of them did not."""
+
+    def __init__(self, theme, name, fn, timeout=None, after=()):
+        self.theme = theme
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+        self.after = tuple(after)
+
+    def __repr__(self):
+        return f'{self.theme}:{self.name}'
+
+
+def run_tool(cmd, timeout):
+    """Run an external tool in its own process group and return its stdout.
+    On timeout the whole group is killed (oomox-cli starts helpers of its own)
+    and subprocess.TimeoutExpired is raised."""
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, start_new_session=True)
+    try:
+        out, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.communicate()
+        raise
+    if proc.returncode != 0:
+        raise RuntimeError(f"{Path(cmd[0]).name} exited with status {proc.returncode}")
+    return out
+
+
+def _call(job):
+    """Run a job on a worker thread: (status, seconds, message, cpu seconds of
+    this thread; external tools' CPU is not counted)"""
+    start, cpu = time.perf_counter(), time.thread_time()
+    try:
+        status, message = 'ok', job.fn(job.timeout)
+    except subprocess.TimeoutExpired:
+        status, message = 'timeout', f"timed out after {job.timeout}s"
+    except Exception as e:
+        status, message = 'failed', str(e) or type(e).__name__
+    return status, time.perf_counter() - start, message, time.thread_time() - cpu
+
+
+def run_jobs(jobs, max_workers=None):
+    """Run jobs concurrently, at most max_workers at a time across all themes.
+    Jobs start in list order as their dependencies finish.
+    Returns {job: (status, seconds, message, cpu)}; status is ok, failed,
+    timeout or skipped (a dependency did not succeed).
+    """
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    pending = list(jobs)
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Submit only what can start now, so a queued job's timer and the
+            # worker cap both refer to jobs that are actually running
+            progress = True
+            while progress:
+                progress = False
+                for job in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if any(dep not in results for dep in job.after):
+                        continue
+                    pending.remove(job)
+                    progress = True
+                    failed = [dep for dep in job.after if results[dep][0] != 'ok']
+                    if failed:
+                        results[job] = ('skipped', 0.0, f"{failed[0].name} did not finish", 0.0)
+                    else:
+                        running[pool.submit(_call, job)] = job
+            if not running:
+                if pending:
+                    raise ValueError(f"Unsatisfiable job dependencies: {pending}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
+
+
+# =============================================================================
+# Brave
+# =============================================================================
+
+def brave_image_data(values):
+    """{file name: PNG bytes} of the Brave images for resolved color values"""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Pillow required. Install: pip install Pillow")
+    images = {}
+    for name, key, height in BRAVE_IMAGES:
+        out = io.BytesIO()
+        Image.new('RGB', (1, height), values[key]).save(out, 'PNG')
+        images[name] = out.getvalue()
+    return images
+
+
+def brave_images(theme_dir, force=False):
+    """Job for the Brave theme images, or None if up to date / no brave-theme dir"""
+    brave_dir = theme_dir / 'brave-theme'
+    if not brave_dir.is_dir():
+        return None
+    images_dir = brave_dir / 'images'
+    digest = inputs_hash(theme_dir / 'colors.yaml', theme_dir / 'overrides.yaml')
+    if (not force and (images_dir / BRAVE_IMAGES[-1][0]).is_file()
+            and step_current(theme_dir, 'brave', digest)):
+        return None
+
+    def build(timeout):
+        # Resolved colors (overrides merged) from the colors.json sidecar
+        images = brave_image_data(theme_colors.load_values(theme_dir))
+        images_dir.mkdir(parents=True, exist_ok=True)
+        for name, data in images.items():
+            (images_dir / name).write_bytes(data)
+        mark_step(theme_dir, 'brave', digest)
+        return "Brave theme images generated"
+
+    return Job(theme_dir.name, 'brave', build, None)
+
+
+# =============================================================================
+# GTK
+# =============================================================================
+#
+# oomox-cli builds the GTK3 theme into ~/.themes/<name>; the GTK4 stylesheet
+# is rendered by the base16 plugin from the same colors-oomox, so the two run
+# side by side and the stylesheet is installed once both have finished (an
+# oomox build rewrites the gtk-4.0 directory).
+
+def gtk_theme(theme_dir, force=False):
+    """Jobs for the GTK3 build and the GTK4 stylesheet ([] if up to date)"""
+    theme = theme_dir.name
+    oomox_file = theme_dir / 'colors-oomox'
+    gtk_dest = GTK_THEMES_DIR / theme
+    if not oomox_file.is_file() or not shutil.which('oomox-cli'):
+        return []
+
+    oomox_hash = inputs_hash(oomox_file)
+    gtk4_hash = inputs_hash(oomox_file, theme_dir / 'gtk4-overrides.css')
+    oomox_current = not force and gtk_dest.is_dir() and step_current(theme_dir, 'oomox',
+                                                                     oomox_hash)
+    # Without the base16 plugin's template there is no stylesheet to build, so
+    # the gtk4 step is never stamped and must not keep the theme out of date
+    has_gtk4 = GTK4_TEMPLATE.is_file()
+    if oomox_current and (not has_gtk4 or step_current(theme_dir, 'gtk4', gtk4_hash)):
+        return []
+
+    jobs = []
+    rendered = {}
+
+    def build_gtk3(timeout):
+        run_tool(['oomox-cli', '-o', theme, '-t', str(GTK_THEMES_DIR), str(oomox_file)],
+                 timeout)
+        # Fresh oomox output always needs the GTK4 CSS reinstalled
+        clear_step(theme_dir, 'gtk4')
+        if gtk_dest.is_dir():
+            mark_step(theme_dir, 'oomox', oomox_hash)
+            return f"GTK theme generated: {gtk_dest}"
+        return None
+
+    def render_gtk4(timeout):
+        out = run_tool(['python3', str(BASE16_CLI), str(GTK4_TEMPLATE), str(oomox_file)],
+                       timeout)
+        rendered['css'] = ''.join(line for line in out.splitlines(keepends=True)
+                                  if not line.startswith('Import Colors')).strip('\n')
+        return None
+
+    def install_gtk4(timeout):
+        if not gtk_dest.is_dir():
+            return None
+        messages = []
+        # Ensure gtk-4.0 symlink exists (oomox doesn't always create it)
+        gtk4_dir = gtk_dest / 'gtk-4.0'
+        if (gtk_dest / 'gtk-3.20').is_dir() and not os.path.lexists(gtk4_dir):
+            gtk4_dir.symlink_to('gtk-3.20')
+            messages.append("Created gtk-4.0 symlink")
+        if rendered.get('css'):
+            gtk4_dir.mkdir(parents=True, exist_ok=True)
+            css = rendered['css'] + '\n'
+            overrides = theme_dir / 'gtk4-overrides.css'
+            if overrides.is_file():
+                css += overrides.read_text()
+            (gtk4_dir / 'gtk.css').write_text(css)
+            # Clean up oomox GTK3 files that cause GTK4 warnings
+            for name in ('gtk.gresource', 'gtk.gresource.xml', 'gtk-dark.css'):
+                (gtk4_dir / name).unlink(missing_ok=True)
+            shutil.rmtree(gtk4_dir / 'dist', ignore_errors=True)
+            mark_step(theme_dir, 'gtk4', gtk4_hash)
+            messages.append("GTK4 theme generated with libadwaita support")
+        return '; '.join(messages) or None
+
+    if not oomox_current:
+        jobs.append(Job(theme, 'gtk3', build_gtk3, TIMEOUTS['gtk3']))
+    if has_gtk4:
+        jobs.append(Job(theme, 'gtk4-css', render_gtk4, TIMEOUTS['gtk4-css']))
+    jobs.append(Job(theme, 'gtk4', install_gtk4, None, after=list(jobs)))
+    return jobs
+
+
+# =============================================================================
+# Build
+# =============================================================================
+#
+# Kvantum needs no job: its kvconfig is a plain template, written by the
+# template pass (render_templates.py) before any of these run.
+
+def theme_jobs(theme_dir, force=False):
+    """Every job a theme needs, in start order (slowest first)"""
+    jobs = gtk_theme(theme_dir, force)
+    brave = brave_images(theme_dir, force)
+    return jobs + [brave] if brave else jobs
+
+
+def build_themes(theme_names, themes_dir=THEMES_DIR, force=False, max_workers=None,
+                 quiet=False, timeout=None):
+    """Build the assets of one or more themes in one scheduler run.
+    Returns the number of jobs that failed, timed out or were skipped.
+    """
+    if not quiet and not shutil.which('oomox-cli'):
+        log_warn("oomox-cli not found, skipping GTK theme generation")
+    jobs = []
+    for name in theme_names:
+        theme_dir = themes_dir / name
+        if not (theme_dir / 'colors.yaml').is_file():
+            log_warn(f"colors.yaml not found, skipping assets for: {name}")
+            continue
+        with timings.stage('plan'):
+            jobs += theme_jobs(theme_dir, force)
+    if timeout is not None:
+        for job in jobs:
+            if job.timeout is not None:
+                job.timeout = timeout
+
+    results = run_jobs(jobs, max_workers)
+    problems = 0
+    many = len(theme_names) > 1
+    for job in jobs:
+        status, seconds, message, cpu = results[job]
+        timings.add(job.name, seconds, cpu)
+        prefix = f"[{job.theme}] " if many else ''
+        if status != 'ok':
+            problems += 1
+            log_warn(f"{prefix}{job.name}: {message}")
+        elif message and not quiet:
+            log_success(f"{prefix}{message} ({seconds:.2f}s)")
+    return problems
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build Brave images and GTK themes for rendered themes, '
+                    'running independent steps concurrently'
+    )
+    parser.add_argument('themes', nargs='+', metavar='theme_name',
+                        help='Theme directory names (jobs of all themes share the cap)')
+    parser.add_argument('--themes-dir', default=str(THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    parser.add_argument('--force', '-f', action='store_true',
+                        help='Rebuild every step, ignoring the build stamps')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='Most jobs running at once, across all themes '
+                             '(default: CPU count)')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Seconds before a job's external tool is killed "
+                             '(default: 300 for oomox-cli, 60 for the GTK4 render)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Only report jobs that did not succeed')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print per-job timings as JSON on stderr')
+    args = parser.parse_args()
+
+    recorder = None
+    if args.timings or timings.requested():
+        recorder = timings.start('build_assets')
+    problems = build_themes(args.themes, Path(args.themes_dir).expanduser(), args.force,
+                            args.jobs, args.quiet, args.timeout)
+    if recorder:
+        recorder.emit(stderr=args.timings, themes=len(args.themes))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
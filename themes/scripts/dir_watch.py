@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Themix Directory Watcher
+Reports files created, rewritten or moved into a directory tree.
+Uses Linux inotify through ctypes (no extra packages); elsewhere, or when
+inotify is unavailable, falls back to rescanning the tree every few seconds.
+Both report the same thing: paths that may have changed since the last call.
+Requires: python3
+"""
+
+import sys
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+POLL_INTERVAL = 5.0
+
+
+def walk_files(root):
+    """Every regular file under root"""
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath) / name
+            if path.is_file():
+                yield path
+
+
+# =============================================================================
+# Watchers
+# =============================================================================
+
+class InotifyWatcher:
+    """Recursive inotify watch; new subdirectories are watched as they appear"""
+
+    def __init__(self, root):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.root = Path(root)
+        self.dirs = {}  # watch descriptor -> directory
+        self.add_tree(self.root)
+
+    def add_tree(self, directory):
+        """Watch directory and every directory below it"""
+        for dirpath, _, _ in os.walk(directory):
+            wd = self._add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, 'inotify watch limit reached '
+                                       '(raise fs.inotify.max_user_watches)')
+                continue  # vanished or unreadable
+            self.dirs[wd] = Path(dirpath)
+
+    def changes(self, timeout):
+        """Paths touched since the last call, waiting up to timeout seconds for one"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: treat everything as possibly changed
+                    changed.update(walk_files(self.root))
+                    continue
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                parent = self.dirs.get(wd)
+                if parent is None or not name:
+                    continue
+                path = parent / name
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files can land before the watch exists; pick them up now
+                        try:
+                            self.add_tree(path)
+                        except OSError as e:
+                            print(f"Warning: not watching {path}: {e}", file=sys.stderr)
+                        changed.update(walk_files(path))
+                    continue
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Rescans the tree and reports files whose size or mtime changed"""
+
+    def __init__(self, root, interval=POLL_INTERVAL):
+        self.root = Path(root)
+        self.interval = interval
+        self.stamps = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        stamps = {}
+        for path in walk_files(self.root):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            stamps[path] = (st.st_mtime_ns, st.st_size)
+        return stamps
+
+    def changes(self, timeout):
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        self.next_scan = time.monotonic() + self.interval
+        stamps = self.scan()
+        changed = {path for path, stamp in stamps.items() if self.stamps.get(path) != stamp}
+        self.stamps = stamps
+        return changed
+
+    def close(self):
+        pass
+
+
+def watch(root):
+    """Best available watcher for root: inotify, else polling"""
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError):
+        return PollingWatcher(root)
@@ -3,27 +3,47 @@
 Themix Color Extractor
 Extracts dominant colors from wallpaper and generates colors.yaml
 Portable Python implementation (requires: python3, Pillow, PyYAML)
+Optional: NumPy (vectorized extraction, several times faster on large batches)
+Instrumentation: --timings, --profile FILE, $THEMIX_TIMINGS (see timings.py)
 """
 
 import sys
 import argparse
 from pathlib import Path
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+import hashlib
+import json
 import math
 import os
+import shutil
+import struct
+import tempfile
+import time
 
 try:
-    import yaml
+    from PIL import Image, ImageSequence
 except ImportError:
-    print("Error: PyYAML required. Install: pip install PyYAML", file=sys.stderr)
+    print("Error: Pillow required. Install: pip install Pillow", file=sys.stderr)
     sys.exit(1)
 
 try:
-    from PIL import Image
+    import numpy as np
 except ImportError:
-    print("Error: Pillow required. Install: pip install Pillow", file=sys.stderr)
-    sys.exit(1)
+    np = None  # Fall back to pure-Python extraction
+
+import theme_colors
+import theme_index
+import tiled_image
+import timings
+
+# Sibling modules (palette_index) import this script as 'extract_colors';
+# when it runs as a script let them reuse it rather than load it again
+if __name__ == '__main__':
+    sys.modules.setdefault('extract_colors', sys.modules[__name__])
 
 
 # =============================================================================
@@ -92,21 +112,18 @@ def rgb_to_rgba(rgb, alpha=0.95):
 
 def adjust_lightness(rgb, factor):
     """Adjust lightness of a color by factor (>1 lighter, <1 darker)"""
-    h, s, l = rgb_to_hsl(*rgb)
-    l = max(0, min(1, l * factor))
-    return hsl_to_rgb(h, s, l)
+    color = Color.of(rgb)
+    return color.with_hsl(l=max(0, min(1, color.lightness * factor)))
 
 
 def set_lightness(rgb, target_l):
     """Set lightness to specific value"""
-    h, s, _ = rgb_to_hsl(*rgb)
-    return hsl_to_rgb(h, s, target_l)
+    return Color.of(rgb).with_hsl(l=target_l)
 
 
 def set_saturation(rgb, target_s):
     """Set saturation to specific value"""
-    h, _, l = rgb_to_hsl(*rgb)
-    return hsl_to_rgb(h, target_s, l)
+    return Color.of(rgb).with_hsl(s=target_s)
 
 
 def calculate_luminance(rgb):
@@ -117,63 +134,338 @@ def calculate_luminance(rgb):
 
 def contrast_ratio(bg_rgb, fg_rgb):
     """Calculate WCAG contrast ratio between two colors"""
-    bg_lum = calculate_luminance(bg_rgb)
-    fg_lum = calculate_luminance(fg_rgb)
+    bg_lum = _luminance(bg_rgb)
+    fg_lum = _luminance(fg_rgb)
     lighter = max(bg_lum, fg_lum)
     darker = min(bg_lum, fg_lum)
     return (lighter + 0.05) / (darker + 0.05)
 
 
-def ensure_contrast(fg_rgb, bg_rgb, min_ratio=4.5):
-    """Adjust foreground color lightness to achieve minimum contrast ratio"""
-    current_ratio = contrast_ratio(bg_rgb, fg_rgb)
-    if current_ratio >= min_ratio:
-        return fg_rgb
-
-    h, s, l = rgb_to_hsl(*fg_rgb)
-    bg_lum = calculate_luminance(bg_rgb)
-
-    # Try increasing lightness in steps (for dark backgrounds)
-    if bg_lum < 0.5:
-        for target_l in [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9]:
-            test_rgb = hsl_to_rgb(h, s, target_l)
-            if contrast_ratio(bg_rgb, test_rgb) >= min_ratio:
-                return test_rgb
-    else:
-        # For light backgrounds, try decreasing lightness
-        for target_l in [0.4, 0.35, 0.3, 0.25, 0.2, 0.15, 0.1]:
-            test_rgb = hsl_to_rgb(h, s, target_l)
-            if contrast_ratio(bg_rgb, test_rgb) >= min_ratio:
-                return test_rgb
+# =============================================================================
+# Color Type
+# =============================================================================
+#
+# Generators pass Color objects around instead of bare tuples. A Color
+# behaves like its (r, g, b) tuple (unpacking, indexing, ==, hashing), and
+# derives its HSL, OKLab, luminance and hex forms once, on first use.
+# Color.of() interns instances by RGB value, so a batch of palettes built from
+# the same surfaces, text grays and ANSI bases shares those conversions.
+# Quantized colors (every channel a multiple of 8, as extracted accents are)
+# take their HSL from a 32768-entry table indexed by the 15-bit histogram key.
+
+QUANT_BINS = 1 << 15
+COLOR_CACHE_MAX = 1 << 16  # interned Colors kept before the table is reset
+
+_quant_hsl = [None] * QUANT_BINS  # 15-bit key -> (h, s, l), filled on first use
+_quant_hsl_np = None
+
+
+def quantized_hsl(r, g, b):
+    """rgb_to_hsl for a color on the 8-step grid, memoized by 15-bit key"""
+    key = (r >> 3) << 10 | (g >> 3) << 5 | (b >> 3)
+    hsl = _quant_hsl[key]
+    if hsl is None:
+        hsl = _quant_hsl[key] = rgb_to_hsl(r, g, b)
+    return hsl
+
+
+def quantized_hsl_table():
+    """(32768, 3) array of rgb_to_hsl for every 15-bit key, computed once (NumPy)"""
+    global _quant_hsl_np
+    if _quant_hsl_np is None:
+        _quant_hsl_np = np.stack(rgb_to_hsl_np(unpack_keys(np.arange(QUANT_BINS))), axis=1)
+    return _quant_hsl_np
+
+
+class Color:
+    """sRGB color (0-255) with lazily cached HSL, OKLab, luminance and hex forms"""
+
+    __slots__ = ('rgb', '_hsl', '_lab', '_lum', '_hex')
+    _interned = {}
+
+    def __init__(self, r, g, b):
+        self.rgb = (r, g, b)
+        self._hsl = self._lab = self._lum = self._hex = None
+
+    @classmethod
+    def of(cls, rgb):
+        """The shared Color for an (r, g, b) sequence (returned as-is if already a Color)"""
+        if isinstance(rgb, Color):
+            return rgb
+        rgb = tuple(rgb)
+        color = cls._interned.get(rgb)
+        if color is None:
+            if len(cls._interned) >= COLOR_CACHE_MAX:
+                cls._interned.clear()
+            color = cls._interned[rgb] = cls(*rgb)
+        return color
+
+    @classmethod
+    def from_hsl(cls, h, s, l):
+        return cls.of(hsl_to_rgb(h, s, l))
+
+    @property
+    def hsl(self):
+        if self._hsl is None:
+            r, g, b = self.rgb
+            self._hsl = quantized_hsl(r, g, b) if not (r | g | b) & 7 else rgb_to_hsl(r, g, b)
+        return self._hsl
+
+    @property
+    def hue(self):
+        return self.hsl[0]
+
+    @property
+    def lightness(self):
+        return self.hsl[2]
+
+    @property
+    def lab(self):
+        """OKLab (L, a, b); needs NumPy"""
+        if self._lab is None:
+            self._lab = tuple(srgb_to_oklab([self.rgb])[0].tolist())
+        return self._lab
+
+    @property
+    def luminance(self):
+        if self._lum is None:
+            self._lum = calculate_luminance(self.rgb)
+        return self._lum
+
+    @property
+    def hex(self):
+        if self._hex is None:
+            self._hex = rgb_to_hex(self.rgb)
+        return self._hex
+
+    @property
+    def hex_raw(self):
+        return self.hex[1:]
+
+    def with_hsl(self, h=None, s=None, l=None):
+        """Color with the given HSL components replaced"""
+        h0, s0, l0 = self.hsl
+        return Color.from_hsl(h0 if h is None else h, s0 if s is None else s,
+                              l0 if l is None else l)
+
+    def __iter__(self):
+        return iter(self.rgb)
 
-    # Return best attempt (maximum lightness adjustment)
-    return hsl_to_rgb(h, s, 0.85 if bg_lum < 0.5 else 0.15)
+    def __getitem__(self, index):
+        return self.rgb[index]
+
+    def __len__(self):
+        return 3
+
+    def __eq__(self, other):
+        if isinstance(other, Color):
+            return self.rgb == other.rgb
+        return self.rgb == other
+
+    def __hash__(self):
+        return hash(self.rgb)
+
+    def __repr__(self):
+        return f"Color{self.rgb}"
+
+
+def _luminance(rgb):
+    return rgb.luminance if isinstance(rgb, Color) else calculate_luminance(rgb)
 
 
 # =============================================================================
-# Color Extraction
+# Contrast Solver
 # =============================================================================
+#
+# For a fixed hue and saturation, luminance never decreases as HSL lightness
+# grows, so the smallest lightness change that reaches a target ratio can be
+# found by bisection instead of stepping through fixed lightness levels.
+# The search moves away from the background, toward whichever of white or
+# black contrasts with it more (lighter below CONTRAST_PIVOT luminance, darker
+# above), and tests the quantized RGB result, so a returned color always meets
+# the ratio whenever the ratio is reachable. One of the two ends reaches at
+# least 4.58:1 on any background, so the 3:1 and 4.5:1 targets always are;
+# mid-tone surfaces (interpolated schedule steps) depend on this.
+#
+# ensure_contrast_batch bisects all failing pairs of a batch at once with
+# NumPy. Its ~25 array passes cost about 2 ms whatever the batch size, which
+# the scalar loop only overtakes from about 64 pairs (bench/contrast.py).
+# A single theme's passes (4 accents, 20 text/terminal rules) therefore stay
+# scalar; a schedule solves every step in one batch of over 1000 pairs.
+
+CONTRAST_STEPS = 24  # bisection iterations; 2^-24 lightness is well below one RGB step
+CONTRAST_BATCH_MIN = 64  # measured crossover (bench/contrast.py), see below
+CONTRAST_PIVOT = (1.05 * 0.05) ** 0.5 - 0.05  # luminance where white and black tie (~0.179)
+
+
+def _meets_contrast(rgb, bg_lum, min_ratio, lighter):
+    """True if rgb reaches min_ratio on the far side of the background"""
+    lum = calculate_luminance(rgb)
+    if (lum >= bg_lum) if lighter else (lum <= bg_lum):
+        return (max(lum, bg_lum) + 0.05) / (min(lum, bg_lum) + 0.05) >= min_ratio
+    return False
+
+
+def ensure_contrast(fg_rgb, bg_rgb, min_ratio=4.5):
+    """Adjust foreground lightness by the smallest amount that reaches min_ratio"""
+    fg, bg = Color.of(fg_rgb), Color.of(bg_rgb)
+    if contrast_ratio(bg, fg) >= min_ratio:
+        return fg
+
+    h, s, l = fg.hsl
+    bg_lum = bg.luminance
+    lighter = bg_lum < CONTRAST_PIVOT
+    fail, good = l, (1.0 if lighter else 0.0)
+
+    if not _meets_contrast(hsl_to_rgb(h, s, good), bg_lum, min_ratio, lighter):
+        # Unreachable: return best attempt (maximum lightness adjustment)
+        return Color.from_hsl(h, s, 0.85 if lighter else 0.15)
+
+    for _ in range(CONTRAST_STEPS):
+        mid = (fail + good) / 2
+        if _meets_contrast(hsl_to_rgb(h, s, mid), bg_lum, min_ratio, lighter):
+            good = mid
+        else:
+            fail = mid
+    return Color.from_hsl(h, s, good)
 
-def extract_colors(image_path, num_colors=5):
+
+def hue_plan_np(h):
+    """Per-channel hue offsets and hue_to_rgb branch for hsl_to_rgb_np. They
+    depend on hue alone, so a lightness search computes them once."""
+    t = np.stack([h + 1/3, h, h - 1/3], axis=1)
+    t = np.where(t < 0, t + 1, t)
+    t = np.where(t > 1, t - 1, t)
+    return t, np.select([t < 1/6, t < 1/2, t < 2/3], [0, 1, 2], 3)
+
+
+def hsl_to_rgb_np(h, s, l, plan=None):
+    """Vectorized hsl_to_rgb over equal-length arrays; returns an (N, 3) int array.
+    Operation order mirrors hsl_to_rgb so results are bit-identical.
     """
-    Extract dominant colors from image using weighted scoring.
-    Score = saturation * sqrt(pixel_count) - prioritizes vibrant colors
+    t, branch = plan or hue_plan_np(h)
+    q = np.where(l < 0.5, l * (1 + s), l + s - l * s)[:, None]
+    p = 2 * l[:, None] - q
+    rgb = np.choose(branch, [p + (q - p) * 6 * t, q, p + (q - p) * (2/3 - t) * 6, p])
+    rgb = np.where((s == 0)[:, None], l[:, None], rgb)
+    return (rgb * 255).astype(np.int64)
+
+
+def luminance_np(rgb):
+    """Vectorized calculate_luminance for an (N, 3) array"""
+    return 0.2126 * (rgb[:, 0] / 255.0) + 0.7152 * (rgb[:, 1] / 255.0) + 0.0722 * (rgb[:, 2] / 255.0)
+
+
+def contrast_ratio_np(lum_a, lum_b):
+    """Vectorized WCAG contrast ratio from two luminance arrays"""
+    return (np.maximum(lum_a, lum_b) + 0.05) / (np.minimum(lum_a, lum_b) + 0.05)
+
+
+def ensure_contrast_batch(fgs, bgs, min_ratios):
+    """ensure_contrast for parallel lists of foregrounds, backgrounds and ratios.
+    With NumPy the failing pairs are bisected at once; results match ensure_contrast.
     """
-    img = Image.open(image_path)
-    img.thumbnail((300, 300))  # Resize for performance
-    img = img.convert('RGB')
+    if np is None or len(fgs) < CONTRAST_BATCH_MIN:
+        return [ensure_contrast(fg, bg, r) for fg, bg, r in zip(fgs, bgs, min_ratios)]
+
+    fg = np.array([tuple(c) for c in fgs], dtype=np.int64)
+    ratio = np.asarray(min_ratios, dtype=float)
+    bg_lum = luminance_np(np.array([tuple(c) for c in bgs], dtype=np.int64))
+    out = [Color.of(c) for c in fgs]
+    # Pairs that already pass are returned as given, as ensure_contrast does
+    todo = np.flatnonzero(contrast_ratio_np(luminance_np(fg), bg_lum) < ratio)
+    if not todo.size:
+        return out
+
+    ratio, bg_lum = ratio[todo], bg_lum[todo]
+    lighter = bg_lum < CONTRAST_PIVOT
+    h, s, l = rgb_to_hsl_np(fg[todo])
+    plan = hue_plan_np(h)
+
+    def meets(lightness):
+        lum = luminance_np(hsl_to_rgb_np(h, s, lightness, plan))
+        side = np.where(lighter, lum >= bg_lum, lum <= bg_lum)
+        return side & (contrast_ratio_np(lum, bg_lum) >= ratio)
+
+    fail, good = l, np.where(lighter, 1.0, 0.0)
+    reachable = meets(good)
+    for _ in range(CONTRAST_STEPS):
+        mid = (fail + good) / 2
+        ok = meets(mid)
+        good = np.where(ok, mid, good)
+        fail = np.where(ok, fail, mid)
+
+    solved = hsl_to_rgb_np(h, s, np.where(reachable, good, np.where(lighter, 0.85, 0.15)), plan)
+    for i, c in zip(todo.tolist(), solved.tolist()):
+        out[i] = Color.of(c)
+    return out
+
+
+# =============================================================================
+# Quantization & Scoring
+# =============================================================================
+
+SAMPLE_SIZE = 300
 
-    # Count pixel frequencies
-    color_counts = defaultdict(int)
+
+def load_image(image_path, sample_size=SAMPLE_SIZE, fast_decode=False, max_memory=None):
+    """Open image and downsample to fit in sample_size x sample_size.
+    fast_decode lets JPEG decode straight at reduced scale (DCT scaling via
+    draft) and lets other formats take a coarser integer reduce() before the
+    final resample. Faster on large images, at the cost of small palette drift.
+    Images whose decode would exceed max_memory bytes are read in bands
+    (see Tiled Extraction); the result is the same image.
+    """
+    with timings.stage('open'):
+        img = Image.open(image_path)
+    w, h = img.size
+    scale = sample_size / max(w, h)
+    draft_size = (math.ceil(w * scale), math.ceil(h * scale)) if fast_decode and scale < 1 \
+        else (2 * sample_size, 2 * sample_size)
+    if max_memory and tiled_image.decoded_bytes(img, draft_size) > max_memory:
+        with timings.stage('decode_thumbnail'):
+            thumb, = tiled_image.thumbnails(img, [(0, 0, w, h)], sample_size,
+                                            1.5 if fast_decode else 2.0, max_memory)
+        with timings.stage('convert'):
+            return thumb.convert('RGB')
+
+    # Pillow decodes lazily inside thumbnail() (JPEGs at DCT-reduced scale),
+    # so decode and resample are one stage
+    if not fast_decode:
+        with timings.stage('decode_thumbnail'):
+            img.thumbnail((sample_size, sample_size))  # Resize for performance
+        with timings.stage('convert'):
+            return img.convert('RGB')
+
+    with timings.stage('decode_thumbnail'):
+        if scale < 1:
+            # JPEG only: decoder skips straight to the smallest 1/2, 1/4, 1/8
+            # scale that still covers the target; returns None for other formats
+            img.draft('RGB', (math.ceil(w * scale), math.ceil(h * scale)))
+        img.thumbnail((sample_size, sample_size), reducing_gap=1.5)
+    with timings.stage('convert'):
+        return img.convert('RGB')
+
+
+def count_colors(img, color_counts=None):
+    """Count quantized pixel frequencies (pure Python).
+    Returns dict of quantized color -> count, in first-seen order.
+    Pass color_counts to keep accumulating into an existing dict.
+    """
+    if color_counts is None:
+        color_counts = defaultdict(int)
     for pixel in img.getdata():
         # Quantize to reduce unique colors
         quantized = (pixel[0] // 8 * 8, pixel[1] // 8 * 8, pixel[2] // 8 * 8)
         color_counts[quantized] += 1
+    return color_counts
+
 
-    # Score colors by saturation * sqrt(count)
+def score_colors(color_counts):
+    """Score colors by saturation * sqrt(count), sorted descending (pure Python)"""
     scored_colors = []
     for color, count in color_counts.items():
-        h, s, l = rgb_to_hsl(*color)
+        h, s, l = quantized_hsl(*color)
         # Filter: reasonable saturation and luminance
         if s > 0.15 and 0.10 < l < 0.90:
             score = s * math.sqrt(count)
@@ -181,7 +473,11 @@ def extract_colors(image_path, num_colors=5):
 
     # Sort by score descending
     scored_colors.sort(reverse=True, key=lambda x: x[0])
+    return scored_colors
 
+
+def select_diverse(scored_colors, num_colors):
+    """Pick up to num_colors from scored list, preferring distinct hues"""
     # Extract diverse colors (different hues)
     selected = []
     for score, color, count, h, s, l in scored_colors:
@@ -205,12 +501,652 @@ def extract_colors(image_path, num_colors=5):
                 if len(selected) >= num_colors:
                     break
 
-    return [item[1] for item in selected]
+    return [Color.of(item[1]) for item in selected]
+
+
+# =============================================================================
+# Vectorized Extraction (NumPy)
+# =============================================================================
+#
+# Quantized colors are packed into a 15-bit key (5 bits per channel), so the
+# whole histogram is a single bincount over 32768 bins. Ties in score are
+# broken by first-seen pixel order, matching the dict insertion order of the
+# pure-Python path, so both engines select identical palettes.
+
+HIST_BINS = 1 << 15
+
+
+def pack_keys(pixels):
+    """Pack an (..., 3) uint8 array into 15-bit quantized color keys"""
+    p = pixels.reshape(-1, 3).astype(np.uint16)
+    return ((p[:, 0] >> 3) << 10) | ((p[:, 1] >> 3) << 5) | (p[:, 2] >> 3)
+
+
+def unpack_keys(keys):
+    """Unpack 15-bit keys into an (N, 3) array of quantized RGB (0-248)"""
+    keys = keys.astype(np.int64)
+    return np.stack([(keys >> 10) & 31, (keys >> 5) & 31, keys & 31], axis=1) << 3
+
+
+def count_colors_np(img):
+    """Histogram of quantized colors.
+    Returns (keys, counts, first_seen) for every occupied bin, where
+    first_seen is the index of the first pixel that landed in the bin.
+    """
+    keys = pack_keys(np.asarray(img, dtype=np.uint8))
+    present, first_seen = np.unique(keys, return_index=True)
+    counts = np.bincount(keys, minlength=HIST_BINS)[present]
+    return present, counts, first_seen
+
+
+def rgb_to_hsl_np(rgb):
+    """Vectorized rgb_to_hsl for an (N, 3) array; returns h, s, l arrays.
+    Operation order mirrors rgb_to_hsl so results are bit-identical.
+    """
+    rgb = rgb / 255.0
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    max_val = rgb.max(axis=1)
+    min_val = rgb.min(axis=1)
+    diff = max_val - min_val
+    l = (max_val + min_val) / 2.0
+
+    chroma = diff != 0
+    safe = np.where(chroma, diff, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(l > 0.5, diff / (2.0 - max_val - min_val), diff / (max_val + min_val))
+    s = np.where(chroma, s, 0.0)
+
+    h = np.where(
+        max_val == r, (g - b) / safe + np.where(g < b, 6, 0),
+        np.where(max_val == g, (b - r) / safe + 2, (r - g) / safe + 4),
+    )
+    h = np.where(chroma, h / 6.0, 0.0)
+    return h, s, l
+
+
+def score_colors_np(keys, counts, first_seen):
+    """Vectorized score_colors; returns the same sorted list of tuples"""
+    colors = unpack_keys(keys)
+    h, s, l = quantized_hsl_table()[keys].T
+
+    # Filter: reasonable saturation and luminance
+    keep = (s > 0.15) & (l > 0.10) & (l < 0.90)
+    colors, counts, first_seen = colors[keep], counts[keep], first_seen[keep]
+    h, s, l = h[keep], s[keep], l[keep]
+    score = s * np.sqrt(counts)
+
+    # Score descending, ties in first-seen order (stable like list.sort)
+    order = np.lexsort((first_seen, -score))
+
+    return list(zip(
+        score[order].tolist(),
+        map(tuple, colors[order].tolist()),
+        counts[order].tolist(),
+        h[order].tolist(),
+        s[order].tolist(),
+        l[order].tolist(),
+    ))
+
+
+# =============================================================================
+# Histograms
+# =============================================================================
+#
+# A histogram is (keys, counts, order): 15-bit quantized color keys, their
+# pixel counts, and a first-seen rank used to break score ties. NumPy arrays
+# when available, array.array otherwise; both serialize to the same bytes.
+
+HIST_MAGIC = b'TXH1'
+
+
+def compute_histogram(img):
+    """Histogram of quantized colors for a loaded image"""
+    with timings.stage('histogram'):
+        if np is not None:
+            return count_colors_np(img)
+        return histogram_from_counts(count_colors(img))
+
+
+def histogram_from_counts(color_counts):
+    """Pure-Python histogram from a count_colors dict (insertion order is the rank)"""
+    keys = array('H', ((r >> 3) << 10 | (g >> 3) << 5 | (b >> 3) for r, g, b in color_counts))
+    return keys, array('I', color_counts.values()), array('I', range(len(color_counts)))
+
+
+def score_histogram(hist):
+    """Score a histogram; same output as score_colors(count_colors(img))"""
+    keys, counts, order = hist
+    if np is not None:
+        return score_colors_np(np.asarray(keys), np.asarray(counts), np.asarray(order))
+    ranked = sorted(zip(order, keys, counts))
+    return score_colors({
+        ((k >> 10) << 3, ((k >> 5) & 31) << 3, (k & 31) << 3): c for _, k, c in ranked
+    })
+
+
+def histogram_to_bytes(hist):
+    """Serialize histogram as magic, entry count, then keys/counts/order arrays"""
+    keys, counts, order = hist
+    if np is not None:
+        parts = [np.asarray(keys, dtype=np.uint16), np.asarray(counts, dtype=np.uint32),
+                 np.asarray(order, dtype=np.uint32)]
+    else:
+        parts = [array('H', keys), array('I', counts), array('I', order)]
+    return HIST_MAGIC + struct.pack('<I', len(keys)) + b''.join(p.tobytes() for p in parts)
+
+
+def histogram_from_bytes(data):
+    """Inverse of histogram_to_bytes; returns None on a malformed buffer"""
+    if data[:4] != HIST_MAGIC:
+        return None
+    n = struct.unpack('<I', data[4:8])[0]
+    if len(data) != 8 + n * 10:
+        return None
+    spans = [(8, 8 + 2 * n, 'H'), (8 + 2 * n, 8 + 6 * n, 'I'), (8 + 6 * n, 8 + 10 * n, 'I')]
+    if np is not None:
+        return tuple(np.frombuffer(data[lo:hi], dtype=np.uint16 if t == 'H' else np.uint32)
+                     for lo, hi, t in spans)
+    parts = []
+    for lo, hi, t in spans:
+        part = array(t)
+        part.frombytes(data[lo:hi])
+        parts.append(part)
+    return tuple(parts)
+
+
+# =============================================================================
+# Animated Images
+# =============================================================================
+#
+# Multi-frame files (animated GIF/WebP/APNG) are streamed with ImageSequence:
+# every stride-th frame is downsampled straight from the decoder's current
+# frame and added to one running histogram, so only a single decoded frame is
+# alive at a time and the per-frame cost is paid only for sampled frames.
+# First-seen ranks continue across frames (frame offset + pixel index), so a
+# one-frame accumulation is identical to compute_histogram.
+
+FRAME_SAMPLES = 24  # frames sampled across an animation when no stride is given
+ANIMATED_EXTENSIONS = {'.gif', '.webp', '.png', '.apng'}
+
+
+class HistogramAccumulator:
+    """Running quantized-color histogram over several images"""
+
+    def __init__(self):
+        self.pixels = 0
+        if np is not None:
+            self.counts = np.zeros(HIST_BINS, dtype=np.int64)
+            self.first = np.full(HIST_BINS, np.iinfo(np.int64).max, dtype=np.int64)
+        else:
+            self.color_counts = defaultdict(int)
+
+    def add(self, img):
+        if np is not None:
+            keys = pack_keys(np.asarray(img, dtype=np.uint8))
+            present, first = np.unique(keys, return_index=True)
+            self.counts += np.bincount(keys, minlength=HIST_BINS)
+            self.first[present] = np.minimum(self.first[present], first + self.pixels)
+        else:
+            count_colors(img, self.color_counts)
+        self.pixels += img.width * img.height
+
+    def histogram(self):
+        if np is None:
+            return histogram_from_counts(self.color_counts)
+        present = np.flatnonzero(self.counts)
+        return present.astype(np.uint16), self.counts[present], self.first[present]
+
+
+def open_animation(image_path):
+    """The opened image if it has more than one frame, else None"""
+    if Path(image_path).suffix.lower() not in ANIMATED_EXTENSIONS:
+        return None
+    img = Image.open(image_path)
+    if getattr(img, 'n_frames', 1) > 1:
+        return img
+    img.close()
+    return None
+
+
+def frame_stride(n_frames, stride=None):
+    """Explicit stride, or one that samples about FRAME_SAMPLES frames"""
+    return stride or max(1, math.ceil(n_frames / FRAME_SAMPLES))
+
+
+def sample_frame(frame, sample_size=SAMPLE_SIZE, fast_decode=False):
+    """Downsampled RGB image of the current frame (the full frame is not copied)"""
+    w, h = frame.size
+    scale = sample_size / max(w, h)
+    if scale < 1:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        frame = frame.resize(size, Image.Resampling.BICUBIC,
+                             reducing_gap=1.5 if fast_decode else 2.0)
+    return frame.convert('RGB')
+
+
+def stream_histograms(img, sample_size=SAMPLE_SIZE, fast_decode=False, stride=None,
+                      segments=0):
+    """Histogram of every stride-th frame of an open image, plus one per
+    contiguous segment. Returns (histogram, [(first frame, last frame,
+    histogram), ...], info) where info is {'frames', 'stride', 'sampled'}.
+    """
+    n_frames = getattr(img, 'n_frames', 1)
+    stride = frame_stride(n_frames, stride)
+    sampled = math.ceil(n_frames / stride)
+    segments = min(segments, sampled)
+    total = HistogramAccumulator()
+    parts = [[None, None, HistogramAccumulator()] for _ in range(segments)]
+    for index, frame in enumerate(ImageSequence.Iterator(img)):
+        if index % stride:
+            continue
+        with timings.stage('frames'):
+            small = sample_frame(frame, sample_size, fast_decode)
+        with timings.stage('histogram'):
+            total.add(small)
+            if parts:
+                part = parts[index // stride * segments // sampled]
+                part[0] = index if part[0] is None else part[0]
+                part[1] = index
+                part[2].add(small)
+    info = {'frames': n_frames, 'stride': stride, 'sampled': sampled}
+    return total.histogram(), [(lo, hi, acc.histogram()) for lo, hi, acc in parts], info
+
+
+def image_histogram(image_path, sample_size=SAMPLE_SIZE, fast_decode=False, stride=None,
+                    max_memory=None):
+    """Histogram for any image: all sampled frames of an animation, else the still"""
+    with timings.stage('open'):
+        animation = open_animation(image_path)
+    if animation is not None:
+        with animation:
+            return stream_histograms(animation, sample_size, fast_decode, stride)[0]
+    return compute_histogram(load_image(image_path, sample_size, fast_decode, max_memory))
+
+
+# =============================================================================
+# Tiled Extraction
+# =============================================================================
+#
+# With a memory ceiling (--max-memory), a still image whose full decode would
+# exceed it is read a band of rows at a time (tiled_image.py) instead of being
+# handed whole to thumbnail(). The downsampled image is pixel-identical, so
+# histograms, scores and the cache are unaffected. Regions (one monitor of a
+# multi-monitor span, the strip under the bar) get palettes of their own: each
+# is cropped at full resolution and downsampled as if it were a wallpaper,
+# in the same banded pass.
+
+def parse_region(spec):
+    """--region value -> [(name, (x, y, w, h))]. NAME=X,Y,W,H takes pixels or
+    percentages (kept as fractions); COLSxROWS splits the image into a grid
+    named monitor-1, monitor-2, ... in reading order."""
+    cols, sep, rows = spec.partition('x')
+    if sep and cols.isdigit() and rows.isdigit() and int(cols) and int(rows):
+        cols, rows = int(cols), int(rows)
+        return [(f"monitor-{r * cols + c + 1}", (c / cols, r / rows, 1 / cols, 1 / rows))
+                for r in range(rows) for c in range(cols)]
+    name, sep, coords = spec.partition('=')
+    values = coords.split(',')
+    if not sep or not name or len(values) != 4:
+        raise ValueError(f"bad region {spec!r}: expected NAME=X,Y,W,H or COLSxROWS")
+    try:
+        return [(name, tuple(float(v[:-1]) / 100 if v.endswith('%') else int(v)
+                             for v in values))]
+    except ValueError:
+        raise ValueError(f"bad region {spec!r}: coordinates are pixels or percentages") from None
+
+
+def region_box(name, coords, size):
+    """Pixel box (x0, y0, x1, y1) of a parsed region, clipped to an image of size"""
+    def span(start, length, dim):
+        lo = round(start * dim) if isinstance(start, float) else start
+        if isinstance(length, int):
+            hi = lo + length
+        elif isinstance(start, float):
+            hi = round((start + length) * dim)  # grid cells share their edges exactly
+        else:
+            hi = lo + round(length * dim)
+        return max(0, min(lo, dim)), max(0, min(hi, dim))
+
+    (x0, x1), (y0, y1) = span(coords[0], coords[2], size[0]), span(coords[1], coords[3], size[1])
+    if x0 >= x1 or y0 >= y1:
+        raise ValueError(f"region {name} is outside the {size[0]}x{size[1]} image")
+    return x0, y0, x1, y1
+
+
+def load_regions(image_path, regions, sample_size=SAMPLE_SIZE, fast_decode=False,
+                 max_memory=None):
+    """load_image() plus a downsampled crop per (name, coords) region.
+    Returns (image, [(name, box, image), ...], image size). Over max_memory
+    one banded pass yields all of them; otherwise regions are cropped from a
+    full-resolution decode.
+    """
+    with timings.stage('open'):
+        img = Image.open(image_path)
+    if getattr(img, 'n_frames', 1) > 1:
+        raise ValueError("regions need a still image")
+    size = img.size
+    boxes = [(name, region_box(name, coords, size)) for name, coords in regions]
+    reducing_gap = 1.5 if fast_decode else 2.0
+
+    if max_memory and tiled_image.decoded_bytes(img) > max_memory:
+        with timings.stage('decode_thumbnail'):
+            thumbs = tiled_image.thumbnails(img, [(0, 0) + size] + [box for _, box in boxes],
+                                            sample_size, reducing_gap, max_memory)
+        with timings.stage('convert'):
+            images = [thumb.convert('RGB') for thumb in thumbs]
+        return images[0], [(name, box, im) for (name, box), im in zip(boxes, images[1:])], size
+
+    full = load_image(image_path, sample_size, fast_decode)
+    parts = []
+    with timings.stage('regions'):
+        for name, box in boxes:
+            crop = img.crop(box)
+            crop.thumbnail((sample_size, sample_size), reducing_gap=reducing_gap)
+            parts.append((name, box, crop.convert('RGB')))
+    return full, parts, size
+
+
+# =============================================================================
+# Extraction Cache
+# =============================================================================
+#
+# Layout: <root>/<entry>/histogram-<variant>.bin + accents-<params>.json, where <entry>
+# hashes the image content digest with the generator version. A per-path stamp
+# (size + mtime) short-circuits re-hashing unchanged files. Entries are evicted
+# least-recently-used once the cache exceeds its size bound.
+
+GENERATOR = 'themix-python-v1'
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', '~/.cache')).expanduser() / 'themix'
+CACHE_MAX_BYTES = int(os.environ.get('THEMIX_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+
+class ExtractionCache:
+    """Persistent cache of histograms and selected accents, keyed on image content"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root) / 'extract'
+        self.stamps = Path(root) / 'stamps'
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def entry_dir(self, image_path):
+        """Cache entry directory for an image (content-addressed)"""
+        image_path = Path(image_path)
+        st = image_path.stat()
+        stamp_file = self.stamps / hashlib.sha1(str(image_path).encode()).hexdigest()
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+
+        # Fast path: size + mtime unchanged since we last hashed this path
+        digest = None
+        try:
+            saved_stamp, saved_digest = stamp_file.read_text().split()
+            if saved_stamp == stamp:
+                digest = saved_digest
+        except (OSError, ValueError):
+            pass
+
+        if digest is None:
+            h = hashlib.sha256()
+            with open(image_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            _atomic_write(stamp_file, f"{stamp} {digest}".encode())
+
+        return self.root / hashlib.sha1(f"{digest}:{GENERATOR}".encode()).hexdigest()
+
+    def read(self, entry, name):
+        """Return cached bytes or None; refreshes the entry's LRU time on hit"""
+        try:
+            data = (entry / name).read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return data
+
+    def write(self, entry, name, data):
+        """Store bytes under entry, then enforce the size bound"""
+        _atomic_write(entry / name, data)
+        os.utime(entry)
+        self.evict()
+
+    def entries(self):
+        """List (mtime, bytes, path) for every entry, oldest first"""
+        result = []
+        try:
+            dirs = list(os.scandir(self.root))
+        except OSError:
+            return result
+        for d in dirs:
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(d.path))
+                result.append((d.stat().st_mtime, size, Path(d.path)))
+            except OSError:
+                continue  # Evicted concurrently
+        result.sort()
+        return result
+
+    def evict(self):
+        """Drop least-recently-used entries until under max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        """Summary of on-disk usage and this run's hit/miss counts"""
+        entries = self.entries()
+        return {
+            'path': str(self.root),
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def _atomic_write(path, data):
+    """Write bytes via temp file + rename so concurrent readers never see partial data"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+# =============================================================================
+# Perceptual Clustering (OKLab k-means)
+# =============================================================================
+#
+# Weighted k-means over the quantized histogram: each occupied bin is a point
+# in OKLab weighted by its pixel count, which is equivalent to clustering the
+# quantized pixels themselves at a fraction of the cost. Seeding is k-means++
+# with a fixed RNG seed so palettes are reproducible.
+
+KMEANS_MAX_ITER = 25
+KMEANS_TOL = 1e-4
+
+
+def srgb_to_oklab(rgb):
+    """(N, 3) sRGB (0-255) -> (N, 3) OKLab"""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    lin = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    lms = lin @ np.array([
+        [0.4122214708, 0.2119034982, 0.0883024619],
+        [0.5363325363, 0.6806995451, 0.2817188376],
+        [0.0514459929, 0.1073969566, 0.6299787005],
+    ])
+    return np.cbrt(lms) @ np.array([
+        [0.2104542553, 1.9779984951, 0.0259040371],
+        [0.7936177850, -2.4285922050, 0.7827717662],
+        [-0.0040720468, 0.4505937099, -0.8086757660],
+    ])
+
+
+def oklab_to_srgb(lab):
+    """(N, 3) OKLab -> (N, 3) sRGB floats (0-255, clipped)"""
+    lms = np.asarray(lab, dtype=np.float64) @ np.array([
+        [1.0, 1.0, 1.0],
+        [0.3963377774, -0.1055613458, -0.0894841775],
+        [0.2158037573, -0.0638541728, -1.2914855480],
+    ])
+    lin = (lms ** 3) @ np.array([
+        [4.0767416621, -1.2684380046, -0.0041960863],
+        [-3.3077115913, 2.6097574011, -0.7034186147],
+        [0.2309699292, -0.3413193965, 1.7076147010],
+    ])
+    lin = np.clip(lin, 0.0, 1.0)
+    c = np.where(lin <= 0.0031308, lin * 12.92, 1.055 * lin ** (1 / 2.4) - 0.055)
+    return np.clip(c * 255.0, 0.0, 255.0)
+
+
+def kmeans(points, weights, k, max_iter=KMEANS_MAX_ITER, tol=KMEANS_TOL, seed=0):
+    """Weighted k-means with k-means++ seeding.
+    Stops when no center moves more than tol, or after max_iter rounds.
+    Returns (centers, cluster weights, iterations).
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.asarray(weights, dtype=np.float64)
+    k = min(k, len(points))
+
+    # k-means++: next seed drawn proportional to weight * squared distance
+    centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+    d2 = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        p = weights * d2
+        if p.sum() <= 0:
+            break
+        centers.append(points[rng.choice(len(points), p=p / p.sum())])
+        d2 = np.minimum(d2, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+    k = len(centers)
+
+    sq_norms = (points ** 2).sum(axis=1)[:, None]
+    for iteration in range(1, max_iter + 1):
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2 as one (N, k) matrix product
+        dist = sq_norms - 2.0 * (points @ centers.T) + (centers ** 2).sum(axis=1)[None, :]
+        labels = dist.argmin(axis=1)
+        mass = np.bincount(labels, weights, minlength=k)
+        sums = np.stack([np.bincount(labels, weights * points[:, j], minlength=k)
+                         for j in range(points.shape[1])], axis=1)
+        empty = mass == 0
+        new_centers = np.where(empty[:, None], centers, sums / np.where(empty, 1, mass)[:, None])
+        shift = np.abs(new_centers - centers).max()
+        centers = new_centers
+        if shift < tol:
+            break
+
+    return centers, mass, iteration
+
+
+# =============================================================================
+# Extractors
+# =============================================================================
+#
+# An extractor maps a histogram to an ordered list of accent colors:
+#     extractor(hist, num_colors) -> [(r, g, b), ...]
+# Register new ones in EXTRACTORS; --algorithm selects by name.
+
+def extract_greedy(hist, num_colors):
+    """Saturation * sqrt(count) scoring with a hue-distance greedy pick"""
+    with timings.stage('score'):
+        scored = score_histogram(hist)
+    with timings.stage('select'):
+        return select_diverse(scored, num_colors)
+
+
+def extract_kmeans(hist, num_colors):
+    """Cluster in OKLab, then rank clusters like the greedy scorer
+    (saturation * sqrt(weight), same saturation/lightness filter)."""
+    keys, counts, _ = (np.asarray(a) for a in hist)
+    with timings.stage('kmeans'):
+        points = srgb_to_oklab(unpack_keys(keys))
+        centers, mass, _ = kmeans(points, counts, max(3 * num_colors, 8))
+
+    keep = mass > 0
+    colors = np.rint(oklab_to_srgb(centers[keep])).astype(np.int64)
+    mass = mass[keep]
+    h, s, l = rgb_to_hsl_np(colors)
+
+    scored = [(float(si * math.sqrt(m)), tuple(c), float(m), float(hi), float(si), float(li))
+              for c, m, hi, si, li in zip(colors.tolist(), mass, h, s, l)]
+    vivid = [item for item in scored if item[4] > 0.15 and 0.10 < item[5] < 0.90]
+    # Fully desaturated images: fall back to the heaviest clusters
+    pool = vivid or sorted(scored, key=lambda x: -x[2])
+    if vivid:
+        pool.sort(reverse=True, key=lambda x: x[0])
+    return select_diverse(pool, num_colors)
+
+
+EXTRACTORS = {
+    'greedy': extract_greedy,
+    'kmeans': extract_kmeans,
+}
+
+
+# =============================================================================
+# Color Extraction
+# =============================================================================
+
+def extract_colors(image_path, num_colors=5, cache=None, sample_size=SAMPLE_SIZE,
+                   fast_decode=False, algorithm='greedy', frame_stride=None, max_memory=None):
+    """
+    Extract dominant colors from image using the named extractor.
+    Default (greedy): Score = saturation * sqrt(pixel_count) - prioritizes vibrant colors
+    Uses the NumPy engine when available, pure Python otherwise.
+    Animations contribute every frame_stride-th frame (see Animated Images).
+    With a cache, repeat runs reuse stored accents or histogram and skip decoding.
+    max_memory caps decode memory (see Tiled Extraction); it does not change
+    the histogram, so it is not part of the cache key.
+    """
+    extractor = EXTRACTORS[algorithm]
+    if cache is None:
+        return extractor(image_histogram(image_path, sample_size, fast_decode, frame_stride,
+                                         max_memory), num_colors)
+
+    with timings.stage('cache'):
+        entry = cache.entry_dir(image_path)
+    variant = f"s{sample_size}{'f' if fast_decode else ''}"
+    if Path(image_path).suffix.lower() in ANIMATED_EXTENSIONS:
+        variant += f"-k{frame_stride}" if frame_stride else f"-n{FRAME_SAMPLES}"
+    hist_name = f"histogram-{variant}.bin"
+    accents_name = f"accents-{algorithm}-n{num_colors}-{variant}.json"
+
+    with timings.stage('cache'):
+        data = cache.read(entry, accents_name)
+    if data is not None:
+        cache.hits += 1
+        return [Color.of(c) for c in json.loads(data)]
+
+    hist = None
+    with timings.stage('cache'):
+        data = cache.read(entry, hist_name)
+        if data is not None:
+            hist = histogram_from_bytes(data)
+    if hist is None:
+        cache.misses += 1
+        hist = image_histogram(image_path, sample_size, fast_decode, frame_stride, max_memory)
+        with timings.stage('cache'):
+            cache.write(entry, hist_name, histogram_to_bytes(hist))
+    else:
+        cache.hits += 1
+
+    accents = extractor(hist, num_colors)
+    with timings.stage('cache'):
+        cache.write(entry, accents_name, json.dumps([c.rgb for c in accents]).encode())
+    return accents
 
 
 def determine_theme_mode(colors):
     """Determine if wallpaper is light or dark overall"""
-    total_lightness = sum(rgb_to_hsl(*c)[2] for c in colors) / len(colors)
+    total_lightness = sum(Color.of(c).lightness for c in colors) / len(colors)
     return 'light' if total_lightness > 0.5 else 'dark'
 
 
@@ -220,47 +1156,47 @@ def determine_theme_mode(colors):
 
 def generate_surfaces(accent_color, mode='dark'):
     """Generate surface colors from accent"""
-    h, s, _ = rgb_to_hsl(*accent_color)
+    h, s, _ = Color.of(accent_color).hsl
 
     if mode == 'dark':
         # Dark mode: very dark surfaces with hint of accent hue
         return {
-            'primary': hsl_to_rgb(h, s * 0.15, 0.07),
-            'secondary': hsl_to_rgb(h, s * 0.18, 0.10),
-            'tertiary': hsl_to_rgb(h, s * 0.20, 0.14),
-            'quaternary': hsl_to_rgb(h, s * 0.12, 0.22),
-            'quinary': hsl_to_rgb(h, s * 0.10, 0.28),
+            'primary': Color.from_hsl(h, s * 0.15, 0.07),
+            'secondary': Color.from_hsl(h, s * 0.18, 0.10),
+            'tertiary': Color.from_hsl(h, s * 0.20, 0.14),
+            'quaternary': Color.from_hsl(h, s * 0.12, 0.22),
+            'quinary': Color.from_hsl(h, s * 0.10, 0.28),
         }
     else:
         # Light mode
         return {
-            'primary': hsl_to_rgb(h, s * 0.10, 0.96),
-            'secondary': hsl_to_rgb(h, s * 0.12, 0.92),
-            'tertiary': hsl_to_rgb(h, s * 0.15, 0.88),
-            'quaternary': hsl_to_rgb(h, s * 0.08, 0.82),
-            'quinary': hsl_to_rgb(h, s * 0.06, 0.76),
+            'primary': Color.from_hsl(h, s * 0.10, 0.96),
+            'secondary': Color.from_hsl(h, s * 0.12, 0.92),
+            'tertiary': Color.from_hsl(h, s * 0.15, 0.88),
+            'quaternary': Color.from_hsl(h, s * 0.08, 0.82),
+            'quinary': Color.from_hsl(h, s * 0.06, 0.76),
         }
 
 
 def generate_text_colors(surface_primary, mode='dark'):
     """Generate text colors with good contrast against surface"""
-    h, s, _ = rgb_to_hsl(*surface_primary)
+    h, s, _ = Color.of(surface_primary).hsl
 
     if mode == 'dark':
         return {
-            'primary': hsl_to_rgb(h, s * 0.20, 0.92),
-            'secondary': hsl_to_rgb(h, s * 0.15, 0.82),
-            'tertiary': hsl_to_rgb(h, s * 0.10, 0.72),
-            'quaternary': hsl_to_rgb(h, s * 0.08, 0.58),
-            'quinary': hsl_to_rgb(h, s * 0.05, 0.48),
+            'primary': Color.from_hsl(h, s * 0.20, 0.92),
+            'secondary': Color.from_hsl(h, s * 0.15, 0.82),
+            'tertiary': Color.from_hsl(h, s * 0.10, 0.72),
+            'quaternary': Color.from_hsl(h, s * 0.08, 0.58),
+            'quinary': Color.from_hsl(h, s * 0.05, 0.48),
         }
     else:
         return {
-            'primary': hsl_to_rgb(h, s * 0.20, 0.10),
-            'secondary': hsl_to_rgb(h, s * 0.15, 0.25),
-            'tertiary': hsl_to_rgb(h, s * 0.10, 0.40),
-            'quaternary': hsl_to_rgb(h, s * 0.08, 0.55),
-            'quinary': hsl_to_rgb(h, s * 0.05, 0.65),
+            'primary': Color.from_hsl(h, s * 0.20, 0.10),
+            'secondary': Color.from_hsl(h, s * 0.15, 0.25),
+            'tertiary': Color.from_hsl(h, s * 0.10, 0.40),
+            'quaternary': Color.from_hsl(h, s * 0.08, 0.55),
+            'quinary': Color.from_hsl(h, s * 0.05, 0.65),
         }
 
 
@@ -276,7 +1212,7 @@ def semantic_color(base_hue, theme_hue, tint, saturation, lightness):
     blended = base_hue + hue_diff * tint
     if blended < 0: blended += 1.0
     elif blended >= 1.0: blended -= 1.0
-    return hsl_to_rgb(blended, saturation, lightness)
+    return Color.from_hsl(blended, saturation, lightness)
 
 
 def generate_terminal_colors(accents, surfaces, texts, mode='dark'):
@@ -286,10 +1222,10 @@ def generate_terminal_colors(accents, surfaces, texts, mode='dark'):
     while len(accents) < 4:
         accents.append(accents[-1])
 
-    hue1 = rgb_to_hsl(*accents[0])[0]  # primary accent
-    hue2 = rgb_to_hsl(*accents[1])[0]  # secondary accent
-    hue3 = rgb_to_hsl(*accents[2])[0]  # tertiary accent
-    hue4 = rgb_to_hsl(*accents[3])[0]  # quaternary accent
+    hue1 = Color.of(accents[0]).hue  # primary accent
+    hue2 = Color.of(accents[1]).hue  # secondary accent
+    hue3 = Color.of(accents[2]).hue  # tertiary accent
+    hue4 = Color.of(accents[3]).hue  # quaternary accent
     tint = 0.35  # Warm toward theme but keep ANSI hue identity
 
     # Sort accent hues by proximity to each ANSI base hue.
@@ -328,27 +1264,81 @@ def generate_terminal_colors(accents, surfaces, texts, mode='dark'):
     }
 
 
+# Minimum contrast against surface.primary for each foreground role (None:
+# report only, for dim text that is meant to recede). Terminal colors that
+# reuse a text color share its target so the two stay identical.
+CONTRAST_RULES = [
+    ('text', 'primary', 4.5),
+    ('text', 'secondary', 4.5),
+    ('text', 'tertiary', 3.0),
+    ('text', 'quaternary', None),
+    ('text', 'quinary', None),
+    *(('terminal', f'color{i}', 4.5) for i in (1, 2, 3, 4, 5, 6, 9, 10, 11, 12, 13, 14)),
+    ('terminal', 'color7', 3.0),
+    ('terminal', 'color8', 3.0),
+    ('terminal', 'color15', 4.5),
+]
+
+
+def validate_contrast(accents, surfaces, texts, terminal):
+    """Enforce CONTRAST_RULES for all text and terminal roles in one batched solve.
+    Returns (texts, terminal, report); report rows are
+    (role, against, ratio before, ratio after, minimum or None if report-only).
+    """
+    groups = {'text': dict(texts), 'terminal': dict(terminal)}
+    bg = surfaces['primary']
+    fixed = ensure_contrast_batch([groups[g][k] for g, k, _ in CONTRAST_RULES],
+                                  [bg] * len(CONTRAST_RULES),
+                                  [r or 1.0 for _, _, r in CONTRAST_RULES])
+
+    report = []
+    for (group, key, min_ratio), rgb in zip(CONTRAST_RULES, fixed):
+        before = contrast_ratio(bg, groups[group][key])
+        groups[group][key] = rgb
+        report.append((f'{group}.{key}', 'surface.primary', before,
+                       contrast_ratio(bg, rgb), min_ratio))
+
+    # Accents were solved before terminal generation; semantic.active_fg is the
+    # surface itself, so these pairs are reported but not adjusted
+    names = ['primary', 'secondary', 'tertiary', 'quaternary']
+    for name, accent in zip(names, accents):
+        ratio = contrast_ratio(bg, accent)
+        report.append((f'accent.{name}', 'surface.primary', ratio, ratio, 4.5))
+    ratio = contrast_ratio(accents[0], bg)
+    report.append(('semantic.active_fg', 'semantic.active', ratio, ratio, None))
+
+    return groups['text'], groups['terminal'], report
+
+
+def print_contrast_report(report):
+    for role, against, before, after, min_ratio in report:
+        status = '-' if min_ratio is None else ('ok' if after >= min_ratio else 'LOW')
+        target = f'{min_ratio:.1f}' if min_ratio else '-'
+        change = f'{before:5.2f} -> ' if after != before else ' ' * 9
+        print(f"  {role:<20} on {against:<16} {change}{after:5.2f}  (min {target}) {status}")
+
+
 def generate_oomox_colors(surfaces, texts, accents, image_name):
     """Generate oomox color scheme for GTK theme generation"""
     return {
         'name': image_name,
-        'bg': rgb_to_hex_raw(surfaces['primary']),
-        'fg': rgb_to_hex_raw(texts['primary']),
-        'menu_bg': rgb_to_hex_raw(surfaces['primary']),
-        'menu_fg': rgb_to_hex_raw(texts['primary']),
-        'sel_bg': rgb_to_hex_raw(accents[0]),
-        'sel_fg': rgb_to_hex_raw(surfaces['primary']),
-        'txt_bg': rgb_to_hex_raw(surfaces['primary']),
-        'txt_fg': rgb_to_hex_raw(texts['primary']),
-        'btn_bg': rgb_to_hex_raw(accents[1] if len(accents) > 1 else accents[0]),
-        'btn_fg': rgb_to_hex_raw(accents[0]),
-        'hdr_btn_bg': rgb_to_hex_raw(surfaces['secondary']),
-        'hdr_btn_fg': rgb_to_hex_raw(texts['primary']),
-        'wm_border_focus': rgb_to_hex_raw(accents[1] if len(accents) > 1 else accents[0]),
-        'wm_border_unfocus': rgb_to_hex_raw(surfaces['secondary']),
-        'icons_light_folder': rgb_to_hex_raw(accents[0]),
-        'icons_medium': rgb_to_hex_raw(texts['primary']),
-        'icons_dark': rgb_to_hex_raw(surfaces['primary']),
+        'bg': surfaces['primary'].hex_raw,
+        'fg': texts['primary'].hex_raw,
+        'menu_bg': surfaces['primary'].hex_raw,
+        'menu_fg': texts['primary'].hex_raw,
+        'sel_bg': accents[0].hex_raw,
+        'sel_fg': surfaces['primary'].hex_raw,
+        'txt_bg': surfaces['primary'].hex_raw,
+        'txt_fg': texts['primary'].hex_raw,
+        'btn_bg': (accents[1] if len(accents) > 1 else accents[0]).hex_raw,
+        'btn_fg': accents[0].hex_raw,
+        'hdr_btn_bg': surfaces['secondary'].hex_raw,
+        'hdr_btn_fg': texts['primary'].hex_raw,
+        'wm_border_focus': (accents[1] if len(accents) > 1 else accents[0]).hex_raw,
+        'wm_border_unfocus': surfaces['secondary'].hex_raw,
+        'icons_light_folder': accents[0].hex_raw,
+        'icons_medium': texts['primary'].hex_raw,
+        'icons_dark': surfaces['primary'].hex_raw,
         'roundness': 4,
         'spacing': 3,
         'gradient': 0.0,
@@ -366,6 +1356,9 @@ def build_colors_yaml(theme_name, wallpaper_path, accents, surfaces, texts, term
     # Ensure we have enough colors
     while len(accents) < 4:
         accents.append(accents[-1])
+    accents = [Color.of(c) for c in accents]
+    surfaces = {k: Color.of(v) for k, v in surfaces.items()}
+    texts = {k: Color.of(v) for k, v in texts.items()}
 
     image_name = Path(wallpaper_path).stem
 
@@ -374,64 +1367,65 @@ def build_colors_yaml(theme_name, wallpaper_path, accents, surfaces, texts, term
             'name': theme_name,
             'wallpaper': str(wallpaper_path),
             'generated': datetime.now().isoformat(timespec='seconds'),
-            'generator': 'themix-python-v1',
+            'generator': GENERATOR,
+            'mode': mode,
         },
         'text': {
-            'primary': rgb_to_hex(texts['primary']),
-            'primary_rgb': rgb_to_hex_raw(texts['primary']),
-            'secondary': rgb_to_hex(texts['secondary']),
-            'secondary_rgb': rgb_to_hex_raw(texts['secondary']),
-            'tertiary': rgb_to_hex(texts['tertiary']),
-            'tertiary_rgb': rgb_to_hex_raw(texts['tertiary']),
-            'quaternary': rgb_to_hex(texts['quaternary']),
-            'quaternary_rgb': rgb_to_hex_raw(texts['quaternary']),
-            'quinary': rgb_to_hex(texts['quinary']),
-            'quinary_rgb': rgb_to_hex_raw(texts['quinary']),
+            'primary': texts['primary'].hex,
+            'primary_rgb': texts['primary'].hex_raw,
+            'secondary': texts['secondary'].hex,
+            'secondary_rgb': texts['secondary'].hex_raw,
+            'tertiary': texts['tertiary'].hex,
+            'tertiary_rgb': texts['tertiary'].hex_raw,
+            'quaternary': texts['quaternary'].hex,
+            'quaternary_rgb': texts['quaternary'].hex_raw,
+            'quinary': texts['quinary'].hex,
+            'quinary_rgb': texts['quinary'].hex_raw,
         },
         'surface': {
-            'primary': rgb_to_hex(surfaces['primary']),
-            'primary_rgb': rgb_to_hex_raw(surfaces['primary']),
+            'primary': surfaces['primary'].hex,
+            'primary_rgb': surfaces['primary'].hex_raw,
             'primary_rgba': rgb_to_rgba(surfaces['primary'], 0.95),
-            'secondary': rgb_to_hex(surfaces['secondary']),
-            'secondary_rgb': rgb_to_hex_raw(surfaces['secondary']),
-            'tertiary': rgb_to_hex(surfaces['tertiary']),
-            'tertiary_rgb': rgb_to_hex_raw(surfaces['tertiary']),
-            'quaternary': rgb_to_hex(surfaces['quaternary']),
-            'quaternary_rgb': rgb_to_hex_raw(surfaces['quaternary']),
-            'quinary': rgb_to_hex(surfaces['quinary']),
-            'quinary_rgb': rgb_to_hex_raw(surfaces['quinary']),
+            'secondary': surfaces['secondary'].hex,
+            'secondary_rgb': surfaces['secondary'].hex_raw,
+            'tertiary': surfaces['tertiary'].hex,
+            'tertiary_rgb': surfaces['tertiary'].hex_raw,
+            'quaternary': surfaces['quaternary'].hex,
+            'quaternary_rgb': surfaces['quaternary'].hex_raw,
+            'quinary': surfaces['quinary'].hex,
+            'quinary_rgb': surfaces['quinary'].hex_raw,
         },
         'semantic': {
-            'active': rgb_to_hex(accents[0]),
-            'active_rgb': rgb_to_hex_raw(accents[0]),
-            'active_fg': rgb_to_hex(surfaces['primary']),  # Dark text on accent bg
-            'active_fg_rgb': rgb_to_hex_raw(surfaces['primary']),
-            'inactive': rgb_to_hex(surfaces['tertiary']),
-            'inactive_rgb': rgb_to_hex_raw(surfaces['tertiary']),
-            'hover': rgb_to_hex(surfaces['tertiary']),
-            'hover_rgb': rgb_to_hex_raw(surfaces['tertiary']),
-            'focus': rgb_to_hex(texts['secondary']),
-            'focus_rgb': rgb_to_hex_raw(texts['secondary']),
+            'active': accents[0].hex,
+            'active_rgb': accents[0].hex_raw,
+            'active_fg': surfaces['primary'].hex,  # Dark text on accent bg
+            'active_fg_rgb': surfaces['primary'].hex_raw,
+            'inactive': surfaces['tertiary'].hex,
+            'inactive_rgb': surfaces['tertiary'].hex_raw,
+            'hover': surfaces['tertiary'].hex,
+            'hover_rgb': surfaces['tertiary'].hex_raw,
+            'focus': texts['secondary'].hex,
+            'focus_rgb': texts['secondary'].hex_raw,
         },
         'accent': {
-            'primary': rgb_to_hex(accents[0]),
-            'primary_rgb': rgb_to_hex_raw(accents[0]),
-            'secondary': rgb_to_hex(accents[1]),
-            'secondary_rgb': rgb_to_hex_raw(accents[1]),
-            'tertiary': rgb_to_hex(accents[2]),
-            'tertiary_rgb': rgb_to_hex_raw(accents[2]),
-            'quaternary': rgb_to_hex(accents[3]),
-            'quaternary_rgb': rgb_to_hex_raw(accents[3]),
+            'primary': accents[0].hex,
+            'primary_rgb': accents[0].hex_raw,
+            'secondary': accents[1].hex,
+            'secondary_rgb': accents[1].hex_raw,
+            'tertiary': accents[2].hex,
+            'tertiary_rgb': accents[2].hex_raw,
+            'quaternary': accents[3].hex,
+            'quaternary_rgb': accents[3].hex_raw,
         },
         'border': {
-            'primary': rgb_to_hex(accents[1]),
-            'primary_rgb': rgb_to_hex_raw(accents[1]),
-            'subtle': rgb_to_hex(surfaces['tertiary']),
-            'subtle_rgb': rgb_to_hex_raw(surfaces['tertiary']),
-            'accent': rgb_to_hex(texts['primary']),
-            'accent_rgb': rgb_to_hex_raw(texts['primary']),
+            'primary': accents[1].hex,
+            'primary_rgb': accents[1].hex_raw,
+            'subtle': surfaces['tertiary'].hex,
+            'subtle_rgb': surfaces['tertiary'].hex_raw,
+            'accent': texts['primary'].hex,
+            'accent_rgb': texts['primary'].hex_raw,
         },
-        'terminal': {k: rgb_to_hex(v) for k, v in terminal.items()},
+        'terminal': {k: Color.of(v).hex for k, v in terminal.items()},
         'oomox': generate_oomox_colors(surfaces, texts, accents, image_name),
         'rgb': {
             'background': list(surfaces['primary']),
@@ -451,81 +1445,151 @@ def build_colors_yaml(theme_name, wallpaper_path, accents, surfaces, texts, term
 
 
 # =============================================================================
-# Main Entry Point
+# Theme Generation
 # =============================================================================
 
-def main():
-    parser = argparse.ArgumentParser(
-        description='Extract colors from wallpaper and generate theme colors.yaml',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog='''
-Examples:
-  %(prog)s wallpaper.jpg my-theme
-  %(prog)s ~/Pictures/photo.png sunset-theme --output-dir ~/themes
-        '''
-    )
-    parser.add_argument('image', help='Path to wallpaper image')
-    parser.add_argument('theme_name', help='Name for the theme')
-    parser.add_argument('--output-dir', default='~/.config/themes',
-                        help='Output directory (default: ~/.config/themes)')
-    parser.add_argument('--num-colors', type=int, default=5,
-                        help='Number of accent colors to extract (default: 5)')
-    parser.add_argument('--mode', choices=['dark', 'light', 'auto'], default='auto',
-                        help='Theme mode (default: auto-detect)')
-    parser.add_argument('--quiet', '-q', action='store_true',
-                        help='Suppress output')
-    args = parser.parse_args()
+def palette_summary(hist, algorithm, num_colors):
+    """{'mode', 'accents'} for a histogram, or {'error'} when it has no usable accents"""
+    try:
+        accents = EXTRACTORS[algorithm](hist, num_colors)
+        return {'mode': determine_theme_mode(accents), 'accents': [c.hex for c in accents]}
+    except Exception as e:  # e.g. a fully gray stretch of frames
+        return {'error': f"{type(e).__name__}: {e}"}
+
+
+def write_segments(output_dir, parts, info, algorithm, num_colors):
+    """Write segments.yaml: accent palette and mode per contiguous frame range,
+    for themes that follow the animation over time"""
+    segments = [{'frames': [first, last], **palette_summary(hist, algorithm, num_colors)}
+                for first, last, hist in parts]
+    with open(output_dir / 'segments.yaml', 'w') as f:
+        theme_colors.dump_yaml({**info, 'segments': segments}, f)
+
+
+def write_regions(output_dir, parts, size, algorithm, num_colors):
+    """Write regions.yaml: accent palette and mode per image region, e.g. per
+    monitor of a spanned wallpaper or for the strip behind the bar"""
+    regions = []
+    for name, box, img in parts:
+        hist = compute_histogram(img)
+        regions.append({'name': name, 'box': list(box),
+                        **palette_summary(hist, algorithm, num_colors)})
+    with open(output_dir / 'regions.yaml', 'w') as f:
+        theme_colors.dump_yaml({'size': list(size), 'regions': regions}, f)
+
+
+def build_scheme(accents, mode, quiet=True):
+    """Surfaces, text and terminal colors for extracted accents.
+    Returns (accents, surfaces, texts, terminal, contrast report); accents
+    come back adjusted for contrast against the primary surface.
+    """
+    surfaces = generate_surfaces(accents[0], mode)
+    texts = generate_text_colors(surfaces['primary'], mode)
 
-    # Resolve paths
-    image_path = Path(args.image).expanduser().resolve()
-    if not image_path.exists():
-        print(f"Error: Image not found: {image_path}", file=sys.stderr)
-        sys.exit(1)
+    # Ensure accent colors have good contrast against background (WCAG 4.5:1)
+    surface_primary = surfaces['primary']
+    with timings.stage('contrast'):
+        corrected_accents = ensure_contrast_batch(accents, [surface_primary] * len(accents),
+                                                  [4.5] * len(accents))
+    for i, (accent, corrected) in enumerate(zip(accents, corrected_accents)):
+        if corrected != accent and not quiet:
+            print(f"Adjusted accent[{i}] for contrast: {rgb_to_hex(accent)} -> {rgb_to_hex(corrected)}")
+    accents = corrected_accents
 
-    output_dir = Path(args.output_dir).expanduser() / args.theme_name
+    with timings.stage('terminal'):
+        terminal = generate_terminal_colors(accents, surfaces, texts, mode)
+
+    # Validate every text/terminal role against the background in one pass
+    with timings.stage('contrast'):
+        texts, terminal, report = validate_contrast(accents, surfaces, texts, terminal)
+    return accents, surfaces, texts, terminal, report
+
+
+def generate_theme(image_path, theme_name, output_dir, num_colors=5, mode='auto',
+                   quiet=False, cache=None, sample_size=SAMPLE_SIZE, fast_decode=False,
+                   algorithm='greedy', update_index=True, contrast_report=False,
+                   frame_stride=None, segments=0, max_memory=None, regions=()):
+    """Extract colors from image_path and write <output_dir>/<theme_name>/colors.yaml.
+    Returns (theme directory, theme index entry); the entry is also written
+    to <output_dir>/index.json unless update_index is False.
+    contrast_report prints the achieved ratio for every validated pair.
+    For an animation, segments > 0 also writes segments.yaml (see write_segments).
+    For a still, regions ([(name, coords)] from parse_region) also writes
+    regions.yaml (see write_regions). max_memory caps decode memory in bytes.
+    """
+    themes_dir = Path(output_dir)
+    output_dir = themes_dir / theme_name
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    if not args.quiet:
+    if not quiet:
         print(f"Extracting colors from {image_path.name}...")
 
     # Extract accent colors
-    accents = extract_colors(image_path, num_colors=args.num_colors)
-
-    if not args.quiet:
+    animation = open_animation(image_path) if segments else None
+    if animation is not None:
+        # One pass yields the whole-animation and per-segment histograms
+        with animation:
+            hist, parts, info = stream_histograms(animation, sample_size, fast_decode,
+                                                  frame_stride, segments)
+        accents = EXTRACTORS[algorithm](hist, num_colors)
+        write_segments(output_dir, parts, info, algorithm, num_colors)
+        if not quiet:
+            print(f"Sampled {info['sampled']} of {info['frames']} frames "
+                  f"(stride {info['stride']}), {len(parts)} segment palettes")
+    elif regions:
+        # One read (banded over max_memory) yields the whole image and every region
+        img, parts, size = load_regions(image_path, regions, sample_size, fast_decode,
+                                        max_memory)
+        accents = EXTRACTORS[algorithm](compute_histogram(img), num_colors)
+        write_regions(output_dir, parts, size, algorithm, num_colors)
+        if not quiet:
+            print(f"{len(parts)} region palettes")
+    else:
+        accents = extract_colors(image_path, num_colors=num_colors, cache=cache,
+                                 sample_size=sample_size, fast_decode=fast_decode,
+                                 algorithm=algorithm, frame_stride=frame_stride,
+                                 max_memory=max_memory)
+    if animation is None:
+        (output_dir / 'segments.yaml').unlink(missing_ok=True)
+    if not regions or animation is not None:
+        (output_dir / 'regions.yaml').unlink(missing_ok=True)
+
+    if not quiet:
         print(f"Found {len(accents)} accent colors")
 
     # Determine mode
-    mode = args.mode
     if mode == 'auto':
         mode = determine_theme_mode(accents)
-        if not args.quiet:
+        if not quiet:
             print(f"Detected mode: {mode}")
 
-    # Generate color scheme
-    surfaces = generate_surfaces(accents[0], mode)
-    texts = generate_text_colors(surfaces['primary'], mode)
-
-    # Ensure accent colors have good contrast against background (WCAG 4.5:1)
-    surface_primary = surfaces['primary']
-    corrected_accents = []
-    for i, accent in enumerate(accents):
-        corrected = ensure_contrast(accent, surface_primary, min_ratio=4.5)
-        if corrected != accent and not args.quiet:
-            print(f"Adjusted accent[{i}] for contrast: {rgb_to_hex(accent)} -> {rgb_to_hex(corrected)}")
-        corrected_accents.append(corrected)
-    accents = corrected_accents
-
-    terminal = generate_terminal_colors(accents, surfaces, texts, mode)
+    accents, surfaces, texts, terminal, report = build_scheme(accents, mode, quiet)
+    if contrast_report:
+        print("Contrast:")
+        print_contrast_report(report)
+    elif not quiet:
+        adjusted = [row for row in report if row[3] != row[2]]
+        for role, _, before, after, _ in adjusted:
+            print(f"Adjusted {role} for contrast: {before:.2f} -> {after:.2f}")
+        enforced = [row for row in report if row[4]]
+        role, _, _, lowest, _ = min(enforced, key=lambda row: row[3] / row[4])
+        met = sum(1 for row in enforced if row[3] >= row[4])
+        print(f"Contrast: {met}/{len(enforced)} pairs meet their minimum, "
+              f"tightest {lowest:.2f} ({role})")
 
     # Build complete colors.yaml
-    colors = build_colors_yaml(
-        args.theme_name, image_path, accents, surfaces, texts, terminal, mode
-    )
+    with timings.stage('schema'):
+        colors = build_colors_yaml(
+            theme_name, image_path, accents, surfaces, texts, terminal, mode
+        )
 
     # Write colors.yaml
     colors_file = output_dir / 'colors.yaml'
-    with open(colors_file, 'w') as f:
-        yaml.dump(colors, f, default_flow_style=False, sort_keys=False, allow_unicode=True)
+    with timings.stage('yaml_dump'):
+        with open(colors_file, 'w') as f:
+            theme_colors.dump_yaml(colors, f)
+        # Pre-resolved colors.json for renderers (merges any existing overrides.yaml)
+        theme_colors.update_sidecar(output_dir, colors)
 
     # Create wallpaper symlink
     wallpaper_ext = image_path.suffix.lower()
@@ -540,10 +1604,553 @@ Examples:
         wallpaper_link.unlink()
     wallpaper_link.symlink_to(image_path)
 
+    with timings.stage('index'):
+        entry = theme_index.make_entry(colors, colors_file)
+        if update_index:
+            theme_index.update_themes(themes_dir, {theme_name: entry})
+
+    return output_dir, entry
+
+
+# =============================================================================
+# Batch Mode
+# =============================================================================
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+
+
+def theme_name_from_path(image_path):
+    """Derive theme name from filename (same rules as generate-theme.sh)"""
+    name = image_path.stem.lower().replace(' ', '-')
+    return ''.join(c for c in name if c.isalnum() or c in '-_')
+
+
+def collect_batch_jobs(source):
+    """Build (image_path, theme_name) jobs from a wallpaper directory or manifest.
+    Manifest lines are "<image>" or "<image><TAB><theme-name>"; # starts a comment.
+    """
+    source = Path(source).expanduser()
+    if source.is_dir():
+        entries = [
+            (p.resolve(), None) for p in sorted(source.rglob('*'))
+            if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+        ]
+    else:
+        entries = []
+        with open(source, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                image, _, name = line.partition('\t')
+                image_path = Path(image.strip()).expanduser()
+                if not image_path.is_absolute():
+                    image_path = source.parent / image_path
+                entries.append((image_path.resolve(), name.strip() or None))
+
+    # Disambiguate derived names (e.g. forest.jpg + forest.png)
+    jobs, seen = [], set()
+    for image_path, name in entries:
+        name = name or theme_name_from_path(image_path)
+        base, n = name, 2
+        while name in seen:
+            name = f"{base}-{n}"
+            n += 1
+        seen.add(name)
+        jobs.append((image_path, name))
+    return jobs
+
+
+def _batch_worker(job):
+    """Process one batch job; never raises.
+    Returns (name, image, seconds, error, cache_hits, index_entry).
+    """
+    image_path, theme_name, output_dir, options = job
+    cache = options.get('cache')
+    start = time.perf_counter()
+    entry = None
+    # Workers report per job through $THEMIX_TIMINGS (set by --timings in the parent)
+    recorder = timings.start('extract-colors:worker') if timings.requested() else None
+    try:
+        _, entry = generate_theme(image_path, theme_name, output_dir, quiet=True,
+                                  update_index=False, **options)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    if recorder:
+        recorder.emit(theme=theme_name, error=error)
+    return theme_name, image_path, elapsed, error, cache.hits if cache else 0, entry
+
+
+def run_batch(source, output_dir, workers=None, quiet=False, **options):
+    """Generate themes for every image in source across a process pool.
+    Failures are reported and counted without stopping the run.
+    options are passed through to generate_theme.
+    The theme index is updated once, after all workers finish.
+    Returns list of (name, image, seconds, error, cache_hits, index_entry).
+    """
+    jobs = collect_batch_jobs(source)
+    if not jobs:
+        print(f"Error: No images found in {source}", file=sys.stderr)
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if not quiet:
+        print(f"Processing {len(jobs)} images with {workers} workers...")
+
+    results = []
+    start = time.perf_counter()
+    payloads = [(image, name, output_dir, options) for image, name in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_batch_worker, payloads, chunksize=4):
+            name, image, elapsed, error, hits, _ = result
+            results.append(result)
+            if error:
+                print(f"  FAIL {name} ({image.name}): {error}", file=sys.stderr)
+            elif not quiet:
+                print(f"  ok   {name} ({elapsed:.2f}s{', cached' if hits else ''})")
+    total = time.perf_counter() - start
+
+    theme_index.update_themes(Path(output_dir), {r[0]: r[5] for r in results if r[5]})
+
+    cache = options.get('cache')
+    if cache:
+        cache.hits += sum(1 for r in results if r[4])
+        cache.misses += sum(1 for r in results if not r[4] and not r[3])
+
+    failed = sum(1 for r in results if r[3])
+    if not quiet:
+        busy = sum(r[2] for r in results)
+        print(f"\nBatch done: {len(results) - failed} ok, {failed} failed "
+              f"in {total:.1f}s ({busy / total if total else 0:.1f}x parallel)")
+    return results
+
+
+# =============================================================================
+# Watch Mode
+# =============================================================================
+#
+# New or rewritten images in a watched directory are picked up through
+# inotify (dir_watch.py), held until their size and mtime stop changing for
+# `debounce` seconds (so half-copied files are never decoded), then handed to
+# a process pool that writes colors.yaml and renders the templates. At most
+# `workers` jobs are in flight; the rest wait in the parent's ready queue.
+# <output>/watch-ledger.json remembers the size/mtime each image was last
+# processed at, so a restart only picks up images added or changed since.
+
+WATCH_LEDGER = 'watch-ledger.json'
+WATCH_DEBOUNCE = 2.0
+WATCH_REPORT_INTERVAL = 60.0
+
+
+def _file_stamp(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_watch_ledger(output_dir):
+    """Image path -> {stamp, theme, processed[, error]}; {} if missing/corrupt"""
+    try:
+        with open(output_dir / WATCH_LEDGER, 'r') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_watch_ledger(output_dir, ledger):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _atomic_write(output_dir / WATCH_LEDGER,
+                  json.dumps({'version': 1, 'files': ledger}, indent=1).encode())
+
+
+def _watch_worker(job):
+    """_batch_worker plus template rendering for the new theme"""
+    result = _batch_worker(job)
+    theme_name, _, elapsed, error, hits, entry = result
+    if error:
+        return result
+    _, _, output_dir, _ = job
+    start = time.perf_counter()
+    try:
+        import render_templates
+        render_templates.render_theme(theme_name, Path(output_dir), quiet=True)
+    except Exception as e:
+        error = f"render: {type(e).__name__}: {e}"
+    return theme_name, job[0], elapsed + time.perf_counter() - start, error, hits, entry
+
+
+def _ignore_interrupts():
+    """Pool initializer: Ctrl-C reaches the whole process group, but only the
+    parent should react (it lets running jobs finish)"""
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class WatchStats:
+    """Ingest counters for sizing the pool: throughput, queue depth, job time"""
+
+    def __init__(self):
+        self.start = self.window_start = time.perf_counter()
+        self.done = self.failed = self.window_done = 0
+        self.busy = 0.0
+        self.peak_queue = 0
+
+    def finished(self, seconds, failed):
+        self.done += 1
+        self.window_done += 1
+        self.failed += failed
+        self.busy += seconds
+
+    def report(self, pending, ready, running, workers):
+        now = time.perf_counter()
+        window = now - self.window_start
+        rate = self.window_done / window * 60 if window else 0
+        overall = self.done / (now - self.start) * 60 if now > self.start else 0
+        mean = self.busy / self.done if self.done else 0
+        print(f"[watch] {self.done} done ({self.failed} failed); "
+              f"{rate:.1f}/min recent, {overall:.1f}/min overall; "
+              f"queue: {pending} settling, {ready} ready, {running}/{workers} running "
+              f"(peak {self.peak_queue}); mean job {mean:.2f}s", flush=True)
+        self.window_start, self.window_done = now, 0
+
+
+def theme_name_for(image_path, output_dir, ledger):
+    """Derived theme name, suffixed if another image or a hand-made theme owns it"""
+    owned = {e['theme']: path for path, e in ledger.items()}
+    base = name = theme_name_from_path(image_path)
+    n = 2
+    while (owned.get(name, str(image_path)) != str(image_path) or
+           (name not in owned and (output_dir / name / 'colors.yaml').exists())):
+        name = f"{base}-{n}"
+        n += 1
+    return name
+
+
+def run_watch(directory, output_dir, workers=None, quiet=False, debounce=WATCH_DEBOUNCE,
+              report_interval=WATCH_REPORT_INTERVAL, **options):
+    """Generate and render a theme for every image that appears or changes under
+    directory until SIGINT/SIGTERM. Images already in the ledger at their current
+    size/mtime are skipped, so a restart resumes instead of redoing the backlog.
+    """
+    import dir_watch
+    import signal
+
+    directory = Path(directory).expanduser().resolve()
+    if not directory.is_dir():
+        print(f"Error: Not a directory: {directory}", file=sys.stderr)
+        sys.exit(1)
+    workers = workers or os.cpu_count() or 1
+    ledger = load_watch_ledger(output_dir)
+    watcher = dir_watch.watch(directory)
+    stats = WatchStats()
+
+    def is_image(path):
+        return path.suffix.lower() in IMAGE_EXTENSIONS and not path.name.startswith('.')
+
+    # path -> [time of last change, stamp then]; ready once quiet for `debounce`
+    now = time.monotonic()
+    pending = {p: [now, _file_stamp(p)] for p in dir_watch.walk_files(directory) if is_image(p)}
+    ready, running = deque(), {}
+
+    stopping = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopping.append(True))
+
+    if not quiet:
+        kind = 'inotify' if isinstance(watcher, dir_watch.InotifyWatcher) else 'polling'
+        print(f"Watching {directory} ({kind}, {workers} workers, {len(ledger)} in ledger)...",
+              flush=True)
+
+    def collect(future):
+        path, stamp = running.pop(future)
+        try:
+            name, image, elapsed, error, _, entry = future.result()
+        except Exception as e:  # worker died (e.g. killed for memory)
+            name, image, elapsed, entry = ledger[str(path)]['theme'], path, 0.0, None
+            error = f"{type(e).__name__}: {e}"
+        record = {'stamp': stamp, 'theme': name,
+                  'processed': datetime.now().isoformat(timespec='seconds')}
+        if error:
+            record['error'] = error
+            print(f"  FAIL {name} ({image.name}): {error}", file=sys.stderr, flush=True)
+        else:
+            theme_index.update_themes(output_dir, {name: entry})
+            if not quiet:
+                print(f"  ok   {name} ({elapsed:.2f}s)", flush=True)
+        ledger[str(path)] = record
+        save_watch_ledger(output_dir, ledger)
+        stats.finished(elapsed, bool(error))
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_ignore_interrupts)
+
+    next_report = time.monotonic() + report_interval
+    pool = new_pool()
+    try:
+        while not stopping:
+            timeout = debounce / 4 if pending else 1.0
+            for path in watcher.changes(timeout):
+                if is_image(path):
+                    pending[path] = [time.monotonic(), _file_stamp(path)]
+
+            now = time.monotonic()
+            for path, (changed, stamp) in list(pending.items()):
+                if now - changed < debounce:
+                    continue
+                current = _file_stamp(path)
+                if current != stamp:
+                    # Still being written (or gone): wait another full period
+                    if current is None:
+                        del pending[path]
+                    else:
+                        pending[path] = [now, current]
+                    continue
+                if any(p == path for p, _ in running.values()):
+                    # Changed while being processed: look again once that job ends
+                    pending[path] = [now, current]
+                    continue
+                del pending[path]
+                done = ledger.get(str(path))
+                if done and done['stamp'] == current:
+                    continue
+                if path not in ready:
+                    ready.append(path)
+
+            for future in [f for f in running if f.done()]:
+                collect(future)
+            while ready and len(running) < workers:
+                path = ready.popleft()
+                name = ledger.get(str(path), {}).get('theme') or \
+                    theme_name_for(path, output_dir, ledger)
+                ledger.setdefault(str(path), {'stamp': None, 'theme': name})
+                try:
+                    future = pool.submit(_watch_worker, (path, name, output_dir, options))
+                except BrokenProcessPool:
+                    # A worker died; the jobs it took down fail in collect(), and
+                    # everything after them needs a fresh pool
+                    print("  worker pool broken, starting a new one", file=sys.stderr,
+                          flush=True)
+                    pool.shutdown(wait=False)
+                    pool = new_pool()
+                    future = pool.submit(_watch_worker, (path, name, output_dir, options))
+                running[future] = (path, _file_stamp(path))
+            stats.peak_queue = max(stats.peak_queue, len(ready) + len(running))
+
+            if now >= next_report and (stats.window_done or ready or running):
+                stats.report(len(pending), len(ready), len(running), workers)
+                next_report = now + report_interval
+    finally:
+        watcher.close()
+        if running and not quiet:
+            print(f"Stopping: waiting for {len(running)} running job(s)...", flush=True)
+        for future in list(running):
+            collect(future)
+        pool.shutdown()
+
+    if not quiet:
+        stats.report(len(pending), len(ready), 0, workers)
+    return stats
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def print_cache_stats(cache):
+    """Print extraction cache usage to stderr"""
+    st = cache.stats()
+    print(f"Cache: {st['path']}", file=sys.stderr)
+    print(f"  entries: {st['entries']}  size: {st['bytes'] / 1048576:.1f} MiB"
+          f" / {st['max_bytes'] / 1048576:.0f} MiB", file=sys.stderr)
+    print(f"  this run: {st['hits']} hits, {st['misses']} misses", file=sys.stderr)
+
+
+def write_memory_profile(snapshot, path, peak, limit=30):
+    """Write the top allocation sites of a tracemalloc snapshot"""
+    stats = snapshot.statistics('lineno')
+    with open(path, 'w') as f:
+        f.write(f"Peak traced memory {peak / 1024:.1f} KiB; top {limit} of {len(stats)} "
+                f"allocation sites still live at exit "
+                f"({sum(s.size for s in stats) / 1024:.1f} KiB):\n\n")
+        for stat in stats[:limit]:
+            f.write(f"{stat}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract colors from wallpaper and generate theme colors.yaml',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  %(prog)s wallpaper.jpg my-theme
+  %(prog)s ~/Pictures/photo.png sunset-theme --output-dir ~/themes
+  %(prog)s --batch ~/Pictures/wallpapers --workers 8
+  %(prog)s --batch wallpapers.txt   # lines: <image>[<TAB><theme-name>]
+  %(prog)s --watch ~/Pictures/incoming --workers 4
+  %(prog)s panorama.png wall --max-memory 256 --region 3x1 --region bar=0,0,100%%,40
+        '''
+    )
+    parser.add_argument('image', nargs='?', help='Path to wallpaper image')
+    parser.add_argument('theme_name', nargs='?', help='Name for the theme')
+    parser.add_argument('--output-dir', default='~/.config/themes',
+                        help='Output directory (default: ~/.config/themes)')
+    parser.add_argument('--num-colors', type=int, default=5,
+                        help='Number of accent colors to extract (default: 5)')
+    parser.add_argument('--mode', choices=['dark', 'light', 'auto'], default='auto',
+                        help='Theme mode (default: auto-detect)')
+    parser.add_argument('--algorithm', choices=sorted(EXTRACTORS), default='greedy',
+                        help='Accent extractor: greedy hue-distance scoring or OKLab k-means '
+                             '(default: greedy; kmeans needs NumPy)')
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE,
+                        help=f'Longest side of the analysed image in px (default: {SAMPLE_SIZE})')
+    parser.add_argument('--fast-decode', action='store_true',
+                        help='Decode JPEGs at reduced scale (faster, slight palette drift)')
+    parser.add_argument('--frame-stride', type=int, default=None, metavar='N',
+                        help='Animations: use every Nth frame (default: about '
+                             f'{FRAME_SAMPLES} frames spread over the animation)')
+    parser.add_argument('--segments', type=int, default=0, metavar='N',
+                        help='Animations: also write segments.yaml with a palette for each '
+                             'of N consecutive stretches of frames')
+    parser.add_argument('--max-memory', type=float, default=None, metavar='MB',
+                        help='Read images whose decode would exceed MB in bands of rows '
+                             '(same palette; JPEG and compressed TIFF over the limit fail)')
+    parser.add_argument('--region', action='append', default=[], metavar='SPEC',
+                        help='Also write regions.yaml with a palette for an image region: '
+                             'NAME=X,Y,W,H in pixels or %% (e.g. bar=0,0,100%%,40), or '
+                             'COLSxROWS for a monitor grid (e.g. 3x1); repeatable')
+    parser.add_argument('--batch', metavar='PATH',
+                        help='Generate a theme per image in a directory or manifest file')
+    parser.add_argument('--watch', metavar='DIR',
+                        help='Keep running: generate and render a theme for each image '
+                             'added to or changed in DIR (ledger: <output-dir>/'
+                             f'{WATCH_LEDGER})')
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE,
+                        help='Watch: seconds an image must stay unchanged before it is '
+                             f'processed (default: {WATCH_DEBOUNCE:g})')
+    parser.add_argument('--report-interval', type=float, default=WATCH_REPORT_INTERVAL,
+                        help='Watch: seconds between throughput/queue reports '
+                             f'(default: {WATCH_REPORT_INTERVAL:g})')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Batch/watch worker processes (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'Do not read or write the extraction cache ({CACHE_DIR})')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='Print extraction cache statistics (alone: print and exit)')
+    parser.add_argument('--contrast-report', action='store_true',
+                        help='Print the contrast ratio of every text/terminal/semantic pair')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print per-stage wall/CPU time and peak RSS as JSON on stderr '
+                             f'(${timings.ENV_VAR}=FILE appends records there instead)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Write cProfile stats to FILE and top allocations '
+                             '(tracemalloc) to FILE.mem.txt; slows the run')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Suppress output')
+    args = parser.parse_args()
+
+    recorder = worker_log = None
+    if args.timings or timings.requested():
+        recorder = timings.start('extract-colors')
+        if (args.batch or args.watch) and not timings.requested():
+            # Workers report through the env file; collect it into this record
+            fd, worker_log = tempfile.mkstemp(prefix='themix-timings-')
+            os.close(fd)
+            os.environ[timings.ENV_VAR] = worker_log
+    if args.profile:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start(25)
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        run(args, parser)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            write_memory_profile(tracemalloc.take_snapshot(), f'{args.profile}.mem.txt',
+                                 tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            print(f"Profile: {args.profile} (python3 -m pstats), {args.profile}.mem.txt",
+                  file=sys.stderr)
+        if recorder:
+            extra = {'argv': sys.argv[1:]}
+            if worker_log:
+                extra['workers'] = timings.load_records(worker_log)
+                os.unlink(worker_log)
+                del os.environ[timings.ENV_VAR]
+            recorder.emit(stderr=args.timings, **extra)
+
+
+def run(args, parser):
+    """Carry out the parsed command line (single theme, batch or cache stats)"""
+    if args.algorithm == 'kmeans' and np is None:
+        parser.error('--algorithm kmeans requires NumPy')
+
+    try:
+        regions = [region for spec in args.region for region in parse_region(spec)]
+    except ValueError as e:
+        parser.error(str(e))
+
+    output_root = Path(args.output_dir).expanduser()
+    cache = None if args.no_cache else ExtractionCache()
+    options = {'num_colors': args.num_colors, 'mode': args.mode, 'cache': cache,
+               'sample_size': args.sample_size, 'fast_decode': args.fast_decode,
+               'algorithm': args.algorithm, 'frame_stride': args.frame_stride,
+               'segments': args.segments, 'regions': regions,
+               'max_memory': args.max_memory and int(args.max_memory * 1024 * 1024)}
+
+    if args.cache_stats and not (args.image or args.batch or args.watch):
+        print_cache_stats(cache or ExtractionCache())
+        return
+
+    if args.batch and args.watch:
+        parser.error('--batch and --watch are mutually exclusive')
+
+    if args.watch:
+        with timings.stage('watch'):
+            run_watch(args.watch, output_root, args.workers, args.quiet, args.debounce,
+                      args.report_interval, **options)
+        return
+
+    if args.batch:
+        with timings.stage('batch'):
+            results = run_batch(args.batch, output_root, args.workers, args.quiet, **options)
+        if args.cache_stats and cache:
+            print_cache_stats(cache)
+        if not results or any(r[3] for r in results):
+            sys.exit(1)
+        return
+
+    if not args.image or not args.theme_name:
+        parser.error('image and theme_name are required (or use --batch/--watch)')
+
+    # Resolve paths
+    image_path = Path(args.image).expanduser().resolve()
+    if not image_path.exists():
+        print(f"Error: Image not found: {image_path}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        output_dir, _ = generate_theme(image_path, args.theme_name, output_root,
+                                       quiet=args.quiet, contrast_report=args.contrast_report,
+                                       **options)
+    except ValueError as e:  # e.g. tiled_image.ImageTooLarge, a region outside the image
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
     if not args.quiet:
         print(f"Theme '{args.theme_name}' created at {output_dir}")
         print(f"\nNext: process-templates.sh {args.theme_name}")
 
+    if args.cache_stats and cache:
+        print_cache_stats(cache)
+
 
 if __name__ == '__main__':
     main()
@@ -11,15 +11,18 @@ THEMES_DIR="${THEMES_DIR:-$HOME/.config/themes}"
 
 # Colors for output
 GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
 BLUE='\033[0;34m'
 NC='\033[0m'
 
 log_info() { echo -e "${BLUE}${NC} $1"; }
 log_success() { echo -e "${GREEN}${NC} $1"; }
+log_warn() { echo -e "${YELLOW}${NC} $1"; }
 
 show_usage() {
     cat << EOF
 Usage: $0 <wallpaper-image> [theme-name] [options]
+       $0 --batch=PATH [--jobs=N] [--mode=MODE]
 
 Generate a complete theme from a wallpaper image.
 
@@ -30,12 +33,18 @@ Arguments:
 Options:
   --mode=MODE       Theme mode: dark, light, auto (default: auto)
   --apply           Apply the theme after generating
+  --batch=PATH      Generate themes for every image in a directory or manifest
+  --jobs=N          Parallel extraction workers and asset builds for --batch
+                    (default: CPU count)
+  --timings         Print per-stage timings for the whole run (all steps and
+                    processes; records go to \$THEMIX_TIMINGS if set)
   -h, --help        Show this help message
 
 Examples:
   $0 ~/Pictures/wallpaper.jpg
   $0 ~/Pictures/sunset.png my-sunset-theme
   $0 ~/Pictures/forest.jpg forest --apply
+  $0 --batch=~/Pictures/wallpapers --jobs=8
 EOF
 }
 
@@ -45,6 +54,9 @@ parse_args() {
     THEME_NAME=""
     MODE="auto"
     APPLY=false
+    BATCH=""
+    JOBS=""
+    TIMINGS=false
 
     while [[ $# -gt 0 ]]; do
         case "$1" in
@@ -56,6 +68,19 @@ parse_args() {
                 APPLY=true
                 shift
                 ;;
+            --batch=*)
+                BATCH="${1#*=}"
+                BATCH="${BATCH/#\~/$HOME}"
+                shift
+                ;;
+            --jobs=*)
+                JOBS="${1#*=}"
+                shift
+                ;;
+            --timings)
+                TIMINGS=true
+                shift
+                ;;
             -h|--help)
                 show_usage
                 exit 0
@@ -76,6 +101,8 @@ parse_args() {
         esac
     done
 
+    [[ -n "$BATCH" ]] && return 0
+
     if [[ -z "$WALLPAPER" ]]; then
         echo "Error: Wallpaper image required"
         echo ""
@@ -100,8 +127,84 @@ parse_args() {
     fi
 }
 
+# Batch: extract all wallpapers in one parallel run, then process templates
+run_batch() {
+    MARKER=$(mktemp)
+
+    echo "Generating themes from: ${BATCH}"
+    echo ""
+
+    log_info "Step 1: Extracting colors..."
+    local status=0
+    python3 "${SCRIPT_DIR}/extract-colors.py" --batch "$BATCH" --mode="$MODE" \
+        --output-dir "$THEMES_DIR" ${JOBS:+--workers "$JOBS"} || status=$?
+
+    # Only themes written by this run
+    echo ""
+    log_info "Step 2: Processing templates..."
+    local themes=() theme
+    while IFS= read -r colors_file; do
+        theme=$(basename "$(dirname "$colors_file")")
+        # One broken theme must not stop the rest of the batch (set -e)
+        if bash "${SCRIPT_DIR}/process-templates.sh" --no-assets "$theme" >/dev/null; then
+            themes+=("$theme")
+        else
+            log_warn "Template processing failed: $theme"
+            status=1
+        fi
+    done < <(find "$THEMES_DIR" -mindepth 2 -maxdepth 2 -name colors.yaml -newer "$MARKER")
+    local count=${#themes[@]}
+
+    # Brave/GTK builds for all themes in one scheduler, --jobs at a time
+    if [[ $count -gt 0 ]]; then
+        echo ""
+        log_info "Step 3: Building assets..."
+        python3 "${SCRIPT_DIR}/build_assets.py" --themes-dir "$THEMES_DIR" --quiet \
+            ${JOBS:+--jobs "$JOBS"} "${themes[@]}" || status=$?
+    fi
+
+    echo ""
+    log_success "Generated ${count} themes"
+    return $status
+}
+
+# --timings: every Python process and shell step appends a JSON record to
+# $THEMIX_TIMINGS (see timings.py); print the aggregate when the run ends
+setup_timings() {
+    [[ "$TIMINGS" != true ]] && return 0
+    if [[ -z "$THEMIX_TIMINGS" ]]; then
+        export THEMIX_TIMINGS
+        THEMIX_TIMINGS=$(mktemp "${TMPDIR:-/tmp}/themix-timings-XXXXXX")
+        OWN_TIMINGS=true
+    fi
+    RUN_START=$(date +%s%N)
+}
+
+report_timings() {
+    local ns=$(( $(date +%s%N) - RUN_START ))
+    printf '{"source": "generate-theme.sh", "pid": %d, "wall": %d.%09d, "stages": {}}\n' \
+        $$ $((ns / 1000000000)) $((ns % 1000000000)) >> "$THEMIX_TIMINGS"
+    echo "" >&2
+    python3 "${SCRIPT_DIR}/timings.py" summary "$THEMIX_TIMINGS" >&2 || true
+    [[ "$OWN_TIMINGS" == true ]] && rm -f "$THEMIX_TIMINGS"
+    return 0
+}
+
+cleanup() {
+    [[ -n "$MARKER" ]] && rm -f "$MARKER"
+    [[ "$TIMINGS" == true ]] && report_timings
+    return 0
+}
+
 main() {
     parse_args "$@"
+    trap cleanup EXIT
+    setup_timings
+
+    if [[ -n "$BATCH" ]]; then
+        run_batch
+        return
+    fi
 
     echo "Generating theme: ${THEME_NAME}"
     echo "  Wallpaper: ${WALLPAPER}"
@@ -110,7 +213,15 @@ main() {
 
     # Step 1: Extract colors
     log_info "Step 1: Extracting colors..."
-    python3 "${SCRIPT_DIR}/extract-colors.py" "$WALLPAPER" "$THEME_NAME" --mode="$MODE" --quiet
+    local status=0
+    python3 "${SCRIPT_DIR}/themix_daemon.py" --optional --themes-dir "$THEMES_DIR" \
+        extract "$WALLPAPER" "$THEME_NAME" --mode="$MODE" --quiet || status=$?
+    if [[ $status -eq 75 ]]; then
+        python3 "${SCRIPT_DIR}/extract-colors.py" "$WALLPAPER" "$THEME_NAME" --mode="$MODE" \
+            --output-dir "$THEMES_DIR" --quiet
+    elif [[ $status -ne 0 ]]; then
+        exit $status
+    fi
 
     local theme_dir="${THEMES_DIR}/${THEME_NAME}"
     if [[ ! -f "${theme_dir}/colors.yaml" ]]; then
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Themix Palette Index
+Nearest-neighbour search over theme palettes: "which themes look like this
+color / wallpaper / theme?". Each theme contributes its accent and surface
+colors (theme_index.PALETTE_ROLES) in OKLab, where Euclidean distance tracks
+perceived difference. $THEMES_DIR/palette-index.npz holds the palettes as
+one float32 array plus a k-d tree over their individual colors, which
+answers color queries; palette queries rank whole palettes directly.
+
+The index follows index.json: every theme_index write updates it in place,
+and a query first syncs it if index.json changed behind its back. New or
+changed themes are appended outside the tree and scanned linearly until they
+make up REBUILD_FRACTION of the rows; then the tree is rebuilt.
+Requires: python3, NumPy (Pillow and PyYAML for image queries)
+"""
+
+import sys
+import argparse
+import heapq
+import importlib.util
+import os
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import theme_index
+import timings
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+INDEX_FILE = 'palette-index.npz'
+INDEX_VERSION = 1
+LEAF_SIZE = 32
+REBUILD_FRACTION = 0.1
+ROLES = len(theme_index.PALETTE_ROLES)
+
+
+def _stamp(path):
+    """[mtime_ns, size] of a file, or [0, 0] if missing"""
+    try:
+        st = path.stat()
+    except OSError:
+        return [0, 0]
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _extractor():
+    """scripts/extract-colors.py as module 'extract_colors' (OKLab, image queries)"""
+    if 'extract_colors' not in sys.modules:
+        spec = importlib.util.spec_from_file_location('extract_colors',
+                                                      SCRIPT_DIR / 'extract-colors.py')
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['extract_colors'] = module
+        spec.loader.exec_module(module)
+    return sys.modules['extract_colors']
+
+
+def _norms(palettes):
+    """Squared length of each flattened palette"""
+    flat = palettes.reshape(len(palettes), ROLES * 3)
+    return (flat * flat).sum(axis=1)
+
+
+def _hex_rgb(hex_color):
+    h = hex_color.lstrip('#')
+    if len(h) != 6:
+        raise ValueError(f"not a hex color: {hex_color}")
+    return [int(h[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def hex_to_oklab(hex_colors):
+    """(N, 3) float32 OKLab for a list of '#RRGGBB' strings"""
+    rgb = [_hex_rgb(h) for h in hex_colors]
+    return _extractor().srgb_to_oklab(np.array(rgb, dtype=np.float64).reshape(-1, 3)) \
+        .astype(np.float32)
+
+
+# =============================================================================
+# k-d Tree
+# =============================================================================
+#
+# A static tree in flat arrays, so it saves and loads with the palettes.
+# Nodes split at the median of their widest axis; leaves hold up to
+# LEAF_SIZE points and are scanned with NumPy. Queries descend depth-first,
+# nearer side first, and skip any side whose lower-bound distance (tracked
+# per axis from the split planes) cannot beat the current k-th result, so
+# answers match a linear scan exactly.
+#
+# Point i belongs to id i // group (its theme row); results are the k
+# nearest distinct ids, which lets one theme own several points. Only the
+# point order and nodes are saved; points are gathered from the data.
+
+class KDTree:
+    """k-d tree over the rows of a float array, answering k-nearest-id queries"""
+
+    FIELDS = ('order', 'axis', 'split', 'left', 'right', 'start', 'end')
+
+    def __init__(self, data, group, order, axis, split, left, right, start, end):
+        self.order = order
+        self.points = data[order]
+        self.ids = (order // group).tolist()
+        self.axis, self.split = axis.tolist(), split.tolist()
+        self.left, self.right = left.tolist(), right.tolist()
+        self.start, self.end = start.tolist(), end.tolist()
+        # Leaf bounding boxes: tighter than the split planes for the final check
+        leaves = sorted((self.start[node], node) for node, a in enumerate(self.axis) if a < 0)
+        self.boxes = {}
+        if leaves:
+            firsts = [first for first, _ in leaves]
+            lows = np.minimum.reduceat(self.points, firsts).tolist()
+            highs = np.maximum.reduceat(self.points, firsts).tolist()
+            for (_, node), lo, hi in zip(leaves, lows, highs):
+                self.boxes[node] = tuple(zip(lo, hi))
+
+    @classmethod
+    def build(cls, data, group=1, leaf_size=LEAF_SIZE):
+        points = np.asarray(data, dtype=np.float32)
+        order = np.arange(len(points))
+        axis, split, left, right, start, end = [], [], [], [], [], []
+
+        def node(first, last):
+            i = len(axis)
+            axis.append(-1)
+            split.append(0.0)
+            left.append(-1)
+            right.append(-1)
+            start.append(first)
+            end.append(last)
+            if last - first > leaf_size:
+                block = points[order[first:last]]
+                a = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+                mid = (first + last) // 2
+                part = np.argpartition(block[:, a], mid - first)
+                order[first:last] = order[first:last][part]
+                axis[i] = a
+                split[i] = float(points[order[mid], a])
+                left[i] = node(first, mid)
+                right[i] = node(mid, last)
+            return i
+
+        if len(points):
+            node(0, len(points))
+        return cls(points, group, order, *(np.array(values) for values in
+                                           (axis, split, left, right, start, end)))
+
+    def arrays(self, prefix):
+        """Arrays for np.savez, keyed prefix + field"""
+        return {prefix + field: np.asarray(getattr(self, field)) for field in self.FIELDS}
+
+    @classmethod
+    def from_arrays(cls, data, group, arrays, prefix):
+        return cls(data, group, *(arrays[prefix + field] for field in cls.FIELDS))
+
+    def query(self, q, k, skip):
+        """{id: squared distance} for the k nearest distinct ids (skip[id] = ignore)"""
+        best = {}
+        if not self.start:
+            return best
+        q = np.asarray(q, dtype=np.float32)
+        qs = q.tolist()
+        offsets = [0.0] * len(qs)
+        bound = [float('inf')]
+        points, ids = self.points, self.ids
+        axis, split, left, right = self.axis, self.split, self.left, self.right
+
+        def visit(node, reach):
+            a = axis[node]
+            if a < 0:
+                gap = 0.0
+                for x, (lo, hi) in zip(qs, self.boxes[node]):
+                    if x < lo:
+                        gap += (lo - x) * (lo - x)
+                    elif x > hi:
+                        gap += (x - hi) * (x - hi)
+                if gap >= bound[0]:
+                    return
+                first = self.start[node]
+                dist = ((points[first:self.end[node]] - q) ** 2).sum(axis=1)
+                close = np.flatnonzero(dist < bound[0])
+                close = close[np.argsort(dist[close])]
+                for i, d in zip((close + first).tolist(), dist[close].tolist()):
+                    if d >= bound[0]:
+                        break
+                    ident = ids[i]
+                    if skip[ident] or d >= best.get(ident, bound[0]):
+                        continue
+                    best[ident] = d
+                    if len(best) > k:
+                        del best[max(best, key=best.get)]
+                    if len(best) == k:
+                        bound[0] = max(best.values())
+                return
+            diff = qs[a] - split[node]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            visit(near, reach)
+            old = offsets[a]
+            # Lower bound for the far side: swap this axis's gap for the plane's
+            reach += diff * diff - old * old
+            if reach < bound[0]:
+                offsets[a] = diff
+                visit(far, reach)
+                offsets[a] = old
+
+        visit(0, 0.0)
+        return best
+
+
+# =============================================================================
+# Palette Index
+# =============================================================================
+#
+# Whole-palette queries (theme or image against every theme) do not use a
+# tree: in 18 dimensions a k-d tree ends up visiting most leaves, and one
+# BLAS matrix-vector product over all palettes (|p - q|^2 = |p|^2 - 2 p.q
+# + |q|^2) is faster. Its shortlist is re-ranked with exact distances.
+
+class PaletteIndex:
+    """Theme palettes in OKLab: rows of (ROLES, 3); the color tree covers rows [0, indexed)"""
+
+    def __init__(self, names=(), hashes=(), palettes=None, alive=None, indexed=0,
+                 source=(0, 0), tree=None):
+        self.names = list(names)
+        self.hashes = list(hashes)
+        self.palettes = np.zeros((0, ROLES, 3), np.float32) if palettes is None else palettes
+        self.alive = np.ones(len(self.names), bool) if alive is None else alive
+        self.indexed = indexed
+        self.source = list(source)  # index.json stamp this was synced with
+        self.rows = {name: row for row, name in enumerate(self.names) if self.alive[row]}
+        self.norms = _norms(self.palettes)
+        if tree is None:
+            self.rebuild()
+        else:
+            self.tree = tree
+
+    def __len__(self):
+        return len(self.rows)
+
+    # -- persistence ---------------------------------------------------------
+
+    @classmethod
+    def load(cls, themes_dir):
+        """The saved index, or an empty one if missing or outdated"""
+        try:
+            with np.load(themes_dir / INDEX_FILE) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    return cls()
+                arrays = dict(data)
+        except (OSError, ValueError, KeyError):
+            return cls()
+        palettes, indexed = arrays['palettes'], int(arrays['indexed'])
+        tree = KDTree.from_arrays(palettes[:indexed].reshape(indexed * ROLES, 3), ROLES,
+                                  arrays, 'tree_')
+        return cls(arrays['names'].tolist(), [h.decode() for h in arrays['hashes'].tolist()],
+                   palettes, arrays['alive'], indexed, arrays['source'].tolist(), tree)
+
+    def save(self, themes_dir):
+        path = themes_dir / INDEX_FILE
+        tmp = path.with_name(f'.{INDEX_FILE}.{os.getpid()}.tmp.npz')
+        np.savez(tmp, version=INDEX_VERSION, names=np.array(self.names, dtype=str),
+                 hashes=np.array(self.hashes, dtype='S64'), palettes=self.palettes,
+                 alive=self.alive, indexed=self.indexed, source=np.array(self.source),
+                 **self.tree.arrays('tree_'))
+        os.replace(tmp, path)
+
+    # -- updates -------------------------------------------------------------
+
+    def rebuild(self):
+        """Drop removed rows and rebuild the color tree over every row"""
+        keep = np.flatnonzero(self.alive)
+        self.names = [self.names[row] for row in keep]
+        self.hashes = [self.hashes[row] for row in keep]
+        self.palettes = self.palettes[keep]
+        self.norms = self.norms[keep]
+        self.alive = np.ones(len(keep), bool)
+        self.indexed = len(keep)
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.tree = KDTree.build(self.palettes.reshape(len(keep) * ROLES, 3), ROLES)
+
+    def add(self, palettes):
+        """Insert or replace themes ({name: (hash, [hex per role])}), unindexed"""
+        if not palettes:
+            return
+        self.remove(palettes)
+        first = len(self.names)
+        for row, (name, (digest, _)) in enumerate(palettes.items(), first):
+            self.names.append(name)
+            self.hashes.append(digest)
+            self.rows[name] = row
+        lab = hex_to_oklab([h for _, colors in palettes.values() for h in colors])
+        lab = lab.reshape(-1, ROLES, 3)
+        self.palettes = np.concatenate([self.palettes, lab])
+        self.norms = np.concatenate([self.norms, _norms(lab)])
+        self.alive = np.concatenate([self.alive, np.ones(len(lab), bool)])
+
+    def remove(self, names):
+        for name in names:
+            row = self.rows.pop(name, None)
+            if row is not None:
+                self.alive[row] = False
+
+    def maybe_rebuild(self):
+        """Rebuild once unindexed or removed rows exceed REBUILD_FRACTION"""
+        stale = len(self.names) - self.indexed + int((~self.alive).sum())
+        if stale > max(LEAF_SIZE, REBUILD_FRACTION * len(self.rows)):
+            self.rebuild()
+
+    def sync(self, themes_dir, themes):
+        """Match theme index entries ({name: entry}) and save; returns (added, removed).
+        Only themes whose colors.yaml hash changed are converted again.
+        """
+        changed = {}
+        for name, entry in themes.items():
+            row = self.rows.get(name)
+            if row is not None and self.hashes[row] == entry.get('hash'):
+                continue
+            palette = entry_palette(themes_dir, name, entry)
+            if palette is not None:
+                changed[name] = (entry.get('hash') or '', palette)
+        removed = [name for name in self.rows if name not in themes]
+        self.remove(removed)
+        self.add(changed)
+        self.maybe_rebuild()
+        self.source = _stamp(themes_dir / theme_index.INDEX_FILE)
+        self.save(themes_dir)
+        return sorted(changed), removed
+
+    # -- queries -------------------------------------------------------------
+
+    def _skip(self, exclude=()):
+        skip = ~self.alive
+        if exclude:
+            skip = skip.copy()
+            skip[[self.rows[name] for name in exclude]] = True
+        return skip
+
+    def _results(self, found, scale):
+        """[(name, distance)]; distance is OKLab x100 (~1 = just noticeable)"""
+        return [(self.names[row], 100.0 * (d * scale) ** 0.5) for d, row in found]
+
+    def nearest_color(self, lab, k=10):
+        """Themes with a palette color closest to one OKLab color"""
+        q = np.asarray(lab, dtype=np.float32)
+        skip = self._skip()
+        best = self.tree.query(q, k, skip)
+        # Rows added since the last rebuild are not in the tree yet
+        tail = np.arange(self.indexed, len(self.names))
+        tail = tail[~skip[tail]]
+        if len(tail):
+            dist = ((self.palettes[tail] - q) ** 2).sum(axis=2).min(axis=1)
+            best.update(zip(tail.tolist(), dist.tolist()))
+        return self._results(heapq.nsmallest(k, ((d, row) for row, d in best.items())), 1.0)
+
+    def nearest_palette(self, lab, k=10, exclude=()):
+        """Themes whose palette is closest to a (ROLES, 3) OKLab palette, role by role.
+        The distance is the RMS over roles of the per-color OKLab distance.
+        """
+        q = np.asarray(lab, dtype=np.float32).reshape(ROLES * 3)
+        flat = self.palettes.reshape(-1, ROLES * 3)
+        rank = self.norms - 2.0 * (flat @ q)
+        rank[self._skip(exclude)] = np.inf
+        shortlist = min(len(rank), 2 * k + LEAF_SIZE)
+        if not shortlist:
+            return []
+        rows = np.argpartition(rank, shortlist - 1)[:shortlist]
+        rows = rows[np.isfinite(rank[rows])]
+        dist = ((flat[rows] - q) ** 2).sum(axis=1)
+        return self._results(sorted(zip(dist.tolist(), rows.tolist()))[:k], 1.0 / ROLES)
+
+    def scan_color(self, lab, k=10):
+        """nearest_color by brute force (reference for benchmarks)"""
+        dist = ((self.palettes - np.asarray(lab, np.float32)) ** 2).sum(axis=2).min(axis=1)
+        return self._scan(dist, k, 1.0)
+
+    def scan_palette(self, lab, k=10, exclude=()):
+        """nearest_palette by brute force (reference for benchmarks)"""
+        dist = ((self.palettes - np.asarray(lab, np.float32)) ** 2).sum(axis=(1, 2))
+        dist[self._skip(exclude)] = np.inf
+        return self._scan(dist, k, 1.0 / ROLES)
+
+    def _scan(self, dist, k, scale):
+        dist[~self.alive] = np.inf
+        k = min(k, len(self.rows))
+        rows = np.argpartition(dist, k - 1)[:k] if k else []
+        return self._results(sorted((float(dist[row]), int(row)) for row in rows), scale)
+
+    def palette_of(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            raise KeyError(f"Theme not indexed: {name}")
+        return self.palettes[row]
+
+
+# =============================================================================
+# Sources
+# =============================================================================
+
+def entry_palette(themes_dir, name, entry):
+    """[hex per role] for a theme index entry; entries written before the
+    index recorded palettes are read from colors.yaml. None if unusable.
+    """
+    palette = entry.get('palette')
+    if palette is None:
+        import theme_colors
+        try:
+            colors = theme_colors.load_yaml(themes_dir / name / 'colors.yaml') or {}
+        except Exception as e:
+            print(f"Warning: skipping {name}: {e}", file=sys.stderr)
+            return None
+        palette = theme_index.palette_from_colors(colors)
+    if len(palette) != ROLES or not all(isinstance(h, str) and len(h) == 7 for h in palette):
+        print(f"Warning: skipping {name}: incomplete palette", file=sys.stderr)
+        return None
+    return palette
+
+
+def file_stamps(themes_dir):
+    """Stamps of index.json and the palette index (cache key for resident callers)"""
+    return (_stamp(themes_dir / theme_index.INDEX_FILE), _stamp(themes_dir / INDEX_FILE))
+
+
+def open_index(themes_dir=theme_index.THEMES_DIR):
+    """The palette index, built or synced first if index.json has changed"""
+    if not (themes_dir / theme_index.INDEX_FILE).is_file():
+        theme_index.refresh(themes_dir)
+    index = PaletteIndex.load(themes_dir)
+    if index.source != _stamp(themes_dir / theme_index.INDEX_FILE):
+        with theme_index.locked(themes_dir):
+            index.sync(themes_dir, theme_index.load_index(themes_dir))
+    return index
+
+
+def image_palette(image_path, num_colors=5, algorithm='greedy'):
+    """(ROLES, 3) OKLab palette the theme for an image would get (nothing written)"""
+    ec = _extractor()
+    accents = ec.extract_colors(Path(image_path), num_colors=num_colors,
+                                cache=ec.ExtractionCache(), algorithm=algorithm)
+    mode = ec.determine_theme_mode(accents)
+    accents, surfaces, texts, terminal, _ = ec.build_scheme(accents, mode)
+    colors = ec.build_colors_yaml('query', image_path, accents, surfaces, texts, terminal, mode)
+    return hex_to_oklab(theme_index.palette_from_colors(colors))
+
+
+def similar(index, color=None, image=None, theme=None, k=10, num_colors=5, algorithm='greedy'):
+    """[(theme name, distance)] for one query: a hex color, an image or a theme.
+    Raises ValueError for a malformed color and KeyError for an unknown theme.
+    """
+    if color is not None:
+        lab = hex_to_oklab([color])[0]
+        with timings.stage('query'):
+            return index.nearest_color(lab, k)
+    if image is not None:
+        with timings.stage('extract'):
+            lab = image_palette(image, num_colors, algorithm)
+        with timings.stage('query'):
+            return index.nearest_palette(lab, k)
+    lab = index.palette_of(theme)
+    with timings.stage('query'):
+        return index.nearest_palette(lab, k, exclude=[theme])
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Find themes with similar palettes')
+    parser.add_argument('--themes-dir', default=str(theme_index.THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print a JSON timing record (load/query stages) to stderr')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build', help='Build or sync the index from index.json')
+    p.add_argument('--full', action='store_true', help='Rebuild from scratch')
+
+    for name, arg, text in (('color', 'hex', 'Themes containing a color close to HEX'),
+                            ('image', 'image', 'Themes like the one IMAGE would produce'),
+                            ('theme', 'theme_name', 'Themes like an existing theme')):
+        p = sub.add_parser(name, help=text)
+        p.add_argument(arg)
+        p.add_argument('-k', type=int, default=10, help='Number of results (default: 10)')
+        if name == 'image':
+            p.add_argument('--num-colors', '-n', type=int, default=5)
+            p.add_argument('--algorithm', default='greedy')
+
+    args = parser.parse_args()
+    if np is None:
+        print("Error: numpy required. Install: pip install numpy", file=sys.stderr)
+        sys.exit(1)
+    themes_dir = Path(args.themes_dir).expanduser()
+    record = timings.start('palette_index') if args.timings or timings.requested() else None
+
+    if args.command == 'build':
+        if args.full:
+            (themes_dir / INDEX_FILE).unlink(missing_ok=True)
+        with timings.stage('sync'):
+            index = open_index(themes_dir)
+        print(f"Palette index: {len(index)} themes")
+    else:
+        with timings.stage('load'):
+            index = open_index(themes_dir)
+        query = {'color': getattr(args, 'hex', None), 'theme': getattr(args, 'theme_name', None)}
+        if args.command == 'image':
+            query = {'image': Path(args.image).expanduser(), 'num_colors': args.num_colors,
+                     'algorithm': args.algorithm}
+        try:
+            results = similar(index, k=args.k, **query)
+        except (ValueError, KeyError) as e:
+            print(f"Error: {e.args[0]}", file=sys.stderr)
+            sys.exit(1)
+        for name, distance in results:
+            print(f"{distance:7.2f}  {name}")
+
+    if record:
+        record.emit(stderr=args.timings, command=args.command)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Themix Template Renderer
+Renders every *.template for a theme in a single process.
+Colors come pre-resolved from the theme's colors.json sidecar (overrides.yaml
+merged in; see theme_colors.py), and each template is compiled once into
+literal/placeholder segments.
+A per-theme manifest records each output's template hash and the values of
+the placeholders it uses, so unchanged outputs are not rewritten.
+With $THEMIX_TIMINGS set, per-stage timings are appended there (see timings.py).
+Requires: python3, PyYAML (only to rebuild a stale colors.json)
+"""
+
+import sys
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import theme_colors
+import timings
+
+
+THEMES_DIR = Path(os.environ.get('THEMES_DIR', '~/.config/themes')).expanduser()
+PLACEHOLDER = re.compile(r"\{\{([^}]+)\}\}")
+OOMOX_FILE = 'colors-oomox'  # oomox-cli input for the GTK theme
+
+
+# =============================================================================
+# Color Data
+# =============================================================================
+
+# theme dir -> (file stamps, sidecar); lets long-lived callers skip re-reading
+_colors = {}
+COLORS_CACHE_SIZE = 32
+
+
+def _stamp(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_colors(theme_dir):
+    """Resolved colors for a theme from its colors.json sidecar (rebuilt from
+    colors.yaml + overrides.yaml when stale, see theme_colors.py).
+    Returns (values, oomox): dotted key -> value with overrides merged, and
+    the raw oomox section colors-oomox is built from.
+    Results are cached until either YAML file's mtime or size changes.
+    """
+    stamps = (_stamp(theme_dir / 'colors.yaml'), _stamp(theme_dir / 'overrides.yaml'))
+    cached = _colors.pop(theme_dir, None)
+    if cached and cached[0] == stamps:
+        _colors[theme_dir] = cached
+        return cached[1]['values'], cached[1]['oomox']
+
+    sidecar = theme_colors.load(theme_dir)
+    _colors[theme_dir] = (stamps, sidecar)
+    while len(_colors) > COLORS_CACHE_SIZE:
+        del _colors[next(iter(_colors))]
+    return sidecar['values'], sidecar['oomox']
+
+
+# =============================================================================
+# Templates
+# =============================================================================
+
+# path -> (mtime_ns, segments, digest); lets long-lived callers skip recompiling
+_compiled = {}
+
+
+def compile_template(text):
+    """Split template text into segments: even indices are literal text,
+    odd indices are placeholder key paths."""
+    return PLACEHOLDER.split(text)
+
+
+def load_template(path):
+    """(segments, content digest) for a template file, cached until its mtime changes"""
+    mtime = path.stat().st_mtime_ns
+    cached = _compiled.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+    with open(path, 'r') as f:
+        text = f.read()
+    segments = compile_template(text)
+    digest = hashlib.sha1(text.encode()).hexdigest()
+    _compiled[path] = (mtime, segments, digest)
+    return segments, digest
+
+
+def template_keys(segments):
+    """Sorted set of placeholder key paths a compiled template references"""
+    return sorted(set(segments[1::2]))
+
+
+def inputs_digest(keys, colors):
+    """Hash of the resolved values for a template's placeholders"""
+    values = [(key, colors.get(key)) for key in keys]
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+
+def render(segments, colors, warn=None):
+    """Fill placeholders from colors; unknown keys are left as-is and reported"""
+    out = []
+    for i, segment in enumerate(segments):
+        if i % 2 == 0:
+            out.append(segment)
+            continue
+        value = colors.get(segment)
+        if value is None:
+            if warn:
+                warn(segment)
+            value = "{{" + segment + "}}"
+        out.append(value)
+    return ''.join(out)
+
+
+def find_templates(templates_dir):
+    """All *.template files under templates_dir"""
+    return sorted(templates_dir.rglob('*.template'))
+
+
+def output_path(template, templates_dir, theme_dir, theme_name):
+    """Where a template renders to inside the theme directory"""
+    relative = template.relative_to(templates_dir).as_posix()
+    # Kvantum needs the theme name in its path
+    if relative.startswith('kvantum/'):
+        return theme_dir / 'kvantum' / theme_name / f'{theme_name}.kvconfig'
+    return theme_dir / relative[:-len('.template')]
+
+
+def write_if_changed(path, content):
+    """Write text unless the file already holds it; returns True if written"""
+    try:
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
+
+
+# =============================================================================
+# Build Manifest
+# =============================================================================
+#
+# <theme>/.build/templates.json maps each output (relative to the theme dir)
+# to {template, keys, inputs}: the template digest, the placeholders it uses
+# and a digest of their resolved values. Outputs whose entry still matches,
+# and whose file still exists, are skipped.
+
+def manifest_path(theme_dir):
+    return theme_dir / '.build' / 'templates.json'
+
+
+def load_manifest(theme_dir):
+    """Previous build manifest, or {} if missing/corrupt"""
+    try:
+        with open(manifest_path(theme_dir), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(theme_dir, manifest):
+    path = manifest_path(theme_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def oomox_text(oomox):
+    """colors-oomox content (KEY=value lines) for oomox-cli"""
+    lines = []
+    for key, value in oomox.items():
+        if key in ["roundness", "spacing", "gradient"]:
+            lines.append(key.upper() + "=" + str(value))
+        elif key == "gtk3_generate_dark":
+            lines.append("GTK3_GENERATE_DARK=" + str(value))
+        elif key == "name":
+            lines.append("NAME=" + str(value))
+        else:
+            lines.append(key.upper() + "=" + str(value).lstrip("#"))
+    return "\n".join(lines)
+
+
+def write_oomox_file(oomox, theme_dir):
+    """Write colors-oomox for oomox-cli; returns True if changed"""
+    return write_if_changed(theme_dir / OOMOX_FILE, oomox_text(oomox))
+
+
+def render_theme(theme_name, themes_dir=THEMES_DIR, templates_dir=None, quiet=False,
+                 force=False):
+    """Render templates and colors-oomox for a theme, skipping outputs whose
+    template and placeholder values are unchanged (unless force). Schedules
+    get no colors-oomox, as they have no GTK theme.
+    Returns (rendered paths, unchanged count).
+    """
+    theme_dir = themes_dir / theme_name
+    templates_dir = templates_dir or themes_dir / 'templates'
+    with timings.stage('load_colors'):
+        colors, oomox = load_colors(theme_dir)
+    previous = {} if force else load_manifest(theme_dir)
+    manifest = {}
+
+    def warn(key):
+        print("  Warning: No value for " + key, file=sys.stderr)
+
+    rendered = []
+    unchanged = 0
+    schedule = theme_colors.is_schedule(theme_dir)
+    for template in find_templates(templates_dir):
+        target = output_path(template, templates_dir, theme_dir, theme_name)
+        name = target.relative_to(theme_dir).as_posix()
+        if schedule and name == OOMOX_FILE:
+            continue
+        with timings.stage('compile'):
+            segments, digest = load_template(template)
+            keys = template_keys(segments)
+            entry = {'template': digest, 'keys': keys, 'inputs': inputs_digest(keys, colors)}
+        manifest[name] = entry
+
+        if previous.get(name) == entry and target.exists():
+            unchanged += 1
+            continue
+
+        if not quiet:
+            print(f"  {template.name[:-len('.template')]}")
+        with timings.stage('render'):
+            content = render(segments, colors, warn)
+        with timings.stage('write'):
+            written = write_if_changed(target, content)
+        if written:
+            rendered.append(target)
+        else:
+            unchanged += 1
+
+    with timings.stage('write'):
+        if not schedule:
+            write_oomox_file(oomox, theme_dir)
+        save_manifest(theme_dir, manifest)
+    if not quiet and unchanged:
+        print(f"  ({unchanged} unchanged)")
+    return rendered, unchanged
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render all templates for a theme, replacing {{placeholders}} with colors'
+    )
+    parser.add_argument('theme_name', help='Theme directory name')
+    parser.add_argument('--themes-dir', default=str(THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    parser.add_argument('--templates-dir', default=None,
+                        help='Templates directory (default: <themes-dir>/templates)')
+    parser.add_argument('--force', '-f', action='store_true',
+                        help='Re-render every template, ignoring the build manifest')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Suppress per-template output')
+    args = parser.parse_args()
+
+    themes_dir = Path(args.themes_dir).expanduser()
+    templates_dir = Path(args.templates_dir).expanduser() if args.templates_dir else None
+
+    if not (themes_dir / args.theme_name / 'colors.yaml').is_file():
+        print(f"Error: colors.yaml not found for theme: {args.theme_name}", file=sys.stderr)
+        sys.exit(1)
+
+    recorder = timings.start('render_templates') if timings.requested() else None
+    render_theme(args.theme_name, themes_dir, templates_dir, args.quiet, args.force)
+    if recorder:
+        recorder.emit(theme=args.theme_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,11 @@
 
 THEMES_DIR="${HOME}/.config/themes"
 
-# Get themes list from themix CLI
-themes=$("${THEMES_DIR}/themix" list 2>/dev/null)
+# Ask the themix daemon first (no cold start), then fall back to the CLI
+DAEMON=(python3 "${THEMES_DIR}/scripts/themix_daemon.py" --optional --themes-dir "$THEMES_DIR")
+
+# Get themes list
+themes=$("${DAEMON[@]}" list 2>/dev/null) || themes=$("${THEMES_DIR}/themix" list 2>/dev/null)
 
 # Show in rofi
 selected=$(echo "$themes" | rofi -dmenu -p "Theme" -theme ~/.config/rofi/theme.rasi)
@@ -15,4 +18,6 @@ selected=$(echo "$themes" | rofi -dmenu -p "Theme" -theme ~/.config/rofi/theme.r
 theme_name=$(echo "$selected" | sed 's/^[* ] //')
 
 # Apply the theme
+"${DAEMON[@]}" apply --quiet "$theme_name" && exit 0
+[[ $? -ne 75 ]] && exit 1
 exec "${THEMES_DIR}/themix" apply "$theme_name"
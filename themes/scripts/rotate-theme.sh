@@ -1,38 +1,18 @@
 #!/usr/bin/env bash
 #
 # Themix Theme Rotator
-# Rotate to a random or daily theme
+# Rotate to a random or daily theme, or follow a time-of-day schedule
 
 set -e
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 THEMES_DIR="${THEMES_DIR:-$HOME/.config/themes}"
 
-# Directories to exclude from theme selection
-EXCLUDE_DIRS="scripts templates operations pure loaders current proof-of-concept"
-
-# Get list of available themes
+# Get list of available themes (from the theme index, see theme_index.py;
+# answered by the themix daemon when it is running)
 get_themes() {
-    local themes=()
-    for dir in "${THEMES_DIR}"/*/; do
-        [[ ! -d "$dir" ]] && continue
-        local name=$(basename "$dir")
-
-        # Skip excluded directories
-        local skip=false
-        for exclude in $EXCLUDE_DIRS; do
-            [[ "$name" == "$exclude" ]] && skip=true && break
-        done
-        [[ "$skip" == true ]] && continue
-
-        # Skip hidden directories
-        [[ "$name" == .* ]] && continue
-
-        # Must have colors.yaml to be a valid theme
-        [[ -f "${dir}/colors.yaml" ]] && themes+=("$name")
-    done
-
-    printf '%s\n' "${themes[@]}" | sort
+    python3 "${SCRIPT_DIR}/themix_daemon.py" --optional --themes-dir "$THEMES_DIR" list ||
+        python3 "${SCRIPT_DIR}/theme_index.py" --themes-dir "$THEMES_DIR" list
 }
 
 # Select theme based on mode
@@ -66,14 +46,17 @@ Rotate to a random or daily theme.
 
 Options:
   --daily, -d     Use same theme for the whole day (based on date)
+  --schedule NAME Install the current step of a schedule (theme_schedule.py)
   --random, -r    Random theme selection (default)
   --list, -l      List available themes
   --current, -c   Show current theme
+  --refresh       Re-index themes added or edited by hand
   -h, --help      Show this help message
 
 Examples:
   $0              # Random theme
   $0 --daily      # Same theme all day
+  $0 --schedule day  # From a timer: follow the 'day' schedule
   $0 --list       # List themes
 EOF
 }
@@ -81,6 +64,7 @@ EOF
 main() {
     local mode="random"
     local action="rotate"
+    local schedule=""
 
     while [[ $# -gt 0 ]]; do
         case "$1" in
@@ -92,6 +76,15 @@ main() {
                 mode="random"
                 shift
                 ;;
+            --schedule)
+                action="schedule"
+                schedule="$2"
+                if [[ -z "$schedule" ]]; then
+                    echo "--schedule needs a schedule name"
+                    exit 1
+                fi
+                shift 2
+                ;;
             --list|-l)
                 action="list"
                 shift
@@ -100,6 +93,10 @@ main() {
                 action="current"
                 shift
                 ;;
+            --refresh)
+                action="refresh"
+                shift
+                ;;
             -h|--help)
                 show_usage
                 exit 0
@@ -119,6 +116,9 @@ main() {
                 echo "  $theme"
             done
             ;;
+        refresh)
+            python3 "${SCRIPT_DIR}/theme_index.py" --themes-dir "$THEMES_DIR" refresh
+            ;;
         current)
             if [[ -L "${THEMES_DIR}/current" ]]; then
                 basename "$(readlink "${THEMES_DIR}/current")"
@@ -126,8 +126,19 @@ main() {
                 echo "No current theme set"
             fi
             ;;
+        schedule)
+            # Swaps only the files that changed since the last step, and
+            # re-applies only while the schedule is the current theme
+            python3 "${SCRIPT_DIR}/theme_schedule.py" --themes-dir "$THEMES_DIR" \
+                apply "$schedule" --quiet
+            ;;
         rotate)
             local selected=$(select_theme "$mode")
+            if [[ ! -f "${THEMES_DIR}/${selected}/colors.yaml" ]]; then
+                # Deleted since it was indexed: drop stale entries and pick again
+                python3 "${SCRIPT_DIR}/theme_index.py" --themes-dir "$THEMES_DIR" refresh >/dev/null
+                selected=$(select_theme "$mode")
+            fi
             echo "Applying theme: ${selected}"
             bash "${SCRIPT_DIR}/apply-theme.sh" "$selected"
             ;;
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Themix Theme Colors
+Loads a theme's colors.yaml + overrides.yaml and keeps a pre-resolved
+sidecar, <theme>/colors.json: every leaf as a dotted key -> string value
+with overrides merged in, plus the raw oomox section for colors-oomox.
+Consumers read the sidecar with the json module alone; it is rebuilt from
+YAML whenever either source file's size/mtime (then content hash) differs
+from what the sidecar recorded, so hand edits are picked up.
+YAML I/O uses libyaml (CSafeLoader/CSafeDumper) when PyYAML was built with it.
+Requires: python3, PyYAML (only when the sidecar is missing or stale)
+"""
+
+import sys
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+SIDECAR = 'colors.json'
+SIDECAR_VERSION = 2  # 2: section keys in values
+SOURCES = ('colors.yaml', 'overrides.yaml')
+SCHEDULE_DIR = '.schedule'  # store of a time-of-day schedule (theme_schedule.py)
+
+
+def is_schedule(theme_dir):
+    """True for a schedule theme, whose files are swapped per time-of-day step.
+    Schedules have no GTK theme: oomox-cli is far too slow to run per step."""
+    return (theme_dir / SCHEDULE_DIR).is_dir()
+
+
+# =============================================================================
+# YAML
+# =============================================================================
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:
+        print("Error: PyYAML required. Install: pip install PyYAML", file=sys.stderr)
+        sys.exit(1)
+    return yaml
+
+
+def load_yaml(path):
+    """Parse a YAML file (libyaml loader when available)"""
+    yaml = _yaml()
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def dump_yaml(data, f):
+    """Write data as block-style YAML in insertion order (libyaml dumper when available)"""
+    yaml = _yaml()
+    yaml.dump(data, f, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+              default_flow_style=False, sort_keys=False, allow_unicode=True)
+
+
+def deep_merge(base, override):
+    """Recursively merge override into a copy of base"""
+    result = base.copy()
+    for key, value in override.items():
+        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
+            result[key] = deep_merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def flatten(data, prefix=''):
+    """Dotted key -> str(value) for every leaf (lists are leaves) and every
+    section, so {{section}} renders str(dict) as the per-template renderer did"""
+    values = {}
+    for key, value in data.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            values.update(flatten(value, path + '.'))
+        values[path] = str(value)
+    return values
+
+
+# =============================================================================
+# Sidecar
+# =============================================================================
+
+def _stamp(path):
+    """[mtime_ns, size] of a file, or None if missing"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def source_state(theme_dir, with_hash=True):
+    """{source name: [mtime_ns, size, sha256] or None} for colors.yaml/overrides.yaml"""
+    state = {}
+    for name in SOURCES:
+        stamp = _stamp(theme_dir / name)
+        state[name] = stamp and stamp + [_digest(theme_dir / name) if with_hash else None]
+    return state
+
+
+def is_fresh(sidecar, theme_dir):
+    """True if the sidecar was built from the current colors.yaml/overrides.yaml.
+    A size/mtime match is trusted; otherwise content hashes decide (touch-safe).
+    """
+    if sidecar.get('version') != SIDECAR_VERSION:
+        return False
+    recorded = sidecar.get('sources', {})
+    for name in SOURCES:
+        stamp, saved = _stamp(theme_dir / name), recorded.get(name)
+        if stamp is None or saved is None:
+            if stamp != saved:
+                return False
+        elif stamp != saved[:2] and _digest(theme_dir / name) != saved[2]:
+            return False
+    return True
+
+
+def load_overrides(theme_dir):
+    """The theme's overrides.yaml, or {} if missing or unreadable"""
+    if (theme_dir / 'overrides.yaml').is_file():
+        try:
+            return load_yaml(theme_dir / 'overrides.yaml') or {}
+        except Exception as e:
+            print(f"Warning: ignoring overrides.yaml: {e}", file=sys.stderr)
+    return {}
+
+
+def make_sidecar(colors, overrides, sources):
+    """Sidecar dict for parsed colors and overrides; sources as from source_state"""
+    return {
+        'version': SIDECAR_VERSION,
+        'sources': sources,
+        'values': flatten(deep_merge(colors, overrides)),
+        # colors-oomox is built from colors.yaml alone (overrides not applied)
+        'oomox': {str(k): str(v) for k, v in colors.get('oomox', {}).items()},
+    }
+
+
+def build_sidecar(theme_dir, colors=None):
+    """Sidecar dict from the YAML sources (colors: already-parsed colors.yaml)"""
+    if colors is None:
+        colors = load_yaml(theme_dir / 'colors.yaml')
+    return make_sidecar(colors, load_overrides(theme_dir), source_state(theme_dir))
+
+
+def write_sidecar(theme_dir, sidecar):
+    path = theme_dir / SIDECAR
+    tmp = path.with_name(f'.{SIDECAR}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(sidecar, f, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        # Read-only theme dirs still work, just without the cached sidecar
+        print(f"Warning: could not write {path}: {e}", file=sys.stderr)
+
+
+def update_sidecar(theme_dir, colors=None):
+    """(Re)build and write the sidecar; returns it"""
+    sidecar = build_sidecar(Path(theme_dir), colors)
+    write_sidecar(Path(theme_dir), sidecar)
+    return sidecar
+
+
+def load(theme_dir):
+    """The theme's sidecar, rebuilt first if missing or stale"""
+    theme_dir = Path(theme_dir)
+    try:
+        with open(theme_dir / SIDECAR, 'r') as f:
+            sidecar = json.load(f)
+        if is_fresh(sidecar, theme_dir):
+            state = source_state(theme_dir, with_hash=False)
+            if any(state[name] and state[name][:2] != sidecar['sources'][name][:2]
+                   for name in SOURCES):
+                # Touched but unchanged: record the new stamps so the next
+                # load skips hashing again
+                sidecar['sources'] = source_state(theme_dir)
+                write_sidecar(theme_dir, sidecar)
+            return sidecar
+    except (OSError, ValueError):
+        pass
+    return update_sidecar(theme_dir)
+
+
+def load_values(theme_dir):
+    """Dotted key -> value map with overrides merged (see load)"""
+    return load(theme_dir)['values']
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Read resolved theme colors (via the colors.json sidecar)'
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('get', help='Print values for dotted keys, one per line')
+    p.add_argument('theme_dir')
+    p.add_argument('keys', nargs='+')
+
+    p = sub.add_parser('refresh', help='Rebuild colors.json if stale (or always with --force)')
+    p.add_argument('theme_dir')
+    p.add_argument('--force', '-f', action='store_true')
+
+    args = parser.parse_args()
+    theme_dir = Path(args.theme_dir).expanduser()
+    if not (theme_dir / 'colors.yaml').is_file():
+        print(f"Error: colors.yaml not found in {theme_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == 'refresh':
+        if args.force:
+            update_sidecar(theme_dir)
+        else:
+            load(theme_dir)
+        return
+
+    values = load_values(theme_dir)
+    missing = [key for key in args.keys if key not in values]
+    if missing:
+        print(f"Error: no value for {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+    for key in args.keys:
+        print(values[key])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Themix Theme Index
+Keeps $THEMES_DIR/index.json: one entry per theme (mode, primary accent and
+surface, palette, wallpaper, generation time, colors.yaml hash) so rotation
+and the picker read a single file instead of walking every theme directory.
+extract-colors.py updates entries as it writes themes; `refresh` picks up
+themes added or edited by hand, re-reading only changed colors.yaml files.
+Every index write also updates palette_index.py's similarity index, once
+that has been built.
+Requires: python3, PyYAML (refresh only)
+"""
+
+import sys
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import random
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+
+THEMES_DIR = Path(os.environ.get('THEMES_DIR', '~/.config/themes')).expanduser()
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+
+# Directories that live next to themes but are not themes
+EXCLUDE_DIRS = {'scripts', 'templates', 'operations', 'pure', 'loaders', 'current',
+                'proof-of-concept', 'bench'}
+
+# Colors compared by similarity queries (palette_index.py), in this order
+PALETTE_ROLES = ('accent.primary', 'accent.secondary', 'accent.tertiary',
+                 'accent.quaternary', 'surface.primary', 'surface.secondary')
+
+
+# =============================================================================
+# Entries
+# =============================================================================
+
+def relative_luminance(hex_color):
+    """Luminance (0-1) of a '#RRGGBB' color"""
+    h = hex_color.lstrip('#')
+    r, g, b = (int(h[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+def palette_from_colors(colors):
+    """'#RRGGBB' per PALETTE_ROLES from a parsed colors.yaml (None where missing)"""
+    palette = []
+    for role in PALETTE_ROLES:
+        section, key = role.split('.')
+        palette.append(colors.get(section, {}).get(key))
+    return palette
+
+
+def make_entry(colors, colors_file):
+    """Index entry for a theme from its parsed colors.yaml"""
+    colors_file = Path(colors_file)
+    data = colors_file.read_bytes()
+    st = colors_file.stat()
+    metadata = colors.get('metadata', {})
+    surface = colors.get('surface', {}).get('primary', '#000000')
+    mode = metadata.get('mode') or ('light' if relative_luminance(surface) > 0.5 else 'dark')
+    generated = metadata.get('generated') or \
+        datetime.fromtimestamp(st.st_mtime).isoformat(timespec='seconds')
+    return {
+        'mode': mode,
+        'accent': colors.get('accent', {}).get('primary'),
+        'surface': surface,
+        'palette': palette_from_colors(colors),
+        'wallpaper': metadata.get('wallpaper'),
+        'generated': str(generated),
+        'hash': hashlib.sha256(data).hexdigest(),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+    }
+
+
+def is_theme_dir(path):
+    return (path.is_dir() and path.name not in EXCLUDE_DIRS and not path.name.startswith('.')
+            and (path / 'colors.yaml').is_file())
+
+
+# =============================================================================
+# Index File
+# =============================================================================
+
+@contextmanager
+def locked(themes_dir):
+    """Exclusive lock for read-modify-write of the index"""
+    themes_dir.mkdir(parents=True, exist_ok=True)
+    with open(themes_dir / f'.{INDEX_FILE}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def load_index(themes_dir=THEMES_DIR):
+    """Theme name -> entry; {} if the index is missing or outdated"""
+    try:
+        with open(themes_dir / INDEX_FILE, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get('version') != INDEX_VERSION:
+        return {}
+    return index.get('themes', {})
+
+
+def save_index(themes_dir, themes):
+    path = themes_dir / INDEX_FILE
+    tmp = path.with_name(f'.{INDEX_FILE}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'themes': dict(sorted(themes.items()))},
+                  f, indent=1)
+    os.replace(tmp, path)
+
+
+def scan_themes(themes_dir, old):
+    """Index entries for every theme directory (call under the lock), reusing
+    entries from old whose colors.yaml size/mtime are unchanged.
+    Returns (themes, added or updated names).
+    """
+    import theme_colors
+
+    themes, changed = {}, []
+    for path in sorted(themes_dir.iterdir()):
+        if not is_theme_dir(path):
+            continue
+        colors_file = path / 'colors.yaml'
+        st = colors_file.stat()
+        entry = old.get(path.name)
+        if entry and entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns:
+            themes[path.name] = entry
+            continue
+        try:
+            colors = theme_colors.load_yaml(colors_file) or {}
+            themes[path.name] = make_entry(colors, colors_file)
+            changed.append(path.name)
+        except Exception as e:
+            print(f"Warning: skipping {path.name}: {e}", file=sys.stderr)
+    return themes, changed
+
+
+def update_themes(themes_dir, entries):
+    """Insert or replace entries ({name: entry}) in the index. A missing or
+    outdated index is first built from the theme directories, so it never
+    ends up holding only the new entries; themes deleted since they were
+    indexed are dropped."""
+    with locked(themes_dir):
+        themes = load_index(themes_dir)
+        if not themes:
+            themes, _ = scan_themes(themes_dir, {})
+        themes = {name: entry for name, entry in themes.items()
+                  if is_theme_dir(themes_dir / name)}
+        themes.update(entries)
+        save_index(themes_dir, themes)
+        sync_palettes(themes_dir, themes)
+
+
+def refresh(themes_dir=THEMES_DIR, full=False):
+    """Sync the index with the theme directories.
+    Only colors.yaml files whose size/mtime changed are re-read (all if full).
+    Returns (added or updated, removed) name lists.
+    """
+    with locked(themes_dir):
+        old = {} if full else load_index(themes_dir)
+        themes, changed = scan_themes(themes_dir, old)
+        removed = sorted(set(old) - set(themes))
+        save_index(themes_dir, themes)
+        sync_palettes(themes_dir, themes)
+    return changed, removed
+
+
+def sync_palettes(themes_dir, themes):
+    """Bring an existing palette similarity index up to date (call under the lock).
+    Building it is left to the first query, which also needs NumPy.
+    """
+    import palette_index
+
+    if palette_index.np is None or not (themes_dir / palette_index.INDEX_FILE).is_file():
+        return
+    try:
+        palette_index.PaletteIndex.load(themes_dir).sync(themes_dir, themes)
+    except Exception as e:
+        print(f"Warning: palette index not updated: {e}", file=sys.stderr)
+
+
+def get_themes(themes_dir=THEMES_DIR, mode=None):
+    """Indexed theme names (sorted), building the index on first use"""
+    themes = load_index(themes_dir)
+    if not themes:
+        refresh(themes_dir)
+        themes = load_index(themes_dir)
+    return sorted(name for name, entry in themes.items() if not mode or entry['mode'] == mode)
+
+
+def select_theme(themes, daily=False):
+    """Pick a theme: stable for the day (date seed) or random"""
+    if daily:
+        return themes[int(date.today().strftime('%Y%m%d')) % len(themes)]
+    return random.choice(themes)
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Query and maintain the Themix theme index')
+    parser.add_argument('--themes-dir', default=str(THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('list', help='List indexed themes')
+    p.add_argument('--mode', choices=['dark', 'light'], help='Only themes of this mode')
+    p.add_argument('--long', '-l', action='store_true', help='Show mode, accent and surface')
+
+    p = sub.add_parser('select', help='Print a random (or daily) theme name')
+    p.add_argument('--daily', action='store_true', help='Same theme for the whole day')
+    p.add_argument('--mode', choices=['dark', 'light'], help='Only themes of this mode')
+
+    p = sub.add_parser('refresh', help='Sync index with theme directories')
+    p.add_argument('--full', action='store_true', help='Re-read every colors.yaml')
+
+    sub.add_parser('show', help='Print a theme entry as JSON').add_argument('theme_name')
+
+    args = parser.parse_args()
+    themes_dir = Path(args.themes_dir).expanduser()
+
+    if args.command == 'refresh':
+        changed, removed = refresh(themes_dir, args.full)
+        print(f"Index: {len(changed)} updated, {len(removed)} removed")
+    elif args.command == 'list':
+        names = get_themes(themes_dir, args.mode)
+        index = load_index(themes_dir)
+        for name in names:
+            if args.long:
+                e = index[name]
+                print(f"{name}\t{e['mode']}\t{e['accent']}\t{e['surface']}")
+            else:
+                print(name)
+    elif args.command == 'select':
+        themes = get_themes(themes_dir, args.mode)
+        selected = themes and select_theme(themes, args.daily)
+        if selected and not is_theme_dir(themes_dir / selected):
+            # Deleted since it was indexed: drop stale entries and pick again
+            refresh(themes_dir)
+            themes = get_themes(themes_dir, args.mode)
+            selected = themes and select_theme(themes, args.daily)
+        if not selected:
+            print("No themes found", file=sys.stderr)
+            sys.exit(1)
+        print(selected)
+    elif args.command == 'show':
+        entry = load_index(themes_dir).get(args.theme_name)
+        if entry is None:
+            print(f"Theme not indexed: {args.theme_name}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(entry, indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+"""
+Themix Theme Schedules
+Time-of-day themes: two or more keyframe palettes (existing themes, or
+wallpapers in a given mode) are pinned to times of day and interpolated in
+OKLab into N evenly spaced steps, all steps in one NumPy batch. Contrast is
+then solved for every step at once with the extraction rules (4.5:1 accents,
+CONTRAST_RULES for text and terminal colors), and a build fails if any step
+misses a minimum.
+Every step's colors, templates and Brave images are rendered at build time
+into a compact store inside the schedule's theme directory. `apply` (meant
+for a timer) swaps the current step's files in and runs the apply engine;
+nothing is extracted or rendered at switch time.
+Requires: python3, PyYAML; NumPy and Pillow to build
+"""
+
+import sys
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import zlib
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import build_assets
+import render_templates
+import theme_colors
+import theme_index
+import timings
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+THEMES_DIR = Path(os.environ.get('THEMES_DIR', '~/.config/themes')).expanduser()
+STORE_DIR = theme_colors.SCHEDULE_DIR
+STORE_VERSION = 1
+DAY = 24 * 60  # minutes
+DEFAULT_STEPS = 48  # one step every 30 minutes
+
+# Interpolated roles, in palette column order
+ACCENTS = ('primary', 'secondary', 'tertiary', 'quaternary')
+LEVELS = ('primary', 'secondary', 'tertiary', 'quaternary', 'quinary')
+ROLES = ([('accent', key) for key in ACCENTS] + [('surface', key) for key in LEVELS] +
+         [('text', key) for key in LEVELS] + [('terminal', f'color{i}') for i in range(16)])
+COLUMN = {role: i for i, role in enumerate(ROLES)}
+
+
+def _extractor():
+    """scripts/extract-colors.py as module 'extract_colors' (generators, OKLab)"""
+    if 'extract_colors' not in sys.modules:
+        spec = importlib.util.spec_from_file_location('extract_colors',
+                                                      SCRIPT_DIR / 'extract-colors.py')
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['extract_colors'] = module
+        spec.loader.exec_module(module)
+    return sys.modules['extract_colors']
+
+
+def _hex_rgb(hex_color):
+    h = hex_color.lstrip('#')
+    return tuple(int(h[i:i + 2], 16) for i in (0, 2, 4))
+
+
+# =============================================================================
+# Keyframes
+# =============================================================================
+
+def parse_time(text):
+    """'HH:MM' -> minutes after midnight"""
+    try:
+        hours, minutes = (int(v) for v in text.split(':'))
+    except ValueError:
+        raise ValueError(f"bad time '{text}' (expected HH:MM)")
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"bad time '{text}' (expected HH:MM)")
+    return hours * 60 + minutes
+
+
+def format_time(minutes):
+    minutes = int(round(minutes)) % DAY
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def parse_keyframe(spec):
+    """'HH:MM=SOURCE[:dark|light]' -> (minutes, source, mode or None).
+    SOURCE is a theme name or an image path."""
+    when, sep, source = spec.partition('=')
+    if not sep or not source:
+        raise ValueError(f"bad keyframe '{spec}' (expected HH:MM=THEME-OR-IMAGE[:MODE])")
+    mode = None
+    head, _, tail = source.rpartition(':')
+    if head and tail in ('dark', 'light'):
+        source, mode = head, tail
+    return parse_time(when), source, mode
+
+
+def scheme_roles(accents, surfaces, texts, terminal):
+    """RGB tuples in ROLES order for a generated scheme"""
+    accents = list(accents)
+    while len(accents) < len(ACCENTS):
+        accents.append(accents[-1])
+    groups = {'accent': dict(zip(ACCENTS, accents)), 'surface': surfaces, 'text': texts,
+              'terminal': terminal}
+    return [tuple(groups[group][key]) for group, key in ROLES]
+
+
+def keyframe_palette(source, mode, themes_dir):
+    """(RGB tuples in ROLES order, wallpaper path or None) for one keyframe.
+    A theme is used as it looks now (overrides merged) unless another mode is
+    asked for; then its accents, like a wallpaper's, go through build_scheme
+    (generate_surfaces, generate_text_colors, generate_terminal_colors)."""
+    ec = _extractor()
+    theme_dir = themes_dir / source
+    if (theme_dir / 'colors.yaml').is_file():
+        values = theme_colors.load_values(theme_dir)
+        wallpaper = values.get('metadata.wallpaper')
+        if mode is None or mode == values.get('metadata.mode'):
+            return [_hex_rgb(values[f'{group}.{key}']) for group, key in ROLES], wallpaper
+        accents = [ec.Color.of(_hex_rgb(values[f'accent.{key}'])) for key in ACCENTS]
+    else:
+        image = Path(source).expanduser()
+        if not image.is_file():
+            raise ValueError(f"not a theme or image: {source}")
+        image = image.resolve()
+        accents = ec.extract_colors(image, cache=ec.ExtractionCache())
+        wallpaper = str(image)
+        mode = mode or ec.determine_theme_mode(accents)
+    accents, surfaces, texts, terminal, _ = ec.build_scheme(accents, mode)
+    return scheme_roles(accents, surfaces, texts, terminal), wallpaper
+
+
+# =============================================================================
+# Interpolation
+# =============================================================================
+#
+# Step i starts at i * DAY / N minutes and blends from the last keyframe at or
+# before it to the next one, wrapping past midnight. With a transition time a
+# keyframe holds until that long before the next one, so e.g. morning and
+# night stay put and only dawn and dusk are blended.
+
+def step_weights(times, steps, transition=None):
+    """(step start minutes, keyframe a, keyframe b, weight of b) arrays for
+    sorted, distinct keyframe times"""
+    times = np.asarray(times, dtype=np.float64)
+    clock = np.arange(steps) * (DAY / steps)
+    b = np.searchsorted(times, clock, side='right') % len(times)
+    a = (b - 1) % len(times)
+    span = (times[b] - times[a]) % DAY
+    elapsed = (clock - times[a]) % DAY
+    hold = np.zeros_like(span) if transition is None else np.maximum(span - transition, 0)
+    weight = np.clip((elapsed - hold) / (span - hold), 0.0, 1.0)
+    return clock, a, b, weight
+
+
+def interpolate(palettes, a, b, weight):
+    """(N, R, 3) RGB: each step's blend of keyframe palettes (K, R, 3) in OKLab"""
+    ec = _extractor()
+    k, r, _ = palettes.shape
+    lab = ec.srgb_to_oklab(palettes.reshape(-1, 3)).reshape(k, r, 3)
+    w = weight[:, None, None]
+    mixed = lab[a] * (1 - w) + lab[b] * w
+    rgb = np.rint(ec.oklab_to_srgb(mixed.reshape(-1, 3)))
+    return rgb.astype(np.int64).reshape(len(weight), r, 3)
+
+
+def solve_contrast(steps_rgb):
+    """Enforce the extraction contrast minimums against each step's
+    surface.primary, every step in one ensure_contrast_batch call.
+    Returns [(accents, surfaces, texts, terminal, tightest)] per step, where
+    tightest is (role, ratio, minimum) for the pair closest to its minimum.
+    Raises ValueError if any step misses a minimum.
+    """
+    ec = _extractor()
+    rules = [('accent', key, 4.5) for key in ACCENTS] + list(ec.CONTRAST_RULES)
+    fgs, bgs, ratios = [], [], []
+    for rgb in steps_rgb.tolist():
+        bg = ec.Color.of(rgb[COLUMN['surface', 'primary']])
+        for group, key, min_ratio in rules:
+            fgs.append(rgb[COLUMN[group, key]])
+            bgs.append(bg)
+            ratios.append(min_ratio or 1.0)
+    with timings.stage('contrast'):
+        fixed = ec.ensure_contrast_batch(fgs, bgs, ratios)
+
+    schemes = []
+    failures = []
+    for i, rgb in enumerate(steps_rgb.tolist()):
+        groups = {'accent': {}, 'surface': {}, 'text': {}, 'terminal': {}}
+        for (group, key), color in zip(ROLES, rgb):
+            groups[group][key] = ec.Color.of(color)
+        bg = groups['surface']['primary']
+        tightest = None
+        for j, (group, key, min_ratio) in enumerate(rules):
+            color = fixed[i * len(rules) + j]
+            groups[group][key] = color
+            if not min_ratio:
+                continue
+            ratio = ec.contrast_ratio(bg, color)
+            if ratio < min_ratio:
+                failures.append((i, f'{group}.{key}', ratio, min_ratio))
+            if tightest is None or ratio / min_ratio < tightest[1] / tightest[2]:
+                tightest = (f'{group}.{key}', round(ratio, 2), min_ratio)
+        accents = [groups['accent'][key] for key in ACCENTS]
+        schemes.append((accents, groups['surface'], groups['text'], groups['terminal'],
+                        tightest))
+    if failures:
+        i, role, ratio, min_ratio = failures[0]
+        raise ValueError(f"step {i}: {role} reaches only {ratio:.2f}:1 (min {min_ratio}); "
+                         f"{len(failures)} pairs below their minimum")
+    return schemes
+
+
+# =============================================================================
+# Step Rendering
+# =============================================================================
+
+def render_step(colors, name, schedule_dir, templates_dir, overrides, overrides_state):
+    """{path relative to the theme dir: bytes} for one step: colors.yaml, its
+    colors.json sidecar, every template, the Brave images and
+    the build records that tell render_templates and build_assets they are
+    current"""
+    out = StringIO()
+    theme_colors.dump_yaml(colors, out)
+    colors_yaml = out.getvalue().encode()
+    files = {'colors.yaml': colors_yaml}
+
+    # The sidecar's colors.yaml stamp cannot know the mtime after a swap, so
+    # the first load confirms it by content hash
+    sources = {'colors.yaml': [0, len(colors_yaml), hashlib.sha256(colors_yaml).hexdigest()],
+               'overrides.yaml': overrides_state}
+    sidecar = theme_colors.make_sidecar(colors, overrides, sources)
+    files['colors.json'] = json.dumps(sidecar, indent=1).encode()
+    values = sidecar['values']
+
+    manifest = {}
+    for template in render_templates.find_templates(templates_dir):
+        segments, digest = render_templates.load_template(template)
+        keys = render_templates.template_keys(segments)
+        target = render_templates.output_path(template, templates_dir, schedule_dir, name)
+        relative = target.relative_to(schedule_dir).as_posix()
+        if relative == render_templates.OOMOX_FILE:
+            continue
+        manifest[relative] = {'template': digest, 'keys': keys,
+                              'inputs': render_templates.inputs_digest(keys, values)}
+        files[relative] = render_templates.render(segments, values).encode()
+    files['.build/templates.json'] = json.dumps(manifest, indent=1, sort_keys=True).encode()
+
+    if any(path.startswith('brave-theme/') for path in manifest):
+        for image, data in build_assets.brave_image_data(values).items():
+            files[f'brave-theme/images/{image}'] = data
+        overrides_data = b''
+        if (schedule_dir / 'overrides.yaml').is_file():
+            overrides_data = (schedule_dir / 'overrides.yaml').read_bytes()
+        digest = hashlib.sha256(colors_yaml + overrides_data).hexdigest()
+        files['.build/brave.sha256'] = (digest + '\n').encode()
+    return files
+
+
+# =============================================================================
+# Store
+# =============================================================================
+#
+# <schedule>/.schedule/schedule.json lists the keyframes, every file path a
+# step writes, and per step its start time, mode, wallpaper, tightest contrast
+# pair and files (one blob number per path, null if the step lacks it).
+# Blob contents live once each in blobs-<digest>.pack. The first blob of a
+# path is zlib-compressed on its own and is the compression dictionary for
+# that path's other versions, which share most of their text.
+# 'current' holds the number of the step installed in the theme directory.
+
+class PackWriter:
+    """Appends deduplicated, compressed blobs to an open pack file"""
+
+    def __init__(self, f):
+        self.f = f
+        self.blobs = []  # [offset, length, dictionary blob or -1]
+        self.seen = {}  # content digest -> blob number
+        self.bases = {}  # path -> (blob number, content)
+        self.digest = hashlib.sha256()
+
+    def add(self, path, data):
+        """Blob number holding data (a version of path)"""
+        key = hashlib.sha256(data).digest()
+        if key in self.seen:
+            return self.seen[key]
+        base = self.bases.get(path)
+        if base is None:
+            packed, dictionary = zlib.compress(data, 9), -1
+            self.bases[path] = (len(self.blobs), data)
+        else:
+            compressor = zlib.compressobj(9, zdict=base[1])
+            packed, dictionary = compressor.compress(data) + compressor.flush(), base[0]
+        self.seen[key] = len(self.blobs)
+        self.blobs.append([self.f.tell(), len(packed), dictionary])
+        self.f.write(packed)
+        self.digest.update(packed)
+        return self.seen[key]
+
+
+class PackReader:
+    """Reads blobs back from a pack, keeping dictionary blobs once read"""
+
+    def __init__(self, path, blobs):
+        self.f = open(path, 'rb')
+        self.blobs = blobs
+        self.bases = {}
+
+    def read(self, number):
+        offset, length, dictionary = self.blobs[number]
+        self.f.seek(offset)
+        packed = self.f.read(length)
+        if dictionary < 0:
+            return zlib.decompress(packed)
+        if dictionary not in self.bases:
+            self.bases[dictionary] = self.read(dictionary)
+        decompressor = zlib.decompressobj(zdict=self.bases[dictionary])
+        return decompressor.decompress(packed) + decompressor.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def store_path(schedule_dir):
+    return schedule_dir / STORE_DIR
+
+
+def load_store(schedule_dir):
+    try:
+        with open(store_path(schedule_dir) / 'schedule.json', 'r') as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        raise ValueError(f"No schedule in {schedule_dir} (run: theme_schedule.py build)")
+    if info.get('version') != STORE_VERSION:
+        raise ValueError(f"Schedule store version {info.get('version')} is not supported; "
+                         f"rebuild it")
+    return info
+
+
+def open_pack(schedule_dir, info):
+    return PackReader(store_path(schedule_dir) / info['pack'], info['blobs'])
+
+
+def current_step(schedule_dir):
+    try:
+        return int((store_path(schedule_dir) / 'current').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def link_wallpaper(schedule_dir, wallpaper):
+    """Point wallpaper.<ext> at the step's wallpaper, if it changed"""
+    if not wallpaper:
+        return
+    source = Path(wallpaper)
+    ext = source.suffix.lower()
+    link = schedule_dir / ('wallpaper.jpg' if ext in ('.jpg', '.jpeg') else f'wallpaper{ext}')
+    if link.is_symlink() and os.readlink(link) == str(source):
+        return
+    for old in schedule_dir.glob('wallpaper.*'):
+        if old.is_symlink():
+            old.unlink()
+    link.symlink_to(source)
+
+
+def install_step(schedule_dir, info, index):
+    """Swap step `index` into the schedule's theme directory. Only files whose
+    content differs from the installed step are written, each through a
+    rename so readers never see a partial file. Returns the number written."""
+    steps = info['steps']
+    previous = current_step(schedule_dir)
+    old = steps[previous]['files'] if previous is not None and previous < len(steps) else None
+    written = 0
+    with open_pack(schedule_dir, info) as pack:
+        for i, (relative, blob) in enumerate(zip(info['paths'], steps[index]['files'])):
+            target = schedule_dir / relative
+            if blob is None:
+                if old and old[i] is not None:
+                    target.unlink(missing_ok=True)
+            elif not (old and old[i] == blob and target.exists()):
+                _write_atomic(target, pack.read(blob))
+                written += 1
+    link_wallpaper(schedule_dir, steps[index].get('wallpaper'))
+    (store_path(schedule_dir) / 'current').write_text(f'{index}\n')
+    return written
+
+
+def index_schedule(name, themes_dir):
+    """Refresh the schedule's theme index entry (its mode changes with the step)"""
+    colors_file = themes_dir / name / 'colors.yaml'
+    entry = theme_index.make_entry(theme_colors.load_yaml(colors_file), colors_file)
+    theme_index.update_themes(themes_dir, {name: entry})
+
+
+# =============================================================================
+# Build & Apply
+# =============================================================================
+
+def build_schedule(name, keyframes, themes_dir=THEMES_DIR, steps=DEFAULT_STEPS,
+                   transition=None, templates_dir=None, quiet=False):
+    """Interpolate keyframes [(minutes, source, mode)] into `steps` steps,
+    render them all into <themes_dir>/<name>/.schedule and install the step
+    for the current time. Returns the store info."""
+    if np is None:
+        raise RuntimeError("numpy required. Install: pip install numpy")
+    if steps < 1:
+        raise ValueError("steps must be at least 1")
+    if transition is not None and transition <= 0:
+        raise ValueError("transition must be positive")
+    keyframes = sorted(keyframes)
+    times = [minutes for minutes, _, _ in keyframes]
+    if len(keyframes) < 2 or len(set(times)) != len(times):
+        raise ValueError("need two or more keyframes at distinct times")
+    if name in {source for _, source, _ in keyframes}:
+        raise ValueError(f"a schedule cannot use itself ({name}) as a keyframe")
+
+    ec = _extractor()
+    templates_dir = templates_dir or themes_dir / 'templates'
+    schedule_dir = themes_dir / name
+    schedule_dir.mkdir(parents=True, exist_ok=True)
+
+    with timings.stage('keyframes'):
+        sources = [keyframe_palette(source, mode, themes_dir) for _, source, mode in keyframes]
+    palettes = np.array([roles for roles, _ in sources], dtype=np.int64)
+    wallpapers = [wallpaper for _, wallpaper in sources]
+
+    with timings.stage('interpolate'):
+        clock, a, b, weight = step_weights(times, steps, transition)
+        steps_rgb = interpolate(palettes, a, b, weight)
+    schemes = solve_contrast(steps_rgb)
+
+    overrides = theme_colors.load_overrides(schedule_dir)
+    overrides_state = theme_colors.source_state(schedule_dir)['overrides.yaml']
+    store = store_path(schedule_dir)
+    store.mkdir(exist_ok=True)
+    (store / 'current').unlink(missing_ok=True)
+    # No GTK theme for schedules (theme_colors.is_schedule): drop a leftover
+    # colors-oomox so build_assets never starts an oomox-cli build for a step
+    (schedule_dir / render_templates.OOMOX_FILE).unlink(missing_ok=True)
+
+    info = {
+        'version': STORE_VERSION,
+        'name': name,
+        'keyframes': [{'time': format_time(minutes), 'source': source, 'mode': mode}
+                      for minutes, source, mode in keyframes],
+        'transition': transition,
+        'built': datetime.now().isoformat(timespec='seconds'),
+        'paths': [],
+        'steps': [],
+    }
+    columns = {}
+    pack_tmp = store / f'.blobs.{os.getpid()}.tmp'
+    with open(pack_tmp, 'wb') as f:
+        pack = PackWriter(f)
+        for i, (accents, surfaces, texts, terminal, tightest) in enumerate(schemes):
+            near = b[i] if weight[i] >= 0.5 else a[i]
+            wallpaper = wallpapers[near] or wallpapers[a[i]] or wallpapers[b[i]]
+            mode = 'light' if surfaces['primary'].lightness > 0.5 else 'dark'
+            with timings.stage('schema'):
+                colors = ec.build_colors_yaml(name, wallpaper or name, accents, surfaces,
+                                              texts, terminal, mode)
+                colors['metadata']['schedule'] = {'step': i, 'steps': steps,
+                                                  'time': format_time(clock[i])}
+            with timings.stage('render'):
+                files = render_step(colors, name, schedule_dir, templates_dir, overrides,
+                                    overrides_state)
+            blobs = [None] * len(info['paths'])
+            with timings.stage('pack'):
+                for relative, data in files.items():
+                    if relative not in columns:
+                        columns[relative] = len(info['paths'])
+                        info['paths'].append(relative)
+                        blobs.append(None)
+                    blobs[columns[relative]] = pack.add(relative, data)
+            info['steps'].append({'time': format_time(clock[i]), 'mode': mode,
+                                  'wallpaper': wallpaper, 'tightest': tightest,
+                                  'files': blobs})
+    for step in info['steps']:
+        step['files'] += [None] * (len(info['paths']) - len(step['files']))
+    info['blobs'] = pack.blobs
+
+    # The old pack stays readable until schedule.json points at the new one
+    info['pack'] = f'blobs-{pack.digest.hexdigest()[:16]}.pack'
+    os.replace(pack_tmp, store / info['pack'])
+    _write_atomic(store / 'schedule.json', json.dumps(info, indent=1).encode())
+    for old in store.glob('blobs-*.pack'):
+        if old.name != info['pack']:
+            old.unlink()
+
+    index = step_at(info, minutes_now())
+    install_step(schedule_dir, info, index)
+    index_schedule(name, themes_dir)
+    if not quiet:
+        size = (store / info['pack']).stat().st_size
+        print(f"Schedule '{name}': {steps} steps from {len(keyframes)} keyframes, "
+              f"{len(info['blobs'])} distinct files, {size / 1024:.0f} KiB pack")
+        print(f"Installed step {index} ({info['steps'][index]['time']})")
+    return info
+
+
+def minutes_now():
+    now = datetime.now()
+    return now.hour * 60 + now.minute
+
+
+def step_at(info, minutes):
+    """Index of the step in effect at a time of day"""
+    return int(minutes * len(info['steps']) // DAY) % len(info['steps'])
+
+
+def apply_schedule(name, themes_dir=THEMES_DIR, minutes=None, activate=False, quiet=False):
+    """Install the step for `minutes` (default: now) if it is not installed
+    yet, then run the apply engine when the schedule is the current theme (or
+    activate is set). Returns the step index."""
+    schedule_dir = themes_dir / name
+    info = load_store(schedule_dir)
+    index = step_at(info, minutes_now() if minutes is None else minutes)
+    changed = current_step(schedule_dir) != index
+    if changed:
+        with timings.stage('swap'):
+            written = install_step(schedule_dir, info, index)
+        index_schedule(name, themes_dir)
+        if not quiet:
+            print(f"Step {index} ({info['steps'][index]['time']}, "
+                  f"{info['steps'][index]['mode']}): {written} files swapped")
+
+    current = themes_dir / 'current'
+    active = current.is_symlink() and Path(os.readlink(current)).name == name
+    if activate or (changed and active):
+        import apply_engine
+        with timings.stage('apply'):
+            apply_engine.apply_theme(name, themes_dir)
+    return index
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def show_schedule(name, themes_dir):
+    schedule_dir = themes_dir / name
+    info = load_store(schedule_dir)
+    installed = current_step(schedule_dir)
+    keyframes = ', '.join(f"{k['time']} {k['source']}" + (f":{k['mode']}" if k['mode'] else '')
+                          for k in info['keyframes'])
+    print(f"Schedule '{name}' (built {info['built']}): {keyframes}")
+    print(f"{'step':>4}  {'time':<5}  {'mode':<5}  {'surface':<7}  tightest contrast")
+    colors_json = info['paths'].index('colors.json')
+    with open_pack(schedule_dir, info) as pack:
+        for i, step in enumerate(info['steps']):
+            values = json.loads(pack.read(step['files'][colors_json]))['values']
+            role, ratio, min_ratio = step['tightest']
+            marker = '*' if i == installed else ' '
+            print(f"{i:>4}{marker} {step['time']:<5}  {step['mode']:<5}  "
+                  f"{values['surface.primary']:<7}  {ratio:.2f} ({role}, min {min_ratio})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time-of-day theme schedules interpolated between keyframe palettes',
+        epilog='Example: theme_schedule.py build dayglow --keyframe 07:00=sunset:light '
+               '--keyframe 20:00=sunset:dark --transition 90'
+    )
+    parser.add_argument('--themes-dir', default=str(THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print a JSON timing record to stderr')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build', help='Interpolate keyframes and pre-render every step')
+    p.add_argument('name', help='Schedule (theme directory) name')
+    p.add_argument('--keyframe', '-k', action='append', required=True,
+                   metavar='HH:MM=SOURCE[:MODE]',
+                   help='Palette at a time of day: a theme name or image path, '
+                        'optionally with dark/light (repeat for each keyframe)')
+    p.add_argument('--steps', '-n', type=int, default=DEFAULT_STEPS,
+                   help=f'Steps over the day (default: {DEFAULT_STEPS}, every 30 minutes)')
+    p.add_argument('--transition', type=float, metavar='MINUTES',
+                   help='Hold each keyframe and blend only this long before the next '
+                        '(default: blend across the whole gap)')
+    p.add_argument('--templates-dir', help='Templates directory (default: <themes-dir>/templates)')
+    p.add_argument('--quiet', '-q', action='store_true')
+
+    p = sub.add_parser('apply', help='Swap in the step for now (for a timer)')
+    p.add_argument('name')
+    p.add_argument('--at', metavar='HH:MM', help='Time of day to use instead of now')
+    p.add_argument('--activate', action='store_true',
+                   help='Apply the schedule even if it is not the current theme')
+    p.add_argument('--quiet', '-q', action='store_true')
+
+    p = sub.add_parser('show', help='List steps with their mode and tightest contrast')
+    p.add_argument('name')
+
+    args = parser.parse_args()
+    themes_dir = Path(args.themes_dir).expanduser()
+    recorder = timings.start('theme_schedule') if args.timings or timings.requested() else None
+
+    try:
+        if args.command == 'build':
+            keyframes = [parse_keyframe(spec) for spec in args.keyframe]
+            templates_dir = Path(args.templates_dir).expanduser() if args.templates_dir else None
+            build_schedule(args.name, keyframes, themes_dir, args.steps, args.transition,
+                           templates_dir, args.quiet)
+        elif args.command == 'apply':
+            minutes = parse_time(args.at) if args.at else None
+            apply_schedule(args.name, themes_dir, minutes, args.activate, args.quiet)
+        else:
+            show_schedule(args.name, themes_dir)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if recorder:
+        recorder.emit(stderr=args.timings, command=args.command)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Themix Daemon
+Keeps the extractor, renderer and apply engine loaded in one long-running
+process and serves extract/render/apply/list/similar requests over a Unix socket,
+so a theme switch from a keybind costs a socket round trip instead of
+several cold Python starts. Parsed templates and colors.yaml data stay
+cached between requests (keyed by file mtime).
+
+The same script is the thin client: everything except `serve` only needs
+the standard library, and exits with EX_UNAVAILABLE (75) when no daemon is
+listening so shell callers can fall back to the standalone scripts.
+Requires: python3 (client); PyYAML, Pillow (daemon)
+"""
+
+import sys
+import argparse
+import json
+import os
+import socket
+import time
+from pathlib import Path
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+THEMES_DIR = Path(os.environ.get('THEMES_DIR', '~/.config/themes')).expanduser()
+RUNTIME_DIR = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+SOCKET_PATH = Path(os.environ.get('THEMIX_SOCKET') or
+                   Path(RUNTIME_DIR) / f'themix-{os.getuid()}.sock')
+
+EX_UNAVAILABLE = 75  # no daemon listening; caller should use the cold path
+START_TIMEOUT = 10.0
+
+# Protocol: one JSON object per line each way, one request per connection.
+#   request:  {"op": "apply", "theme": "sunset", "themes_dir": "...", ...}
+#   response: {"ok": true, "result": ..., "stdout": "...", "stderr": "...",
+#              "seconds": 0.012}   or   {"ok": false, "error": "...", ...}
+
+
+# =============================================================================
+# Server
+# =============================================================================
+
+class Engine:
+    """Warm state shared by all requests: loaded modules and the extraction cache"""
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        import importlib.util
+        sys.path.insert(0, str(SCRIPT_DIR))
+        spec = importlib.util.spec_from_file_location('extract_colors',
+                                                      SCRIPT_DIR / 'extract-colors.py')
+        self.extract = importlib.util.module_from_spec(spec)
+        sys.modules['extract_colors'] = self.extract
+        spec.loader.exec_module(self.extract)
+
+        import apply_engine
+        import build_assets
+        import render_templates
+        import theme_index
+        self.apply_engine = apply_engine
+        self.build_assets = build_assets
+        self.render_templates = render_templates
+        self.theme_index = theme_index
+        self.cache = self.extract.ExtractionCache()
+        self.palettes = {}  # themes dir -> (file stamps, loaded palette index)
+        self.socket_path = socket_path
+        self.started = time.time()
+        self.served = 0
+
+    def themes_dir(self, request):
+        return Path(request.get('themes_dir') or THEMES_DIR).expanduser()
+
+    def theme_dir(self, request):
+        theme = request.get('theme')
+        if not theme:
+            raise ValueError("missing 'theme'")
+        path = self.themes_dir(request) / theme
+        if not path.is_dir():
+            raise ValueError(f"Theme not found: {path}")
+        return path
+
+    # -- operations ----------------------------------------------------------
+
+    def op_ping(self, request):
+        return {'pid': os.getpid(), 'uptime': round(time.time() - self.started, 1),
+                'served': self.served, 'socket': str(self.socket_path)}
+
+    def op_list(self, request):
+        return self.theme_index.get_themes(self.themes_dir(request), request.get('mode'))
+
+    def op_similar(self, request):
+        import palette_index
+        themes_dir = self.themes_dir(request)
+        stamps, index = self.palettes.get(themes_dir, (None, None))
+        if stamps != palette_index.file_stamps(themes_dir):
+            index = palette_index.open_index(themes_dir)
+            self.palettes[themes_dir] = (palette_index.file_stamps(themes_dir), index)
+        query = {key: request[key] for key in ('color', 'image', 'theme', 'num_colors',
+                                               'algorithm') if request.get(key) is not None}
+        if not {'color', 'image', 'theme'} & set(query):
+            raise ValueError("missing 'color', 'image' or 'theme'")
+        start = time.perf_counter()
+        results = palette_index.similar(index, k=request.get('k', 10), **query)
+        return {'themes': results, 'query_ms': round((time.perf_counter() - start) * 1000, 3)}
+
+    def op_extract(self, request):
+        image = Path(request['image']).expanduser().resolve()
+        if not image.is_file():
+            raise ValueError(f"Image not found: {image}")
+        theme = request.get('theme') or self.extract.theme_name_from_path(image)
+        options = {key: request[key] for key in
+                   ('num_colors', 'mode', 'sample_size', 'fast_decode', 'algorithm',
+                    'max_memory')
+                   if request.get(key) is not None}
+        output_dir, entry = self.extract.generate_theme(
+            image, theme, self.themes_dir(request), quiet=request.get('quiet', False),
+            cache=None if request.get('no_cache') else self.cache, **options)
+        return {'theme': theme, 'path': str(output_dir), 'entry': entry}
+
+    def op_render(self, request):
+        self.theme_dir(request)
+        themes_dir = self.themes_dir(request)
+        force = request.get('force', False)
+        rendered, unchanged = self.render_templates.render_theme(
+            request['theme'], themes_dir, quiet=request.get('quiet', False), force=force)
+        # Brave images and the GTK build: only when something they depend on
+        # may have changed (the build stamps skip the rest)
+        assets = request.get('assets', True) and (
+            bool(rendered) or force or not (themes_dir / request['theme'] / '.build').is_dir())
+        if assets:
+            self.build_assets.build_themes([request['theme']], themes_dir, force,
+                                           quiet=request.get('quiet', False))
+        return {'rendered': len(rendered), 'unchanged': unchanged, 'assets': assets}
+
+    def op_apply(self, request):
+        theme_dir = self.theme_dir(request)
+        for required in ('waybar-themix.css', 'kitty.conf'):
+            if not (theme_dir / required).is_file():
+                raise ValueError(f"Missing required file: {required} "
+                                 f"(run: process-templates.sh {request['theme']})")
+        render = self.op_render(dict(request, quiet=True))
+        hooks = self.apply_engine.apply_theme(request['theme'], self.themes_dir(request),
+                                              request.get('force', False))
+        return {'render': render, 'hooks': hooks}
+
+    def handle(self, request):
+        """Run one request with its output captured; returns the response dict"""
+        import contextlib
+        import io
+
+        handler = getattr(self, f"op_{request.get('op')}", None)
+        out, err = io.StringIO(), io.StringIO()
+        start = time.perf_counter()
+        response = {}
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                if handler is None:
+                    raise ValueError(f"unknown op: {request.get('op')}")
+                response = {'ok': True, 'result': handler(request)}
+            except SystemExit as e:
+                response = {'ok': False, 'error': f"exited with status {e.code}"}
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        self.served += 1
+        response.update(stdout=out.getvalue(), stderr=err.getvalue(),
+                        seconds=round(time.perf_counter() - start, 4))
+        return response
+
+
+def serve(socket_path=SOCKET_PATH, quiet=False):
+    """Listen on socket_path until a stop request or SIGTERM"""
+    import signal
+    import socketserver
+    import threading
+
+    if ping(socket_path) is not None:
+        print(f"Daemon already running on {socket_path}", file=sys.stderr)
+        return 1
+    if socket_path.exists() or socket_path.is_symlink():
+        socket_path.unlink()  # stale socket from a crashed daemon
+
+    start = time.perf_counter()
+    engine = Engine(socket_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {'ok': False, 'error': 'malformed request'}
+            else:
+                if request.get('op') == 'stop':
+                    response = {'ok': True, 'result': 'stopping'}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    response = engine.handle(request)
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+    # Requests are handled one at a time: theme operations must not interleave,
+    # and output capture swaps the process-wide stdout/stderr
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(str(socket_path), Handler)
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    if not quiet:
+        print(f"themix daemon {os.getpid()} listening on {socket_path} "
+              f"(ready in {time.perf_counter() - start:.2f}s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            socket_path.unlink()
+        except OSError:
+            pass
+    return 0
+
+
+# =============================================================================
+# Client
+# =============================================================================
+
+def request(payload, socket_path=SOCKET_PATH, timeout=None):
+    """Send one request; returns the response dict, or None if no daemon is listening"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(payload).encode() + b'\n')
+        stream.flush()
+        line = stream.readline()
+    return json.loads(line) if line else None
+
+
+def ping(socket_path=SOCKET_PATH):
+    try:
+        response = request({'op': 'ping'}, socket_path, timeout=2.0)
+    except (OSError, ValueError):
+        return None
+    return response and response.get('result')
+
+
+def start(socket_path=SOCKET_PATH):
+    """Launch a detached daemon and wait until it answers"""
+    import subprocess
+    if ping(socket_path) is not None:
+        return True
+    subprocess.Popen([sys.executable, str(Path(__file__).resolve()), '--socket',
+                      str(socket_path), 'serve', '--quiet'],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if ping(socket_path) is not None:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Themix daemon and client (extract/render/apply/list/similar over a '
+                    'Unix socket)',
+        epilog=f'Client commands exit with {EX_UNAVAILABLE} when no daemon is running.'
+    )
+    parser.add_argument('--socket', default=str(SOCKET_PATH),
+                        help='Socket path (default: $THEMIX_SOCKET or '
+                             '$XDG_RUNTIME_DIR/themix-<uid>.sock)')
+    parser.add_argument('--themes-dir', default=str(THEMES_DIR),
+                        help='Themes directory (default: $THEMES_DIR or ~/.config/themes)')
+    parser.add_argument('--optional', action='store_true',
+                        help=f'Exit {EX_UNAVAILABLE} silently if no daemon is running '
+                             '(for scripts with a fallback)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('serve', help='Run the daemon in the foreground')
+    p.add_argument('--quiet', '-q', action='store_true', help='No startup message')
+    sub.add_parser('start', help='Start the daemon in the background')
+    sub.add_parser('stop', help='Stop the running daemon')
+    sub.add_parser('status', help='Show daemon pid, uptime and requests served')
+
+    p = sub.add_parser('extract', help='Generate colors.yaml for an image')
+    p.add_argument('image')
+    p.add_argument('theme_name', nargs='?')
+    p.add_argument('--mode', choices=['dark', 'light', 'auto'])
+    p.add_argument('--num-colors', type=int)
+    p.add_argument('--algorithm')
+    p.add_argument('--sample-size', type=int)
+    p.add_argument('--fast-decode', action='store_true', default=None)
+    p.add_argument('--max-memory', type=float, metavar='MB',
+                   help='Read larger decodes in bands (see extract-colors.py)')
+    p.add_argument('--no-cache', action='store_true')
+    p.add_argument('--quiet', '-q', action='store_true')
+
+    for name, text in (('render', 'Render templates (and changed assets) for a theme'),
+                       ('apply', 'Render if needed and apply a theme')):
+        p = sub.add_parser(name, help=text)
+        p.add_argument('theme_name')
+        p.add_argument('--force', '-f', action='store_true')
+        p.add_argument('--quiet', '-q', action='store_true')
+        if name == 'render':
+            p.add_argument('--no-assets', action='store_true',
+                           help='Templates only; skip the Brave/GTK builds')
+
+    p = sub.add_parser('list', help='List indexed themes')
+    p.add_argument('--mode', choices=['dark', 'light'])
+
+    p = sub.add_parser('similar', help='Themes with palettes like a color, image or theme')
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument('--color', help="Hex color, e.g. '#ff6600'")
+    group.add_argument('--image', help='Wallpaper to compare (nothing is written)')
+    group.add_argument('--theme', help='Existing theme to compare')
+    p.add_argument('-k', type=int, default=10, help='Number of results (default: 10)')
+
+    args = parser.parse_args()
+    socket_path = Path(args.socket).expanduser()
+
+    if args.command == 'serve':
+        sys.exit(serve(socket_path, args.quiet))
+    if args.command == 'start':
+        if not start(socket_path):
+            print("Error: daemon did not start", file=sys.stderr)
+            sys.exit(1)
+        return
+    if args.command == 'status':
+        info = ping(socket_path)
+        if info is None:
+            print("themix daemon not running", file=sys.stderr)
+            sys.exit(EX_UNAVAILABLE)
+        print(f"themix daemon {info['pid']} on {info['socket']}: "
+              f"up {info['uptime']}s, {info['served']} requests served")
+        return
+
+    payload = {'op': args.command, 'themes_dir': str(Path(args.themes_dir).expanduser())}
+    if args.command == 'extract':
+        payload.update(image=str(Path(args.image).expanduser().resolve()),
+                       theme=args.theme_name, mode=args.mode, num_colors=args.num_colors,
+                       algorithm=args.algorithm, sample_size=args.sample_size,
+                       fast_decode=args.fast_decode, no_cache=args.no_cache,
+                       max_memory=args.max_memory and int(args.max_memory * 1024 * 1024),
+                       quiet=args.quiet)
+    elif args.command in ('render', 'apply'):
+        payload.update(theme=args.theme_name, force=args.force, quiet=args.quiet,
+                       assets=not getattr(args, 'no_assets', False))
+    elif args.command == 'list':
+        payload.update(mode=args.mode)
+    elif args.command == 'similar':
+        payload.update(color=args.color, theme=args.theme, k=args.k,
+                       image=args.image and str(Path(args.image).expanduser().resolve()))
+
+    response = request(payload, socket_path)
+    if response is None:
+        if args.command != 'stop' and not args.optional:
+            print("themix daemon not running", file=sys.stderr)
+        sys.exit(EX_UNAVAILABLE)
+
+    if args.command == 'stop':
+        deadline = time.monotonic() + START_TIMEOUT
+        while ping(socket_path) is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return
+
+    sys.stdout.write(response.get('stdout', ''))
+    sys.stderr.write(response.get('stderr', ''))
+    if not response['ok']:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        sys.exit(1)
+    if args.command == 'list':
+        for name in response['result']:
+            print(name)
+    elif args.command == 'similar':
+        for name, distance in response['result']['themes']:
+            print(f"{distance:7.2f}  {name}")
+
+
+if __name__ == '__main__':
+    main()
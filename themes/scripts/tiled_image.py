@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Themix Tiled Image Reader
+Downsamples very large still images a band of rows at a time, so peak memory
+follows the band size instead of the full decode. The output is pixel for
+pixel what Image.thumbnail() gives for the whole image (or for a crop of it),
+so extraction scores do not change.
+Band readers: uncompressed single-block files (PPM/PGM, BMP, TGA, plain TIFF)
+are read a row range at a time; non-interlaced PNG is inflated incrementally
+and each band is unfiltered by Pillow's own PNG decoder. Everything else
+(JPEG, compressed TIFF, WebP, 16-bit RGB PNG) has to be decoded whole.
+Requires: python3, Pillow
+"""
+
+import math
+import struct
+import zlib
+
+from PIL import Image
+
+
+BAND_COPIES = 4  # band-sized buffers alive at once: file bytes, decoded, cropped, converted
+DEFAULT_BAND_BYTES = 64 * 1024 * 1024  # band budget when no ceiling is given
+READ_CHUNK = 1 << 20
+
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # by IHDR color type
+# Modes whose raw pack/unpack is lossless, by bytes per pixel: unfiltered PNG
+# scanlines are decoded into these, then unpacked with the real raw mode
+PNG_CARRIERS = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}
+PREMULTIPLIED = {'LA': 'La', 'RGBA': 'RGBa'}
+
+
+class ImageTooLarge(ValueError):
+    """The image cannot be downsampled within the memory ceiling"""
+
+
+def pixel_bytes(mode):
+    """Bytes Pillow allocates per pixel in mode"""
+    if mode in ('1', 'L', 'P'):
+        return 1
+    return 2 if mode.startswith('I;16') else 4
+
+
+def thumbnail_size(size, sample_size):
+    """Size Image.thumbnail((sample_size, sample_size)) gives an image of
+    size, or None when it already fits (same rounding as Pillow)"""
+    width, height = size
+    x = y = sample_size
+    if x >= width and y >= height:
+        return None
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def decoded_bytes(img, draft_size=None):
+    """Memory a full decode of an opened image takes. JPEGs decode at the
+    DCT scale that draft(None, draft_size) would pick."""
+    width, height = img.size
+    if draft_size and img.format == 'JPEG':
+        scale = min(width // draft_size[0], height // draft_size[1])
+        scale = next((s for s in (8, 4, 2) if scale >= s), 1)
+        width, height = math.ceil(width / scale), math.ceil(height / scale)
+    return width * height * pixel_bytes(img.mode)
+
+
+# =============================================================================
+# Band Readers
+# =============================================================================
+#
+# A reader yields (top row, band) pairs covering the image top to bottom,
+# each band a full-width image in the source mode of at most `rows` rows.
+
+def raw_layout(img):
+    """(offset, stride, orientation, rawmode) when the pixels are one
+    uncompressed block in the file, else None"""
+    if len(img.tile) != 1:
+        return None
+    codec, extents, offset, args = img.tile[0]
+    if codec != 'raw' or tuple(extents) != (0, 0) + img.size:
+        return None
+    if isinstance(args, str):
+        args = (args,)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    if not stride:
+        try:
+            stride = len(Image.new(img.mode, (img.width, 1)).tobytes('raw', rawmode))
+        except ValueError:  # no packer to measure the row with
+            return None
+    return offset, stride, orientation, rawmode
+
+
+def raw_bands(img, layout, rows):
+    """Bands of an uncompressed image, read straight from the file. Bottom-up
+    files (orientation -1) are read from the end and flipped by the decoder.
+    Plain reads rather than mmap: mapped pages count towards RSS until unmapped."""
+    offset, stride, orientation, rawmode = layout
+    width, height = img.size
+    with open(img.filename, 'rb') as f:
+        for top in range(0, height, rows):
+            bottom = min(height, top + rows)
+            first = top if orientation > 0 else height - bottom
+            f.seek(offset + first * stride)
+            data = f.read((bottom - top) * stride)
+            yield top, Image.frombytes(img.mode, (width, bottom - top), data,
+                                       'raw', rawmode, stride, orientation)
+
+
+def png_layout(img):
+    """(bits per pixel, rawmode) for a non-interlaced PNG of at most 32 bits
+    per pixel, else None"""
+    if img.format != 'PNG' or len(img.tile) != 1:
+        return None
+    with open(img.filename, 'rb') as f:
+        header = f.read(29)  # signature, IHDR length and type, then IHDR
+    depth, color, interlace = header[24], header[25], header[28]
+    bits = depth * PNG_CHANNELS.get(color, 8)
+    if interlace or bits > 32:
+        return None
+    args = img.tile[0][3]
+    return bits, args if isinstance(args, str) else args[0]
+
+
+def png_scanlines(path, stride, rows):
+    """Filtered scanlines of a PNG, `rows` at a time, inflated incrementally"""
+    inflate = zlib.decompressobj()
+    want = stride * rows
+    pending = bytearray()
+    with open(path, 'rb') as f:
+        f.seek(8)
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise OSError(f"truncated PNG: {path}")
+            length, kind = struct.unpack('>I4s', header)
+            if kind == b'IEND':
+                break
+            if kind != b'IDAT':
+                f.seek(length + 4, 1)
+                continue
+            while length:
+                data = f.read(min(length, READ_CHUNK))
+                if not data:
+                    raise OSError(f"truncated PNG: {path}")
+                length -= len(data)
+                while data:
+                    pending += inflate.decompress(data, want)
+                    data = inflate.unconsumed_tail
+                    if len(pending) >= want:
+                        yield bytes(memoryview(pending)[:want])
+                        del pending[:want]
+            f.seek(4, 1)  # CRC
+    pending += inflate.flush()
+    for start in range(0, len(pending), want):
+        yield bytes(pending[start:start + want])
+
+
+def stored_zlib(*chunks):
+    """chunks as a zlib stream of stored (uncompressed) deflate blocks. The
+    Adler-32 trailer is left off: Pillow's decoder stops once the image is full."""
+    data = b''.join(chunks)
+    parts = [b'\x78\x01']
+    view = memoryview(data)
+    for start in range(0, len(data), 0xffff):
+        block = view[start:start + 0xffff]
+        final = start + 0xffff >= len(data)
+        parts += [struct.pack('<BHH', final, len(block), len(block) ^ 0xffff), block]
+    return b''.join(parts)
+
+
+def png_bands(img, layout, rows):
+    """Bands of a PNG. Filters reach back one row, so each band is decoded
+    after the previous band's last unfiltered row, stored as an unfiltered
+    (type 0) row; Pillow's zip decoder then undoes the filters in C."""
+    bits, rawmode = layout
+    width = img.width
+    row_bytes = (width * bits + 7) // 8
+    carrier_bpp = max(1, bits // 8)
+    carrier = PNG_CARRIERS[carrier_bpp]
+    previous = bytes(row_bytes + 1)
+    top = 0
+    for filtered in png_scanlines(img.filename, row_bytes + 1, rows):
+        count = len(filtered) // (row_bytes + 1)
+        band = Image.frombytes(carrier, (row_bytes // carrier_bpp, count + 1),
+                               stored_zlib(previous, filtered), 'zip', carrier)
+        del filtered
+        previous = b'\0' + band.crop((0, count, band.width, count + 1)).tobytes()
+        if img.mode == rawmode == carrier:  # 8-bit L/LA/RGB/RGBA: already unpacked
+            yield top, band.crop((0, 1, width, count + 1))
+        else:
+            data = memoryview(band.tobytes())[row_bytes:]
+            del band
+            yield top, Image.frombytes(img.mode, (width, count), data, 'raw', rawmode)
+        top += count
+
+
+def band_reader(img):
+    """(reader, extra bytes per row) for an opened still image, or None if it
+    has to be decoded whole. reader(rows) yields (top row, band) pairs."""
+    if getattr(img, 'n_frames', 1) > 1 or not getattr(img, 'filename', None):
+        return None
+    layout = raw_layout(img)
+    if layout is not None:
+        return (lambda rows: raw_bands(img, layout, rows)), layout[1]
+    layout = png_layout(img)
+    if layout is not None:
+        # inflate buffer, filtered scanlines, their stored-zlib copy, unfiltered bytes
+        return (lambda rows: png_bands(img, layout, rows)), 4 * (img.width * layout[0] // 8 + 1)
+    return None
+
+
+# =============================================================================
+# Banded Thumbnails
+# =============================================================================
+#
+# Image.thumbnail() resamples in one of three ways depending on the mode, and
+# each one splits into row bands without changing a single output pixel:
+#   reduce         block-average by an integer factor, then BICUBIC resize the
+#                  small result. Blocks never straddle bands (leftover rows
+#                  carry into the next band), so the reduced image is exact.
+#   premultiplied  LA/RGBA skip reduce(): one BICUBIC resize of the
+#                  premultiplied image. Pillow runs it as a horizontal pass
+#                  per row then a vertical pass, so bands take the horizontal
+#                  pass and the narrow intermediate takes the vertical one.
+#   nearest        P and 1 resize with NEAREST: each output row is one source
+#                  row, picked by the same accumulated step Pillow uses.
+
+class BandThumbnail:
+    """Image.thumbnail() of one box of an image, built from bands fed top to bottom"""
+
+    def __init__(self, box, mode, sample_size, reducing_gap=2.0):
+        self.box = box
+        self.mode = mode
+        width, height = box[2] - box[0], box[3] - box[1]
+        self.size = thumbnail_size((width, height), sample_size)
+        self.factor = (1, 1)
+        self.carry = None
+        self.canvas = None
+        self.filled = 0  # canvas rows written
+        if self.size is None:
+            self.kind, self.canvas_size = 'copy', (width, height)
+        elif mode in ('1', 'P'):
+            self.kind, self.canvas_size = 'nearest', self.size
+            self.rows, position, step = [], height / self.size[1] * 0.5, height / self.size[1]
+            for _ in range(self.size[1]):
+                self.rows.append(int(position))
+                position += step
+        elif mode in PREMULTIPLIED:
+            self.kind, self.canvas_size = 'premultiplied', (self.size[0], height)
+        else:
+            self.kind = 'reduce'
+            self.factor = (int(width / self.size[0] / reducing_gap) or 1,
+                           int(height / self.size[1] / reducing_gap) or 1)
+            self.canvas_size = (math.ceil(width / self.factor[0]),
+                                math.ceil(height / self.factor[1]))
+
+    def fixed_bytes(self):
+        """Memory held for the whole run: canvas plus the worst-case carry"""
+        canvas = self.canvas_size[0] * self.canvas_size[1]
+        carry = 2 * self.factor[1] * (self.box[2] - self.box[0])
+        return (canvas + carry) * pixel_bytes(self.mode)
+
+    def feed(self, top, band):
+        """Take the rows of a full-width band that fall inside the box"""
+        x0, y0, x1, y1 = self.box
+        lo, hi = max(top, y0) - top, min(top + band.height, y1) - top  # band rows
+        if lo >= hi:
+            return
+        if self.canvas is None:
+            mode = PREMULTIPLIED[self.mode] if self.kind == 'premultiplied' else self.mode
+            self.canvas = Image.new(mode, self.canvas_size)
+
+        if self.kind == 'copy':
+            self.canvas.paste(band.crop((x0, lo, x1, hi)), (0, self.filled))
+            self.filled += hi - lo
+        elif self.kind == 'nearest':
+            while self.filled < len(self.rows) and self.rows[self.filled] < top + hi - y0:
+                row = self.rows[self.filled] + y0 - top
+                line = band.crop((x0, row, x1, row + 1))
+                self.canvas.paste(line.resize((self.size[0], 1), Image.Resampling.NEAREST),
+                                  (0, self.filled))
+                self.filled += 1
+        elif self.kind == 'premultiplied':
+            if (x0, lo, x1, hi) != (0, 0) + band.size:
+                band = band.crop((x0, lo, x1, hi))
+            band = band.convert(PREMULTIPLIED[self.mode])
+            self.canvas.paste(band.resize((self.size[0], band.height), Image.Resampling.BICUBIC,
+                                          box=(0, 0) + band.size),
+                              (0, self.filled))
+            self.filled += band.height
+        else:
+            step = self.factor[1]
+            if self.carry is not None:
+                # Complete the block started in the previous band
+                head = min(step - self.carry.height, hi - lo)
+                joined = Image.new(band.mode, (x1 - x0, self.carry.height + head))
+                joined.paste(self.carry, (0, 0))
+                joined.paste(band.crop((x0, lo, x1, lo + head)), (0, self.carry.height))
+                lo += head
+                self.carry = joined
+                if joined.height < step:
+                    return
+                self._reduce(joined, (0, 0) + joined.size)
+                self.carry = None
+            complete = lo + (hi - lo) // step * step
+            if complete > lo:
+                self._reduce(band, (x0, lo, x1, complete))
+            if complete < hi:
+                self.carry = band.crop((x0, complete, x1, hi))
+
+    def _reduce(self, image, box):
+        """Block-average box of image into the next canvas rows"""
+        if self.factor != (1, 1):
+            image = image.reduce(self.factor, box=box)
+        elif box != (0, 0) + image.size:
+            image = image.crop(box)
+        self.canvas.paste(image, (0, self.filled))
+        self.filled += image.height
+
+    def image(self):
+        """The finished thumbnail, in the source mode"""
+        if self.kind == 'reduce':
+            if self.carry is not None:  # partial last block, averaged like Pillow's edge
+                self._reduce(self.carry, (0, 0) + self.carry.size)
+                self.carry = None
+            width, height = self.box[2] - self.box[0], self.box[3] - self.box[1]
+            return self.canvas.resize(self.size, Image.Resampling.BICUBIC,
+                                      box=(0, 0, width / self.factor[0], height / self.factor[1]))
+        if self.kind == 'premultiplied':
+            return self.canvas.resize(self.size, Image.Resampling.BICUBIC,
+                                      box=(0, 0) + self.canvas_size).convert(self.mode)
+        return self.canvas
+
+
+def thumbnails(img, boxes, sample_size, reducing_gap=2.0, max_bytes=None):
+    """Image.thumbnail() of each (x0, y0, x1, y1) box of an opened image, from
+    one banded read. Bands are sized so the total stays under max_bytes
+    (DEFAULT_BAND_BYTES of bands when None). Raises ImageTooLarge when the
+    image has no band reader or the ceiling cannot hold even one row.
+    """
+    width, height = img.size
+    reader = band_reader(img)
+    if reader is None:
+        raise ImageTooLarge(
+            f"{img.format} {width}x{height} ({img.mode}) cannot be read in bands and a full "
+            f"decode needs {decoded_bytes(img) / 1048576:.0f} MiB; convert it to PNG, PPM or "
+            f"uncompressed TIFF, or raise the memory limit")
+    bands, io_row = reader
+    parts = [BandThumbnail(box, img.mode, sample_size, reducing_gap) for box in boxes]
+    fixed = sum(part.fixed_bytes() for part in parts)
+    row = io_row + width * pixel_bytes(img.mode) * BAND_COPIES
+    budget = DEFAULT_BAND_BYTES if max_bytes is None else max_bytes - fixed
+    if budget < row:
+        raise ImageTooLarge(
+            f"{width}x{height} needs at least {(fixed + row) / 1048576:.1f} MiB "
+            f"to downsample in bands (limit {max_bytes / 1048576:.0f} MiB)")
+
+    for top, band in bands(min(height, budget // row)):
+        for part in parts:
+            part.feed(top, band)
+        del band
+
+    results = []
+    for part in parts:
+        thumb = part.image()
+        if thumb.mode == 'P' and img.palette is not None:
+            thumb.palette = img.palette.copy()
+        results.append(thumb)
+    return results
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Themix Timings
+Per-stage wall/CPU time and peak RSS for the Themix scripts.
+A process records stages with `with timings.stage('name'):` once start() has
+been called; the record is one JSON object. With THEMIX_TIMINGS=<file> set,
+every instrumented process (and the shell scripts' own steps) appends its
+record to that file as a JSON line, and `timings.py summary <file>`
+aggregates a whole generate/process run.
+Requires: python3
+"""
+
+import sys
+import argparse
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager, nullcontext
+
+
+ENV_VAR = 'THEMIX_TIMINGS'
+
+
+# =============================================================================
+# Recording
+# =============================================================================
+
+class Timings:
+    """Accumulated wall/CPU seconds and call counts per stage for one process"""
+
+    def __init__(self, source):
+        self.source = source
+        self.stages = {}
+        self.wall0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add(self, name, wall, cpu=0.0):
+        """Count one call of a stage timed elsewhere (e.g. on a worker thread)"""
+        entry = self.stages.setdefault(name, [0.0, 0.0, 0])
+        entry[0] += wall
+        entry[1] += cpu
+        entry[2] += 1
+
+    def record(self, **extra):
+        """JSON-ready record; nested stages are included in their parents' time"""
+        return {
+            'source': self.source,
+            'pid': os.getpid(),
+            'wall': round(time.perf_counter() - self.wall0, 6),
+            'cpu': round(time.process_time() - self.cpu0, 6),
+            'peak_rss_kb': peak_rss_kb(),
+            'stages': {name: {'wall': round(w, 6), 'cpu': round(c, 6), 'calls': n}
+                       for name, (w, c, n) in self.stages.items()},
+            **extra,
+        }
+
+    def emit(self, stderr=False, **extra):
+        """Print the record to stderr and/or append it to $THEMIX_TIMINGS"""
+        line = json.dumps(self.record(**extra))
+        if stderr:
+            print(line, file=sys.stderr)
+        path = os.environ.get(ENV_VAR)
+        if path:
+            # One write per record: O_APPEND keeps concurrent writers' lines whole
+            with open(path, 'a') as f:
+                f.write(line + '\n')
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process (KiB; ru_maxrss is bytes on macOS)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+_active = None
+
+
+def start(source):
+    """Begin recording for this process; returns the Timings object"""
+    global _active
+    _active = Timings(source)
+    return _active
+
+
+def stage(name):
+    """Context manager timing a stage, or a no-op when recording is off"""
+    return _active.stage(name) if _active else nullcontext()
+
+
+def add(name, wall, cpu=0.0):
+    """Count a stage timed elsewhere, or nothing when recording is off"""
+    if _active:
+        _active.add(name, wall, cpu)
+
+
+def requested():
+    """True if $THEMIX_TIMINGS asks every process to record"""
+    return bool(os.environ.get(ENV_VAR))
+
+
+# =============================================================================
+# Aggregation
+# =============================================================================
+
+def load_records(path):
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"Warning: skipping malformed record: {line[:60]}", file=sys.stderr)
+    return records
+
+
+def summarize(records):
+    """Totals per (source, stage), total CPU, longest record wall and max peak RSS.
+    Records nest (a script's step covers the processes it runs), so the
+    longest wall is the run time when the outermost script records itself.
+    """
+    stages = {}
+    for record in records:
+        for name, s in record.get('stages', {}).items():
+            total = stages.setdefault((record['source'], name), [0.0, 0.0, 0])
+            total[0] += s['wall']
+            total[1] += s.get('cpu', 0)  # shell steps only record wall time
+            total[2] += s.get('calls', 1)
+    return {
+        'processes': len(records),
+        'wall': max((r.get('wall', 0) for r in records), default=0),
+        'cpu': sum(r.get('cpu', 0) for r in records),
+        'peak_rss_kb': max((r.get('peak_rss_kb') or 0 for r in records), default=0),
+        'stages': stages,
+    }
+
+
+def print_summary(summary):
+    print(f"{'source':<24} {'stage':<18} {'wall ms':>10} {'cpu ms':>10} {'calls':>6}")
+    for (source, name), (wall, cpu, calls) in sorted(summary['stages'].items(),
+                                                     key=lambda item: -item[1][0]):
+        print(f"{source[:24]:<24} {name[:18]:<18} {wall * 1000:>10.1f} {cpu * 1000:>10.1f} "
+              f"{calls:>6}")
+    print(f"\n{summary['processes']} records: {summary['wall']:.2f}s wall (longest), "
+          f"{summary['cpu']:.2f}s Python CPU, peak RSS {summary['peak_rss_kb'] / 1024:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate Themix timing records')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('summary', help='Per-stage totals for a $THEMIX_TIMINGS file')
+    p.add_argument('file')
+    p.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    summary = summarize(load_records(args.file))
+    if args.json:
+        summary['stages'] = [{'source': source, 'stage': name, 'wall': w, 'cpu': c, 'calls': n}
+                             for (source, name), (w, c, n) in summary['stages'].items()]
+        print(json.dumps(summary, indent=1))
+    else:
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()